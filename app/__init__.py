@@ -5,5 +5,6 @@ from app.model.model import Model
 from app.dataset.dataset import Dataset
 from app.application.app import App
 from app.task.task import Task
+from app.tag.tag import Tag
 
-__all__ = ['User', 'Star', 'Order', 'Model', 'Dataset', 'App', 'Task']
+__all__ = ['User', 'Star', 'Order', 'Model', 'Dataset', 'App', 'Task', 'Tag']
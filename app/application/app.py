@@ -1,6 +1,7 @@
 from datetime import datetime
 
 from app.exts import db
+from app.search import fulltext
 from app.utils.image_url_utils import ImageURLHandlerUtils
 
 
@@ -62,3 +63,7 @@ class App(db.Model):
         base_data['icon'] = ImageURLHandlerUtils.build_full_url(icon_value)
 
         return base_data
+
+
+# 名称、描述建立全文索引
+fulltext.register(App, 'name', 'description')
@@ -4,6 +4,7 @@ from typing import Optional
 from app.application.app import App
 from app.core.exception import ValidationError, logger
 from app.exts import db
+from app.search.fulltext import FullTextSearch
 from app.utils.apply_sort import apply_sorting
 from sqlalchemy.orm import joinedload
 
@@ -35,11 +36,29 @@ class AppRepository:
                 joinedload(App.user),
             )
 
-            if params.get('name'):
-                query = query.filter(App.name.ilike(f"%{params.get('name')}%"))
+            # 名称、描述走全文索引
+            query, relevance = FullTextSearch.apply(query, App, {
+                'name': params.get('name'),
+                'description': params.get('description')
+            })
 
-            if params.get('description'):
-                query = query.filter(App.description.like(f"%{params.get('description')}%"))
+            sort_by = params.get('sort_by')
+            if sort_by == 'relevance':
+                # 按相关度排序；未使用全文索引（检索词过短等）时保持默认顺序
+                if relevance is not None:
+                    query = query.order_by(relevance.desc(), App.id.asc())
+                sort_by = None
+
+            if PaginationHelper.use_cursor(params):
+                # 游标分页：不统计总数，按索引顺序定位下一页
+                return PaginationHelper.paginate_cursor(
+                    query=query,
+                    cursor=params.get('cursor'),
+                    per_page=per_page,
+                    sort_mapping=AppRepository.SORT_FIELD_MAPPING,
+                    sort_by=sort_by,
+                    sort_order=params.get('sort_order', 'asc')
+                )
 
             # 调用通用分页方法
             return PaginationHelper.paginate(
@@ -47,8 +66,10 @@ class AppRepository:
                 page=page,
                 per_page=per_page,
                 sort_mapping=AppRepository.SORT_FIELD_MAPPING,
-                sort_by=params.get('sort_by'),
-                sort_order=params.get('sort_order', 'asc')
+                sort_by=sort_by,
+                sort_order=params.get('sort_order', 'asc'),
+                count_params=params,
+                count_mode=params.get('count', 'exact')
             )
         except Exception as e:
             logger.error("模型查询失败｜%s", str(e), exc_info=True)
@@ -1,8 +1,10 @@
 from app.application.app import App
 from app.application.app_repo import AppRepository
-from app.core.exception import DatabaseError, NotFoundError, logger, ServiceException
+from app.core.exception import DatabaseError, NotFoundError, logger, ServiceException, ValidationError
 from app.exts import db
+from app.utils.common.count_cache import CountCache
 from app.utils.common.json_encoder import ResponseBuilder
+from app.utils.common.pagination import PaginationHelper
 
 
 class AppService:
@@ -37,6 +39,11 @@ class AppService:
             page = max(1, int(search_params.get("page", 1)))
             per_page = min(100, max(1, int(search_params.get("per_page", 5))))
 
+            if PaginationHelper.use_cursor(search_params):
+                apps, next_cursor = AppRepository.search_apps(search_params, per_page=per_page)
+                items = [AppService._convert_to_dict(app) for app in apps]
+                return ResponseBuilder.cursor_response(items, per_page, next_cursor)
+
             # 传递分页参数到Repository
             total_count, apps = AppRepository.search_apps(
                 search_params,
@@ -52,6 +59,8 @@ class AppService:
                 page=page,
                 per_page=per_page
             )
+        except ValidationError:
+            raise  # 无效的分页游标等参数错误直接返回
         except Exception as e:
             logger.error("搜索模型错误｜参数= %s｜异常= %s", search_params, str(e), exc_info=True)
             raise ServiceException("查询服务暂时不可用")
@@ -62,6 +71,7 @@ class AppService:
         try:
             AppRepository.save_app(instance)
             db.session.commit()
+            CountCache.invalidate(App)
             return instance.to_dict(), 201
         except Exception as e:
             db.session.rollback()
@@ -74,6 +84,7 @@ class AppService:
         try:
             AppRepository.save_app(instance)
             db.session.commit()
+            CountCache.invalidate(App)
             return instance.to_dict(), 200
         except Exception as e:
             db.session.rollback()
@@ -86,6 +97,7 @@ class AppService:
         try:
             AppRepository.delete_app(instance)
             db.session.commit()
+            CountCache.invalidate(App)
             return {"message": "数据删除成功"}, 200
         except Exception as e:
             db.session.rollback()
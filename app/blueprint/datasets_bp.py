@@ -38,9 +38,9 @@ def search():
 @datasets_bp.route('/types', methods=['GET'])
 def get_all_types():
     """获取所有唯一的模型类型列表"""
-    types = CommonService.get_all_types(DatasetRepository)
+    vocabulary = CommonService.get_all_types(DatasetRepository)
     return create_json_response({
-        "data": {"types": types}
+        "data": vocabulary
     })
 
 
@@ -5,9 +5,12 @@ from app.core.exception import FileUploadError, logger, ValidationError
 from app.core.redis_connection_pool import redis_pool
 from app.exts import db
 from app.model.model_service import ModelService
+from app.schemas.base_schema import validate_request
+from app.schemas.file_schema import UploadSessionSchema
 from app.token.JWT import resource_owner, auth_required
 from app.user.user_service import UserService
 from app.utils import create_json_response
+from app.utils.chunked_upload import chunked_upload_service, UploadOffsetError
 from app.utils.file_process import FileUploader
 from app.utils.temp_file_service import TempFileService
 
@@ -154,3 +157,86 @@ def update_avatar():
     except Exception as e:
         logger.error("服务器异常: %s", str(e), exc_info=True)
         return create_json_response({"error": {"message": str(e)}}, 500)
+
+
+@files_bp.route('/sessions/<string:upload_type>/<int:data_id>/<string:file_type>', methods=['POST'])
+@resource_owner(
+    resource_type_param='upload_type',
+    id_param='data_id',
+    inject_instance=False
+)
+@validate_request(UploadSessionSchema)
+def create_upload_session(upload_type, data_id, file_type):
+    """创建分片上传会话（大文件、数据集压缩包）"""
+    config = FileConfig.UPLOAD_CONFIG.get(upload_type)
+    if not config:
+        return create_json_response({'error': {"message": "暂不支持其他选择"}}, 400)
+    if 'file_types' in config and file_type not in config['file_types']:
+        return create_json_response({'error': {"message": "不支持的类型"}}, 400)
+
+    data = g.validated_data
+    session = chunked_upload_service.create(
+        user_id=g.current_user.id,
+        upload_type=upload_type,
+        data_id=data_id,
+        file_type=file_type,
+        filename=data['filename'],
+        size=data['size'],
+        md5=data.get('md5')
+    )
+    return create_json_response({"data": session}, 201)
+
+
+@files_bp.route('/sessions/<string:session_id>', methods=['GET'])
+@auth_required
+def get_upload_session(session_id):
+    """查询已上传的偏移量（断线后据此续传）；完成后返回校验状态和临时URL"""
+    return create_json_response({"data": chunked_upload_service.status(session_id, g.current_user.id)})
+
+
+@files_bp.route('/sessions/<string:session_id>', methods=['PUT'])
+@auth_required
+def upload_chunk(session_id):
+    """
+    上传分片：请求体为原始字节，Upload-Offset 头指定写入偏移量
+    偏移量不一致时返回 409 及服务端当前偏移量
+    """
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None or offset < 0:
+        return create_json_response({'error': {"message": "缺少或非法的 Upload-Offset 请求头"}}, 400)
+    try:
+        new_offset = chunked_upload_service.append(
+            session_id, g.current_user.id, offset, request.stream, request.content_length
+        )
+    except UploadOffsetError as e:
+        return create_json_response({'error': {"message": e.message}, "data": {"offset": e.offset}}, 409)
+    return create_json_response({"data": {"session_id": session_id, "offset": new_offset}})
+
+
+@files_bp.route('/sessions/<string:session_id>/complete', methods=['POST'])
+@auth_required
+def complete_upload_session(session_id):
+    """
+    完成上传：校验哈希后进入临时区，返回临时URL（提交流程与普通上传一致）
+    需要后台校验时返回 202，客户端查询会话状态获取临时URL
+    """
+    try:
+        result = chunked_upload_service.complete(session_id, g.current_user.id)
+    except UploadOffsetError as e:
+        return create_json_response({'error': {"message": e.message}, "data": {"offset": e.offset}}, 409)
+    if result['status'] != 'completed':
+        return create_json_response({"data": result}, 202)
+    return create_json_response({
+        "data": {
+            **result,
+            "absolute_url": f"{FileConfig.FILE_BASE_URL}/{result['temp_url']}"
+        }
+    }, 201)
+
+
+@files_bp.route('/sessions/<string:session_id>', methods=['DELETE'])
+@auth_required
+def abort_upload_session(session_id):
+    """放弃分片上传"""
+    chunked_upload_service.abort(session_id, g.current_user.id)
+    return create_json_response({"message": "已取消上传"})
@@ -1,25 +1,34 @@
+import json
+import queue
+import time
 import uuid
+from collections import OrderedDict
 from datetime import datetime
-from flask import Blueprint, g
+from flask import Blueprint, g, Response, stream_with_context
 from sqlalchemy.exc import IntegrityError
 
 from app import Model
-from app.core.exception import FileUploadError, ApiError
+from app.core.exception import FileUploadError, ApiError, ValidationError
+from app.utils.archive_ingestor import ingest_archive, is_archive
 from app.utils.storage import FileStorage
-from app.utils.cleanup import cleanup_directory
+from app.utils.cleanup import CleanupScheduler
 from app.exts import db
 from app.model.model_repo import ModelRepository
 from app.schemas.model_schema import ModelRunSchema, ModelSearchSchema, ModelCreateSchema, \
-    ModelUpdateSchema, ModelResponseSchema
+    ModelUpdateSchema, ModelResponseSchema, TaskLogQuerySchema, TaskStatusBulkSchema
 
 from flask import request
 from app.config import Config
+from app.docker.core.batch import submit_test_task
 from app.docker.core.docker_clinet import docker_client
+from app.docker.core.log_stream import TaskLogStream
+from app.docker.core.task_events import TaskEvents, TERMINAL_STATES
 from app.docker.core.task import logger, run_algorithm
 from app.model.model_service import ModelService
 from app.token.JWT import admin_required, auth_required, resource_owner
 from app.utils import create_json_response
 from app.utils.common.common_service import CommonService
+from app.utils.temp_file_service import temp_service
 
 # 设置允许的文件格式
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png'}
@@ -59,9 +68,9 @@ def search():
 @models_bp.route('/types', methods=['GET'])
 def get_all_types():
     """获取所有唯一的模型类型列表"""
-    types = CommonService.get_all_types(ModelRepository)
+    vocabulary = CommonService.get_all_types(ModelRepository)
     return create_json_response({
-        "data": {"types": types}
+        "data": vocabulary
     })
 
 
@@ -137,6 +146,16 @@ def log_request():
     print(f"Request started at: {datetime.now()}")
 
 
+@models_bp.route('/images', methods=['GET'])
+@admin_required
+def list_images():
+    """获取本机算法镜像清单（摘要、大小、最近使用时间）"""
+    images = docker_client.images.list_images()
+    return create_json_response({
+        "data": {"images": images}
+    })
+
+
 # Flask路由：上传文件并触发任务
 @models_bp.route('/<int:model_id>/test-model', methods=['POST'])
 @auth_required
@@ -153,43 +172,61 @@ def process_image(model_id):
     task_id = str(uuid.uuid4())
 
     file = request.files.get('file')
-    if not file or file.filename == '':
+    archive_url = request.form.get('archive_url')  # 分片上传得到的压缩包临时URL
+    if (not file or file.filename == '') and not archive_url:
         raise FileUploadError("未上传任何文件")
 
-    uploaded_files = [file]
+    if archive_url or is_archive(file.filename):
+        # 压缩包在后台解压并校验，完成后再提交算法任务，大文件不阻塞请求
+        target_dir = FileStorage.generate_upload_path(image_name, task_id)
+        if archive_url:
+            archive_path = temp_service.get_temp_file(archive_url, g.current_user.id)
+            if not is_archive(archive_path.name):
+                raise ValidationError("仅支持 zip/tar/tar.gz 压缩包")
+            filename = archive_path.name
+        else:
+            # 直接上传的压缩包暂存在任务输入目录旁，解压后删除
+            filename = file.filename
+            archive_path = target_dir.parent / f"task_{task_id}.archive"
+            file.save(archive_path)
+
+        TaskEvents.publish(task_id, 'PENDING', {'stage': 'extracting'})
+        ingest_archive.delay(
+            str(archive_path), filename, str(target_dir), task_id, image_name, instruction,
+            archive_url, g.current_user.id
+        )
+    else:
+        uploaded_files = [file]
 
-    try:
-        if len(uploaded_files) == 0:
-            raise FileUploadError("未上传任何文件")
-
-        # 保存第一个文件并获取目录路径
-        first_file = uploaded_files[0]
-        target_dir = FileStorage.upload_input(first_file, image_name, task_id)
-
-        # 保存剩余文件到同一目录
-        for file in uploaded_files[1:]:
-            FileStorage.save_upload(
-                file_stream=file,
-                save_dir=str(target_dir),  # 使用已创建的目录
-                file_name=file.filename
-            )
-    except Exception as e:
-        logger.error("文件保存失败: %s", str(e))
-        return create_json_response({'error': {"message": str(e)}}, 500)
+        try:
+            if len(uploaded_files) == 0:
+                raise FileUploadError("未上传任何文件")
+
+            # 保存第一个文件并获取目录路径
+            first_file = uploaded_files[0]
+            target_dir = FileStorage.upload_input(first_file, image_name, task_id)
+
+            # 保存剩余文件到同一目录
+            for file in uploaded_files[1:]:
+                FileStorage.save_upload(
+                    file_stream=file,
+                    save_dir=str(target_dir),  # 使用已创建的目录
+                    file_name=file.filename
+                )
+        except Exception as e:
+            logger.error("文件保存失败: %s", str(e))
+            return create_json_response({'error': {"message": str(e)}}, 500)
+
+        submit_test_task(image_name, instruction, target_dir, task_id)
 
     output_folder = Config.OUTPUT_FOLDER
     output_dir = output_folder / image_name / f"task_{task_id}"
-    task = run_algorithm.apply_async(
-        args=(str(target_dir), task_id, image_name, instruction),
-        task_id=task_id
-    )
 
-    cleanup_directory.apply_async(
-        args=(str(target_dir), str(output_dir)),
-        countdown=86400  # 1天 = 60*60*24 秒
-    )
+    # 登记目录清理，到期后由定时清理任务删除
+    retention = CleanupScheduler.get_retention(model_id=model_id, user_id=g.current_user.id)
+    CleanupScheduler.schedule(target_dir, output_dir, retention)
 
-    logger.info("清理任务已调度，预计24h后完成")
+    logger.info("清理任务已登记，预计 %s 秒后清理", retention)
     return create_json_response({
         "data": {
             'task_id': task_id,
@@ -198,38 +235,47 @@ def process_image(model_id):
     }), 202
 
 
-# Flask路由：查询任务状态
-@models_bp.route('/task/<task_id>', methods=['GET'])
-@auth_required
-def get_task_status(task_id):
-    task = run_algorithm.AsyncResult(task_id)
+def describe_task_state(state, result=None):
+    """
+    任务状态 -> (响应数据, 提示信息, 状态码)
+    :param result: 成功时为任务结果，失败时为异常信息
+    """
     # 判断任务状态
-    if task.state == 'PENDING':
+    if state == 'PENDING':
         response = {'result': {"status": "PENDING"}}  # 如果任务还在等待中，不返回结果
         message = '任务尚未开始处理'
         status_code = 202  # 202 Accepted - 请求已接受，正在处理
-    elif task.state == 'STARTED':
+    elif state == 'STARTED':
         response = {'result': {"status": "STARTED"}}  # 任务已开始但未完成
         message = '任务正在处理中，请耐心等待'
         status_code = 202  # 200 OK - 请求成功，任务正在处理中
-    elif task.state == 'SUCCESS':
-        response = {'result': task.result}  # 返回任务结果
+    elif state == 'SUCCESS':
+        response = {'result': result}  # 返回任务结果
         message = '任务处理成功'
         status_code = 200  # 200 OK - 请求成功，任务完成
-    elif task.state == 'FAILURE':
-        error_message = str(task.info)
+    elif state == 'FAILURE':
         response = {'result': {"status": "FAILURE"}}
         message = '任务处理失败，请重新上传数据或联系系统管理员'
         status_code = 500  # 500 Internal Server Error - 任务执行失败
-        logger.error("error: %s", error_message)
-    elif task.state == 'RETRY':
+        logger.error("error: %s", str(result))
+    elif state == 'RETRY':
         response = {'result': {"status": "RETRY"}}  # 返回任务结果
         message = '运行过程中发生错误，任务正在重试中'
         status_code = 202
     else:
         response = {'result': None}  # 其他状态
-        message = f'当前状态: {task.state}'
+        message = f'当前状态: {state}'
         status_code = 500  # 500 Internal Server Error - 未知错误状态
+    return response, message, status_code
+
+
+# Flask路由：查询任务状态
+@models_bp.route('/task/<task_id>', methods=['GET'])
+@auth_required
+def get_task_status(task_id):
+    task = run_algorithm.AsyncResult(task_id)
+    result = task.result if task.state == 'SUCCESS' else task.info
+    response, message, status_code = describe_task_state(task.state, result)
 
     # 返回统一格式的响应
     return create_json_response({
@@ -237,3 +283,116 @@ def get_task_status(task_id):
         'message': message,
     }, status_code)
 
+
+
+# Flask路由：分页/追踪任务日志（任务运行中即可查询）
+@models_bp.route('/task/<task_id>/logs', methods=['GET'])
+@auth_required
+def get_task_logs(task_id):
+    """
+    查询任务容器日志
+    示例请求：?after=1700000000000-0&count=100 或 ?tail=true&count=50
+    """
+    params = TaskLogQuerySchema().load(request.args.to_dict())
+    if params['tail']:
+        lines, last_id = TaskLogStream.read_tail(task_id, count=params['count'])
+    else:
+        lines, last_id = TaskLogStream.read(task_id, after=params.get('after'), count=params['count'])
+
+    return create_json_response({
+        'data': {
+            'task_id': task_id,
+            'lines': lines,
+            'next_after': last_id or params.get('after'),
+            'state': run_algorithm.AsyncResult(task_id).state
+        }
+    })
+
+
+# Flask路由：推送任务状态（Server-Sent Events），替代轮询 get_task_status
+@models_bp.route('/task/<task_id>/events', methods=['GET'])
+@auth_required
+def stream_task_events(task_id):
+    """
+    订阅任务状态变化，连接建立时先推送当前状态，任务结束或连接超时后关闭
+    事件格式：event: <状态>\ndata: {"task_id", "state", "meta", "time"}
+    """
+    def format_event(event):
+        return f"event: {event['state']}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+    def generate():
+        events = TaskEvents.subscribe(task_id)
+        try:
+            # 先订阅再读取最近事件，保证不漏掉两者之间的状态变化
+            event = TaskEvents.last(task_id)
+            if event is None:
+                # 兼容没有事件记录的任务，回退到结果后端查询一次
+                task = run_algorithm.AsyncResult(task_id)
+                meta = {'result': task.result} if task.state == 'SUCCESS' else {}
+                event = {'task_id': task_id, 'state': task.state, 'meta': meta, 'time': time.time()}
+            yield format_event(event)
+            if event['state'] in TERMINAL_STATES:
+                return
+
+            deadline = time.monotonic() + Config.TASK_EVENTS_MAX_DURATION
+            last_sent = time.monotonic()
+            while time.monotonic() < deadline:
+                try:
+                    message = events.get(timeout=1.0)
+                except queue.Empty:
+                    message = False
+                if message is None:
+                    # 订阅连接重建，补发最近事件
+                    message = TaskEvents.last(task_id)
+                    if not message or message == event:
+                        continue
+                if message:
+                    event = message
+                    yield format_event(event)
+                    last_sent = time.monotonic()
+                    if event['state'] in TERMINAL_STATES:
+                        return
+                elif time.monotonic() - last_sent >= Config.TASK_EVENTS_HEARTBEAT:
+                    yield ": heartbeat\n\n"
+                    last_sent = time.monotonic()
+        finally:
+            TaskEvents.unsubscribe(task_id, events)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # 关闭 nginx 缓冲，事件即时送达
+        }
+    )
+
+
+# Flask路由：批量查询任务状态
+@models_bp.route('/tasks/status', methods=['POST'])
+@auth_required
+def get_tasks_status():
+    """
+    批量查询任务状态，一次 MGET 读取所有任务的结果记录
+    请求体：{"task_ids": ["...", "..."]}
+    """
+    task_ids = TaskStatusBulkSchema().load(request.get_json())['task_ids']
+    task_ids = list(OrderedDict.fromkeys(task_ids))  # 去重并保持顺序
+
+    backend = run_algorithm.backend
+    values = backend.mget([backend.get_key_for_task(task_id) for task_id in task_ids])
+
+    statuses = {}
+    for task_id, value in zip(task_ids, values):
+        meta = backend.decode_result(value) if value else {'status': 'PENDING', 'result': None}
+        response, message, status_code = describe_task_state(meta['status'], meta.get('result'))
+        statuses[task_id] = {
+            'state': meta['status'],
+            'message': message,
+            'code': status_code,
+            **response
+        }
+
+    return create_json_response({
+        'data': {'tasks': statuses}
+    })
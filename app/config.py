@@ -1,3 +1,4 @@
+import json
 import os
 import sys
 from pathlib import Path
@@ -7,6 +8,27 @@ from dotenv import load_dotenv
 load_dotenv(Path('.') / '.env')
 
 
+def load_retention_map(name):
+    """
+    从环境变量读取保留时长配置，JSON 对象：{"ID": 秒数}，如 TASK_RETENTION_BY_MODEL='{"12": 604800}'
+    ID 须为整数、秒数须为正整数，格式错误时启动失败
+    """
+    raw = os.getenv(name, '').strip()
+    if not raw:
+        return {}
+    try:
+        data = json.loads(raw)
+        if not isinstance(data, dict):
+            raise ValueError("需为 JSON 对象")
+        retention = {int(key): int(value) for key, value in data.items()}
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"{name} 配置格式错误: {str(e)}")
+    invalid = [key for key, value in retention.items() if value <= 0]
+    if invalid:
+        raise ValueError(f"{name} 保留时长须为正整数: {invalid}")
+    return retention
+
+
 # 定义基础配置类
 class Config:
     """通用配置类"""
@@ -46,6 +68,97 @@ class Config:
 
     USER_FOLDER = Path(r'/home/zhaohonglong/workspace/Crop_Data/user').resolve()
 
+    # 算法容器预热池配置（按镜像维护，每个 worker 进程独立一份）
+    CONTAINER_POOL_ENABLED = os.getenv('CONTAINER_POOL_ENABLED', 'true').lower() == 'true'
+    CONTAINER_POOL_MIN_SIZE = int(os.getenv('CONTAINER_POOL_MIN_SIZE', 1))  # 每个镜像常驻的空闲容器数
+    CONTAINER_POOL_MAX_SIZE = int(os.getenv('CONTAINER_POOL_MAX_SIZE', 2))  # 每个镜像最多容器数（空闲+借出）
+    CONTAINER_POOL_IDLE_TTL = int(os.getenv('CONTAINER_POOL_IDLE_TTL', 600))  # 超出最小数量的空闲容器存活时间（秒）
+    CONTAINER_POOL_HEALTH_INTERVAL = int(os.getenv('CONTAINER_POOL_HEALTH_INTERVAL', 30))  # 健康检查间隔（秒）
+    CONTAINER_POOL_ACQUIRE_TIMEOUT = int(os.getenv('CONTAINER_POOL_ACQUIRE_TIMEOUT', 300))  # 借用容器最长等待（秒）
+
+    # 算法容器资源配置（按镜像名称前缀匹配，最长前缀优先）
+    # nano_cpus: CPU 配额（1e9 = 1核）；mem_limit: 内存上限；max_concurrent: 该镜像同时运行的容器数
+    RESOURCE_DEFAULT_PROFILE = {'nano_cpus': 2 * 10 ** 9, 'mem_limit': '4g', 'max_concurrent': 4}
+    RESOURCE_PROFILES = {
+        'segmentation': {'nano_cpus': 4 * 10 ** 9, 'mem_limit': '8g', 'max_concurrent': 2},
+        'detetcion': {'nano_cpus': 2 * 10 ** 9, 'mem_limit': '4g', 'max_concurrent': 4},
+    }
+
+    # 算法任务准入控制（容量不足时排队，租约释放后调度）
+    ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true'
+    ADMISSION_GLOBAL_MAX = int(os.getenv('ADMISSION_GLOBAL_MAX', max(1, (os.cpu_count() or 2) // 2)))  # 主机同时运行的算法容器上限
+    ADMISSION_LEASE_TTL = 7200  # 租约有效期（秒），进程崩溃后租约到期自动回收
+    ADMISSION_PUMP_INTERVAL = 5.0  # 定时调度等待队列的间隔（秒）
+
+    # 镜像清单缓存配置
+    IMAGE_INVENTORY_LOCAL_TTL = 5  # 进程内缓存刷新间隔（秒）
+    IMAGE_INVENTORY_WATCH_WINDOW = 30  # 事件订阅窗口（秒），事件到达即更新清单，每个窗口结束时续期监听锁
+
+    # 同镜像测试任务微批配置
+    BATCH_ENABLED = os.getenv('BATCH_ENABLED', 'true').lower() == 'true'
+    BATCH_IMAGE_PREFIXES = ['detetcion-seed-leaf']  # 启用微批的镜像（按名称前缀匹配）
+    BATCH_WINDOW = float(os.getenv('BATCH_WINDOW', 2))  # 聚合窗口（秒）
+    BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', 16))  # 单批最多文件数（按各任务输入文件数累计，单个任务超出时独占一批）
+
+    # 算法结果缓存配置（按镜像摘要 + 指令 + 输入内容寻址）
+    RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+    RESULT_CACHE_FOLDER = Path(r'/home/zhaohonglong/workspace/Crop_Data/cache/results').resolve()
+    RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', 10 * 1024 ** 3))  # 缓存磁盘上限，默认10GB
+
+    # Redis Stream 任务队列配置
+    TASK_QUEUE_VISIBILITY_TIMEOUT = int(os.getenv('TASK_QUEUE_VISIBILITY_TIMEOUT', 300))  # 未确认任务被重新认领前的空闲时间（秒）
+    TASK_QUEUE_MAX_DELIVERIES = 3  # 最大投递次数，超过后转入死信流
+    TASK_QUEUE_BATCH_SIZE = 10  # 单次读取任务数
+    TASK_EXECUTOR_CONCURRENCY = int(os.getenv('TASK_EXECUTOR_CONCURRENCY', 8))  # 执行端并发处理任务数
+
+    # 异步容器监管服务配置（开启后 Celery 任务只负责提交，由独立监管进程驱动容器）
+    SUPERVISOR_ENABLED = os.getenv('SUPERVISOR_ENABLED', 'false').lower() == 'true'
+    SUPERVISOR_QUEUE = 'container_jobs'
+    SUPERVISOR_MAX_CONTAINERS = int(os.getenv('SUPERVISOR_MAX_CONTAINERS', 32))  # 同时运行的容器上限
+    SUPERVISOR_API_THREADS = int(os.getenv('SUPERVISOR_API_THREADS', 8))  # Docker API 短调用线程数
+    SUPERVISOR_WAIT_POLL_INTERVAL = 30  # 等待 die 事件超时后主动查询容器状态的间隔（秒），防止漏掉事件导致任务卡住
+
+    # 算法输入文件校验配置
+    INPUT_VALIDATION_LEVEL = os.getenv('INPUT_VALIDATION_LEVEL', 'verify')  # header / verify / decode（完整解码）
+    INPUT_VALIDATION_WORKERS = int(os.getenv('INPUT_VALIDATION_WORKERS', 2))  # 每个进程的并发校验进程数（Celery 每个子进程各有一个进程池）
+    INPUT_VALIDATION_CACHE_TTL = 86400  # 校验结果缓存时间（秒）
+
+    # 全文检索配置（MySQL FULLTEXT ngram / SQLite FTS5，关闭或不支持时回退到 ilike）
+    SEARCH_FULLTEXT_ENABLED = os.getenv('SEARCH_FULLTEXT_ENABLED', 'true').lower() == 'true'
+    SEARCH_NGRAM_TOKEN_SIZE = int(os.getenv('SEARCH_NGRAM_TOKEN_SIZE', 2))  # 与 MySQL ngram_token_size 保持一致
+
+    # 标签词表缓存配置（进程内 + Redis，写入时递增版本号失效）
+    TAG_CACHE_TTL = 3600  # Redis 中词表的保留时间（秒）
+    TAG_CACHE_LOCAL_TTL = 5  # 进程内缓存检查版本号的间隔（秒）
+
+    # 分页总数配置（按过滤条件缓存，写入时递增版本号失效）
+    SEARCH_COUNT_CACHE_TTL = 60  # 总数缓存时间（秒）
+    SEARCH_APPROXIMATE_COUNT_CAP = 1000  # 近似模式下最多统计的行数，超出返回 1000+
+
+    # 算法输入压缩包配置（zip / tar / tar.gz 流式解压到任务输入目录）
+    ARCHIVE_MAX_ENTRIES = 100000  # 单个压缩包最多文件数
+    ARCHIVE_MAX_ENTRY_SIZE = 200 * 1024 * 1024  # 单个文件解压后上限
+    ARCHIVE_MAX_TOTAL_SIZE = 50 * 1024 * 1024 * 1024  # 解压后总大小上限
+
+    # 任务目录保留配置（到期后由定时清理任务删除）
+    TASK_RETENTION_DEFAULT = int(os.getenv('TASK_RETENTION_DEFAULT', 86400))  # 默认保留 1 天
+    TASK_RETENTION_BY_MODEL = load_retention_map('TASK_RETENTION_BY_MODEL')  # 模型ID -> 保留秒数
+    TASK_RETENTION_BY_USER = load_retention_map('TASK_RETENTION_BY_USER')  # 用户ID -> 保留秒数（优先于模型配置）
+    CLEANUP_BATCH_SIZE = 500  # 每批认领的目录组数
+    CLEANUP_WORKERS = 8  # 并行删除线程数
+
+    # 任务容器日志配置（写入 Redis Stream，任务结果只保留尾部）
+    TASK_LOG_MAX_LINES = int(os.getenv('TASK_LOG_MAX_LINES', 10000))  # 单个任务日志流最多保留行数
+    TASK_LOG_TAIL = int(os.getenv('TASK_LOG_TAIL', 200))  # 任务结果中保留的日志行数
+    TASK_LOG_FLUSH_LINES = 100  # 缓冲多少行后批量写入
+    TASK_LOG_FLUSH_INTERVAL = 1.0  # 最长刷新间隔（秒）
+    TASK_LOG_TTL = 86400  # 日志流过期时间（秒）
+
+    # 任务状态推送配置（SSE）
+    TASK_EVENTS_TTL = 86400  # 最近一次事件保留时间（秒）
+    TASK_EVENTS_HEARTBEAT = 15  # 心跳间隔（秒），防止代理断开空闲连接
+    TASK_EVENTS_MAX_DURATION = 600  # 单个连接最长保持时间（秒），到期后客户端自动重连
+
     # 上传图片存储路径配置
     FILE_BASE_URL = "http://10.0.4.71:8080/file/"
     LOCAL_FILE_BASE = "/home/zhaohonglong/workspace/Crop_Data"
@@ -78,6 +191,16 @@ class FileConfig:
 
     TEMP_DIR = "/home/zhaohonglong/workspace/Crop_Data/storage/temp"  # 临时存储目录
     TEMP_BASE_URL = "storage/temp"  # 临时文件访问基础路径
+    TEMP_CLEANUP_BATCH_SIZE = 500  # 每批清理的过期临时文件数
+    TEMP_CLEANUP_WORKERS = 8  # 并行删除线程数
+    UPLOAD_CHUNK_SIZE = 1024 * 1024  # 流式保存上传文件的分块大小（1MB）
+    BLOB_DIR = "storage/blobs"  # 内容寻址对象目录（相对 LOCAL_FILE_BASE，需与 user_data 同一文件系统）
+    BLOB_GC_GRACE = 3600  # 引用计数归零后保留时长（秒）
+
+    # 分片续传配置
+    UPLOAD_SESSION_TTL = 24 * 3600  # 上传会话无写入后的保留时长（秒）
+    UPLOAD_SESSION_MAX_CHUNK = 32 * 1024 * 1024  # 单个分片请求的最大字节数（需小于 MAX_CONTENT_LENGTH）
+    CHUNKED_UPLOAD_RESULT_TTL = 6 * 3600  # 分片上传完成后临时文件的保留时长（秒），大文件提交或解压耗时较长
 
     # 上传文件配置
     UPLOAD_CONFIG = {
@@ -96,8 +219,10 @@ class FileConfig:
         "dataset": {
             "subdirectory": "{user_id}/dataset/{data_id}/{file_type}",
             "allowed_extensions": ["jpg", "png", "jpeg"],
-            "file_types": ["readme"],
-            "max_size": 100 * 1024 * 1024  # 500MB
+            "file_types": ["readme", "archive"],
+            "max_size": 100 * 1024 * 1024,  # 500MB
+            "archive_extensions": ["zip", "tar", "gz", "tgz"],  # archive 类型允许的压缩包格式
+            "archive_max_size": 20 * 1024 * 1024 * 1024  # 压缩包通过分片续传上传，上限20GB
         }
     }
 
@@ -35,6 +35,7 @@ class RedisConnectionPool:
         self.redis_password = os.getenv('REDIS_PASSWORD', None)
         # 初始化连接池
         self.pools = self._create_pools()
+        self._clients = {}
         logger.info("Redis 连接池初始化完成")
 
         # 在 Redis 连接池初始化代码中打印进程信息
@@ -99,6 +100,18 @@ class RedisConnectionPool:
 
         }
 
+    def get_client(self, pool_name: str = 'default') -> redis.Redis:
+        """
+        获取长期持有的客户端（线程安全，按需从连接池取连接）
+        适用于高频调用的后台服务，不做逐次 PING，失效连接由连接池健康检查处理
+        """
+        client = self._clients.get(pool_name)
+        if client is None:
+            if pool_name not in self.pools:
+                raise ValueError(f"无效的连接池名称: {pool_name}")
+            client = self._clients[pool_name] = redis.Redis(connection_pool=self.pools[pool_name])
+        return client
+
     @contextmanager
     def get_redis_connection(self, pool_name: str = 'default') -> redis.Redis:
         """
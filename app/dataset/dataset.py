@@ -6,6 +6,8 @@ from sqlalchemy.ext.hybrid import hybrid_property
 from app.core.redis_connection_pool import redis_pool
 from app.exts import db
 from app.order.order import OrderStatus, Order
+from app.search import fulltext
+from app.tag.tag_service import register_taggable
 
 
 class Dataset(db.Model):
@@ -34,6 +36,8 @@ class Dataset(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     user = db.relationship("User", back_populates="datasets")
+    # type 字段拆分后的标签（由 type 自动同步，见 TagService）
+    tags = db.relationship("Tag", secondary="dataset_tag_table", lazy="select")
     # stars = db.relationship("Star", back_populates="dataset", lazy="dynamic")
     # orders = db.relationship("Order", back_populates="dataset", lazy="dynamic")
 
@@ -86,3 +90,10 @@ class Dataset(db.Model):
     #         (Order.model_id == cls.id) &
     #         (Order.status == OrderStatus.COMPLETED)
     #     ).label("sales_count")
+
+
+# 名称、描述建立全文索引
+fulltext.register(Dataset, 'name', 'description')
+
+# type 字段变化时同步标签关联
+register_taggable(Dataset)
@@ -3,6 +3,9 @@ from app.utils.common.common_service import CommonService
 from app.core.exception import InvalidSizeError, ValidationError, logger
 from app.exts import db
 from app.dataset.dataset import Dataset
+from app.search.fulltext import FullTextSearch
+from app.tag.tag_cache import TagCache
+from sqlalchemy import Numeric, case, cast, func
 from sqlalchemy.orm import joinedload
 
 from app.utils.common.pagination import PaginationHelper
@@ -28,13 +31,9 @@ class DatasetRepository:
         return Dataset.query.get(dataset_id)
 
     @staticmethod
-    def get_all_type_strings():
-        """直接查询所有模型的 type 字段（仅返回非空值）"""
-        return [
-            result[0]
-            for result in Dataset.query.with_entities(Dataset.type).filter(Dataset.type is not None).all()
-            if result[0]  # 过滤空字符串
-        ]
+    def get_tag_vocabulary():
+        """已使用的标签名及使用次数（缓存）"""
+        return TagCache.vocabulary(Dataset)
 
     @staticmethod
     def get_by_name(name: str):
@@ -54,17 +53,21 @@ class DatasetRepository:
                 joinedload(Dataset.user),
             )
 
-            # 模糊查询数据集名称
-            if params.get('name'):
-                query = query.filter(Dataset.name.ilike(f"%{params.get('name')}%"))
-
-            # 添加描述字段的查询条件
-            if params.get('description'):
-                query = query.filter(Dataset.description.ilike(f"%{params.get('description')}%"))
+            # 名称、描述走全文索引
+            query, relevance = FullTextSearch.apply(query, Dataset, {
+                'name': params.get('name'),
+                'description': params.get('description')
+            })
 
             # 精确查询多个标签（支持多标签模糊查询）
             if params.get('type'):
-                query = CommonService.process_and_filter_tags(query, Dataset.type, params.get('type'))
+                query = CommonService.process_and_filter_tags(
+                    query, Dataset, params.get('type'), params.get('tag_mode', 'and')
+                )
+
+            # 大小范围在 SQL 中过滤，分页和总数与返回的数据一致
+            if params.get('size_min') or params.get('size_max'):
+                query = DatasetRepository.filter_by_size(query, params.get('size_min'), params.get('size_max'))
 
             #     # 根据 sort_by 和 sort_order 排序
             # if params.get('sort_by') in DatasetRepository.SORT_BY_CHOICES:
@@ -85,20 +88,66 @@ class DatasetRepository:
             # elif not params.get("page", 1) and not params.get('sort_order', 5):
             #     pass
 
+            sort_by = params.get('sort_by')
+            if sort_by == 'relevance':
+                # 按相关度排序；未使用全文索引（检索词过短等）时保持默认顺序
+                if relevance is not None:
+                    query = query.order_by(relevance.desc(), Dataset.id.asc())
+                sort_by = None
+
             print(f"SQL Query: {str(query)}")
+            if PaginationHelper.use_cursor(params):
+                # 游标分页：不统计总数，按索引顺序定位下一页
+                return PaginationHelper.paginate_cursor(
+                    query=query,
+                    cursor=params.get('cursor'),
+                    per_page=per_page,
+                    sort_mapping=DatasetRepository.SORT_FIELD_MAPPING,
+                    sort_by=sort_by,
+                    sort_order=params.get('sort_order', 'asc')
+                )
+
             # 调用通用分页方法
             return PaginationHelper.paginate(
                 query=query,
                 page=page,
                 per_page=per_page,
                 sort_mapping=DatasetRepository.SORT_FIELD_MAPPING,
-                sort_by=params.get('sort_by'),
-                sort_order=params.get('sort_order', 'asc')
+                sort_by=sort_by,
+                sort_order=params.get('sort_order', 'asc'),
+                count_params=params,
+                count_mode=params.get('count', 'exact')
             )
         except Exception as e:
             logger.error("模型查询失败｜%s", str(e), exc_info=True)
             raise
 
+    @staticmethod
+    def size_in_bytes():
+        """
+        size 字段（如 100MB、1.5GB）换算为字节数的 SQL 表达式，与 convert_size_to_bytes 规则一致
+        单位无法识别时为 NULL（不参与范围比较）
+        """
+        size_str = func.upper(func.trim(Dataset.size))
+        multiplier = case(
+            (size_str.like('%KB'), 1024),
+            (size_str.like('%MB'), 1024 ** 2),
+            (size_str.like('%GB'), 1024 ** 3),
+            else_=None
+        )
+        number = cast(func.substr(size_str, 1, func.length(size_str) - 2), Numeric(20, 4))
+        return number * multiplier
+
+    @staticmethod
+    def filter_by_size(query, size_min=None, size_max=None):
+        """按大小范围过滤（None 代表不限制）"""
+        size_bytes = DatasetRepository.size_in_bytes()
+        if size_min:
+            query = query.filter(size_bytes >= DatasetRepository.convert_size_to_bytes(size_min))
+        if size_max:
+            query = query.filter(size_bytes <= DatasetRepository.convert_size_to_bytes(size_max))
+        return query
+
     @staticmethod
     def convert_size_to_bytes(size_str):
         """将 100MB, 1GB 转换为字节数"""
@@ -2,7 +2,10 @@ from app import Dataset
 from app.core.exception import DatabaseError, NotFoundError, logger
 from app.dataset.dataset_repo import DatasetRepository
 from app.exts import db
+from app.tag.tag_cache import TagCache
+from app.utils.common.count_cache import CountCache
 from app.utils.common.json_encoder import ResponseBuilder
+from app.utils.common.pagination import PaginationHelper
 
 
 class DatasetService:
@@ -30,26 +33,21 @@ class DatasetService:
         page = max(1, int(search_params.get("page", 1)))
         per_page = min(100, max(1, int(search_params.get("per_page", 5))))
 
-        total_count, datasets = DatasetRepository.search(
-            search_params,
-            page=page,
-            per_page=per_page
-        )
-
-        # 转换大小为字节（None 代表不限制）
-        min_size_value = DatasetRepository.convert_size_to_bytes(search_params.get('size_min')) if search_params.get(
-            'size_min') else None
-        max_size_value = DatasetRepository.convert_size_to_bytes(search_params.get('size_max')) if search_params.get(
-            'size_max') else None
-
-        if search_params.get('size_min') or search_params.get('size_max'):
-            datasets = [
-                dataset for dataset in datasets
-                if DatasetService._is_size_in_range(dataset.size, min_size_value, max_size_value)
-            ]
+        cursor_mode = PaginationHelper.use_cursor(search_params)
+        if cursor_mode:
+            datasets, next_cursor = DatasetRepository.search(search_params, per_page=per_page)
+        else:
+            total_count, datasets = DatasetRepository.search(
+                search_params,
+                page=page,
+                per_page=per_page
+            )
 
         # 构建返回数据
         items = [DatasetService._convert_to_dict(dataset) for dataset in datasets]
+        if cursor_mode:
+            return ResponseBuilder.cursor_response(items, per_page, next_cursor), 200
+
         response_data = ResponseBuilder.paginated_response(
             items=items,
             total_count=total_count,
@@ -68,6 +66,8 @@ class DatasetService:
         try:
             DatasetRepository.save_dataset(dataset_instance)
             db.session.commit()
+            TagCache.invalidate(Dataset)
+            CountCache.invalidate(Dataset)
             return dataset_instance.to_dict(), 201
         except Exception as e:
             db.session.rollback()
@@ -84,6 +84,8 @@ class DatasetService:
         try:
             DatasetRepository.save_dataset(dataset_instance)
             db.session.commit()
+            TagCache.invalidate(Dataset)
+            CountCache.invalidate(Dataset)
             return dataset_instance.to_dict(), 200
         except Exception as e:
             db.session.rollback()
@@ -100,6 +102,8 @@ class DatasetService:
             DatasetRepository.delete_dataset(dataset)
 
             db.session.commit()
+            TagCache.invalidate(Dataset)
+            CountCache.invalidate(Dataset)
             return {"message": "数据删除成功"}, 204
         except NotFoundError as ne:
             logger.error(f"Dataset with ID {instance.id} not found: {str(ne)}")
@@ -114,19 +118,3 @@ class DatasetService:
         """将数据集转换为字典格式"""
         # 假设 dataset 是一个模型对象，转换为字典
         return dataset.to_dict()  # 假设你有一个 to_dict 方法
-
-    @staticmethod
-    def _is_size_in_range(size_str, min_size, max_size):
-        """判断数据集大小是否在范围内"""
-        if not size_str:
-            return False
-
-        # 将 size_str 转换为字节数
-        dataset_size_bytes = DatasetRepository.convert_size_to_bytes(size_str)
-
-        # 判断是否在范围内
-        if min_size is not None and dataset_size_bytes < min_size:
-            return False
-        if max_size is not None and dataset_size_bytes > max_size:
-            return False
-        return True
@@ -0,0 +1,188 @@
+import json
+import time
+
+from app.config import Config
+from app.core.exception import logger
+from app.core.redis_connection_pool import redis_pool
+from app.docker.core.celery_app import CeleryManager
+
+# 原子申请租约：清理过期租约后检查镜像并发上限与全局容量
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+if not redis.call('ZSCORE', KEYS[1], ARGV[5]) then
+    if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) or redis.call('ZCARD', KEYS[2]) >= tonumber(ARGV[4]) then
+        return 0
+    end
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[5])
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[5])
+return 1
+"""
+
+# 原子出队：队首任务获得租约后才出队；队列为空时从待调度镜像集合中移除
+ADMIT_NEXT_SCRIPT = """
+local head = redis.call('LINDEX', KEYS[3], 0)
+if not head then
+    redis.call('SREM', KEYS[4], ARGV[5])
+    return false
+end
+local now = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) or redis.call('ZCARD', KEYS[2]) >= tonumber(ARGV[4]) then
+    return false
+end
+local lease = cjson.decode(head)['lease']
+redis.call('ZADD', KEYS[1], ARGV[2], lease)
+redis.call('ZADD', KEYS[2], ARGV[2], lease)
+redis.call('LPOP', KEYS[3])
+return head
+"""
+
+
+def get_resource_profile(image_name):
+    """按镜像名称前缀匹配资源配置（最长前缀优先），未匹配时使用默认配置"""
+    profile = dict(Config.RESOURCE_DEFAULT_PROFILE)
+    matches = [prefix for prefix in Config.RESOURCE_PROFILES if image_name.startswith(prefix)]
+    if matches:
+        profile.update(Config.RESOURCE_PROFILES[max(matches, key=len)])
+    return profile
+
+
+def container_resource_options(image_name):
+    """容器资源限制参数（CPU 配额、内存上限，禁止使用额外 swap）"""
+    profile = get_resource_profile(image_name)
+    options = {}
+    if profile.get('nano_cpus'):
+        options['nano_cpus'] = int(profile['nano_cpus'])
+    if profile.get('mem_limit'):
+        options['mem_limit'] = profile['mem_limit']
+        options['memswap_limit'] = profile['mem_limit']
+    return options
+
+
+class AdmissionController:
+    """
+    算法容器准入控制
+    - 每个运行中的任务持有一份租约（Redis ZSET，分值为过期时间，进程崩溃后租约自动失效）
+    - 镜像租约数不超过 max_concurrent，全部租约数不超过 ADMISSION_GLOBAL_MAX
+    - 容量不足时任务签名进入该镜像的等待队列，租约释放或定时任务触发时按先进先出调度
+    """
+
+    LEASES_KEY = 'admission:leases'
+    PENDING_IMAGES_KEY = 'admission:pending_images'
+
+    @classmethod
+    def _image_leases_key(cls, image_name):
+        return f"{cls.LEASES_KEY}:{image_name}"
+
+    @staticmethod
+    def _pending_key(image_name):
+        return f"admission:pending:{image_name}"
+
+    @staticmethod
+    def _capacity_args(image_name):
+        """脚本参数：当前时间、租约过期时间、镜像并发上限、全局上限"""
+        now = time.time()
+        return [
+            now,
+            now + Config.ADMISSION_LEASE_TTL,
+            get_resource_profile(image_name)['max_concurrent'],
+            Config.ADMISSION_GLOBAL_MAX
+        ]
+
+    @classmethod
+    def submit(cls, image_name, signature):
+        """
+        提交任务：有容量时立即派发，否则进入等待队列
+        :param signature: 已指定 task_id 的 Celery 任务签名，task_id 即租约ID
+        :return: True 已派发；False 排队等待
+        """
+        if not Config.ADMISSION_ENABLED:
+            signature.apply_async()
+            return True
+
+        lease_id = signature.options['task_id']
+        with redis_pool.get_redis_connection('tasks') as conn:
+            acquire = conn.register_script(ACQUIRE_SCRIPT)
+            admitted = acquire(
+                keys=[cls._image_leases_key(image_name), cls.LEASES_KEY],
+                args=cls._capacity_args(image_name) + [lease_id]
+            )
+            if not admitted:
+                pipe = conn.pipeline()
+                pipe.rpush(cls._pending_key(image_name), json.dumps({'lease': lease_id, 'signature': dict(signature)}))
+                pipe.sadd(cls.PENDING_IMAGES_KEY, image_name)
+                position = pipe.execute()[0]
+                logger.info("镜像 %s 容量已满，任务 %s 排队等待（第 %s 位）", image_name, lease_id, position)
+                return False
+
+        cls._dispatch(image_name, lease_id, signature)
+        return True
+
+    @classmethod
+    def _dispatch(cls, image_name, lease_id, signature):
+        try:
+            signature.apply_async()
+        except Exception:
+            cls.release(image_name, lease_id, pump=False)
+            raise
+
+    @classmethod
+    def release(cls, image_name, lease_id, pump=True):
+        """释放租约，并尝试调度等待中的任务"""
+        if not Config.ADMISSION_ENABLED:
+            return
+        try:
+            with redis_pool.get_redis_connection('tasks') as conn:
+                pipe = conn.pipeline()
+                pipe.zrem(cls._image_leases_key(image_name), lease_id)
+                pipe.zrem(cls.LEASES_KEY, lease_id)
+                pipe.execute()
+        except Exception as e:
+            logger.warning("释放容器租约失败 %s: %s", lease_id, str(e))
+            return
+        if pump:
+            cls.pump()
+
+    @classmethod
+    def pump(cls):
+        """按镜像依次调度等待队列中可获得容量的任务"""
+        celery = CeleryManager.get_celery()
+        dispatched = 0
+        with redis_pool.get_redis_connection('tasks') as conn:
+            admit_next = conn.register_script(ADMIT_NEXT_SCRIPT)
+            for image_name in conn.smembers(cls.PENDING_IMAGES_KEY):
+                while True:
+                    raw = admit_next(
+                        keys=[
+                            cls._image_leases_key(image_name),
+                            cls.LEASES_KEY,
+                            cls._pending_key(image_name),
+                            cls.PENDING_IMAGES_KEY
+                        ],
+                        args=cls._capacity_args(image_name) + [image_name]
+                    )
+                    if not raw:
+                        break
+                    entry = json.loads(raw)
+                    try:
+                        cls._dispatch(image_name, entry['lease'], celery.signature(entry['signature']))
+                        dispatched += 1
+                    except Exception as e:
+                        # 派发失败放回队首，等待下次调度
+                        conn.lpush(cls._pending_key(image_name), raw)
+                        conn.sadd(cls.PENDING_IMAGES_KEY, image_name)
+                        logger.error("派发排队任务失败 %s: %s", entry['lease'], str(e))
+                        break
+        if dispatched:
+            logger.info("准入控制已调度排队任务 %s 个", dispatched)
+        return dispatched
+
+
+@CeleryManager.get_celery().task
+def pump_admission():
+    """定时调度等待队列（兜底过期租约释放后的容量）"""
+    return AdmissionController.pump()
@@ -0,0 +1,339 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import uuid
+from pathlib import Path
+
+from app.config import Config
+from app.core.exception import logger, ImageProcessingError
+from app.core.redis_connection_pool import redis_pool
+from app.docker.core.admission import AdmissionController
+from app.docker.core.celery_app import CeleryManager
+from app.docker.core.docker_clinet import docker_client
+from app.docker.core.result_cache import result_cache
+from app.docker.core.task_events import TaskEvents
+from app.docker.core.task import build_container_command, mark_task_started, mark_task_done, mark_task_failed, \
+    run_algorithm, UPLOAD_FOLDER, OUTPUT_FOLDER
+from app.utils.file_process import classify_files
+from app.utils.input_validator import InputValidator
+
+# 批内文件名前缀分隔符：<task_id>__<原文件名>
+BATCH_SEPARATOR = '__'
+
+# 按行拆分的汇总类输出文件
+LINE_SPLIT_SUFFIXES = {'.txt', '.csv'}
+
+# 原子取出一批任务：按条目累计文件数，不超过单批文件上限（至少取一个条目）
+TAKE_SCRIPT = """
+local max_files = tonumber(ARGV[1])
+local entries = redis.call('LRANGE', KEYS[1], 0, max_files - 1)
+local taken, files = {}, 0
+for _, raw in ipairs(entries) do
+    local count = tonumber(cjson.decode(raw)['file_count'] or 1)
+    if #taken > 0 and files + count > max_files then
+        break
+    end
+    files = files + count
+    table.insert(taken, raw)
+end
+if #taken > 0 then
+    redis.call('LTRIM', KEYS[1], #taken, -1)
+    redis.call('DECRBY', KEYS[2], files)
+end
+redis.call('DEL', KEYS[3])
+return {taken, redis.call('LLEN', KEYS[1])}
+"""
+
+
+class BatchCollector:
+    """
+    测试任务微批收集器
+    同一 (镜像, 指令) 的提交在时间窗口内聚合，达到窗口时长或批大小后由一个容器统一处理
+    """
+
+    @staticmethod
+    def is_enabled(image_name):
+        """判断镜像是否启用微批"""
+        return Config.BATCH_ENABLED and any(
+            image_name.startswith(prefix) for prefix in Config.BATCH_IMAGE_PREFIXES
+        )
+
+    @staticmethod
+    def _batch_key(image_name, instruction):
+        digest = hashlib.sha1((instruction or '').encode('utf-8')).hexdigest()[:12]
+        return f"batch:{image_name}:{digest}"
+
+    @classmethod
+    def submit(cls, image_name, instruction, input_dir, task_id):
+        """加入待处理批次，必要时调度批处理任务"""
+        batch_key = cls._batch_key(image_name, instruction)
+        file_count = max(1, sum(1 for _ in Path(input_dir).glob('*')))
+        entry = json.dumps({'task_id': task_id, 'input_dir': str(input_dir), 'file_count': file_count})
+
+        with redis_pool.get_redis_connection('tasks') as conn:
+            pipe = conn.pipeline()
+            pipe.rpush(batch_key, entry)
+            pipe.incrby(f"{batch_key}:files", file_count)
+            pipe.expire(batch_key, 3600)
+            pipe.expire(f"{batch_key}:files", 3600)
+            size, files = pipe.execute()[:2]
+
+            if files >= Config.BATCH_MAX_SIZE:
+                # 批已满，立即处理
+                cls._dispatch(image_name, instruction, batch_key, countdown=0)
+            elif conn.set(f"{batch_key}:scheduled", 1, nx=True, ex=int(Config.BATCH_WINDOW * 2) + 1):
+                # 窗口内第一个提交负责调度
+                cls._dispatch(image_name, instruction, batch_key, countdown=Config.BATCH_WINDOW)
+
+        logger.info("任务 %s 已加入批次 %s（当前 %s 个任务、%s 个文件）", task_id, batch_key, size, files)
+
+    @staticmethod
+    def _dispatch(image_name, instruction, batch_key, countdown):
+        # 一个批次占用一个容器，同样经过准入控制
+        AdmissionController.submit(image_name, run_algorithm_batch.signature(
+            args=(image_name, instruction, batch_key),
+            countdown=countdown,
+            task_id=str(uuid.uuid4())
+        ))
+
+    @classmethod
+    def take(cls, batch_key):
+        """原子地取出一批任务，批内文件总数不超过 BATCH_MAX_SIZE"""
+        with redis_pool.get_redis_connection('tasks') as conn:
+            take = conn.register_script(TAKE_SCRIPT)
+            raw_entries, remaining = take(
+                keys=[batch_key, f"{batch_key}:files", f"{batch_key}:scheduled"],
+                args=[Config.BATCH_MAX_SIZE]
+            )
+        return [json.loads(raw) for raw in raw_entries], remaining
+
+
+def submit_test_task(image_name, instruction, input_dir, task_id):
+    """提交测试任务：启用微批的镜像加入批次，否则经准入控制单独运行"""
+    # 先发布 PENDING 再派发任务，避免执行较快的任务（如结果缓存命中）的后续状态被覆盖
+    TaskEvents.publish(task_id, 'PENDING')
+    if BatchCollector.is_enabled(image_name):
+        # 同镜像提交聚合后由一个容器统一处理
+        BatchCollector.submit(image_name, instruction, input_dir, task_id)
+    else:
+        # 经过准入控制：镜像或主机容量不足时排队等待
+        AdmissionController.submit(image_name, run_algorithm.signature(
+            args=(str(input_dir), task_id, image_name, instruction),
+            task_id=task_id
+        ))
+
+
+def stage_batch_inputs(entries, batch_input_dir):
+    """
+    把各任务的输入文件以 <task_id>__<文件名> 链接到同一批次目录
+    :return: ({task_id: 输入目录}, {task_id: 异常})
+    """
+    batch_input_dir.mkdir(parents=True, exist_ok=True)
+    staged, failed = {}, {}
+
+    # 整批文件一次性并发校验
+    task_files = {entry['task_id']: list(Path(entry['input_dir']).glob('*')) for entry in entries}
+    errors = InputValidator.validate_files([f for files in task_files.values() for f in files])
+
+    for entry in entries:
+        task_id = entry['task_id']
+        input_dir = Path(entry['input_dir'])
+        try:
+            files = task_files[task_id]
+            if not files:
+                raise RuntimeError("文件不存在")
+
+            for file_path in files:
+                if file_path in errors:
+                    raise ImageProcessingError(errors[file_path])
+                target = batch_input_dir / f"{task_id}{BATCH_SEPARATOR}{file_path.name}"
+                try:
+                    os.link(file_path, target)
+                except OSError:
+                    shutil.copy2(file_path, target)
+            staged[task_id] = input_dir
+        except Exception as e:
+            logger.warning("批次输入暂存失败 [%s]: %s", task_id, str(e))
+            failed[task_id] = e
+
+    os.chmod(batch_input_dir, 0o777)
+    return staged, failed
+
+
+def split_batch_outputs(batch_output_dir, task_dirs):
+    """
+    按任务前缀把批次输出拆回各任务输出目录
+    - 文件名含任务前缀：复制到对应任务并去掉前缀
+    - txt/csv 汇总文件：按行拆分，第一条含任务前缀的行之前的内容（表头）复制给每个任务
+    - 批次内有多个任务时，无法确定归属的文件或数据行不复制给任何任务（批次内任务可能来自不同用户），
+      整批输出都不拆分，由调用方对这些任务逐个重新运行
+    :return: 未能拆分的任务ID集合
+    """
+    owner_pattern = re.compile(
+        '(' + '|'.join(re.escape(task_id) for task_id in task_dirs) + ')' + re.escape(BATCH_SEPARATOR)
+    )
+
+    def strip_prefix(text):
+        return owner_pattern.sub('', text)
+
+    paths = sorted(batch_output_dir.glob('*'))
+    if len(task_dirs) == 1:
+        # 只有一个任务时输出全部属于该任务
+        task_dir = next(iter(task_dirs.values()))
+        for path in paths:
+            target = task_dir / strip_prefix(path.name)
+            if path.is_dir():
+                shutil.copytree(path, target, dirs_exist_ok=True)
+            else:
+                shutil.copy2(path, target)
+        return set()
+
+    # 先确认所有输出都能确定归属，再写入任务目录
+    split_lines = {}
+    for path in paths:
+        if owner_pattern.search(path.name):
+            continue
+        if path.is_dir() or path.suffix.lower() not in LINE_SPLIT_SUFFIXES:
+            logger.warning("批次输出 %s 无法确定所属任务", path.name)
+            return set(task_dirs)
+        header, lines = [], {}
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                line_owners = set(owner_pattern.findall(line))
+                if not line_owners:
+                    if not lines:
+                        header.append(line)
+                        continue
+                    logger.warning("批次输出 %s 含无法确定所属任务的数据行", path.name)
+                    return set(task_dirs)
+                for task_id in line_owners:
+                    lines.setdefault(task_id, []).append(strip_prefix(line))
+        if not lines:
+            logger.warning("批次输出 %s 无法确定所属任务", path.name)
+            return set(task_dirs)
+        split_lines[path] = (header, lines)
+
+    for path in paths:
+        if path in split_lines:
+            header, lines = split_lines[path]
+            for task_id, task_lines in lines.items():
+                with open(task_dirs[task_id] / path.name, 'w', encoding='utf-8') as f:
+                    f.writelines(header + task_lines)
+            continue
+        for task_id in set(owner_pattern.findall(path.name)):
+            target = task_dirs[task_id] / strip_prefix(path.name)
+            if path.is_dir():
+                shutil.copytree(path, target, dirs_exist_ok=True)
+            else:
+                shutil.copy2(path, target)
+    return set()
+
+
+@CeleryManager.get_celery().task(bind=True)
+def run_algorithm_batch(self, image_name, instruction, batch_key):
+    """批处理任务：一个容器处理一批测试任务，并把结果写回各自的任务ID"""
+    entries, remaining = BatchCollector.take(batch_key)
+    if remaining:
+        # 仍有积压，继续调度下一批
+        BatchCollector._dispatch(image_name, instruction, batch_key, countdown=0)
+    if not entries:
+        AdmissionController.release(image_name, self.request.id)
+        return {'status': 'EMPTY'}
+
+    batch_id = uuid.uuid4().hex
+    batch_input_dir = UPLOAD_FOLDER / image_name / f"batch_{batch_id}"
+    batch_output_dir = OUTPUT_FOLDER / image_name / f"batch_{batch_id}"
+    logger.info(f"\n=== 批次启动 [{batch_id}] 共 {len(entries)} 个任务 ===")
+
+    pending = {entry['task_id'] for entry in entries}
+    try:
+        for entry in entries:
+            mark_task_started(entry['task_id'], batch_id=batch_id)
+
+        # 命中结果缓存的任务直接完成，不进入容器
+        image_digest = docker_client.get_image_digest(image_name) if result_cache.enabled else None
+        cache_keys, misses = {}, []
+        for entry in entries:
+            task_id = entry['task_id']
+            if image_digest:
+                cache_key = result_cache.build_key(
+                    image_digest, instruction, result_cache.hash_input_dir(entry['input_dir'])
+                )
+                task_dir = OUTPUT_FOLDER / image_name / f"task_{task_id}"
+                cached_files = result_cache.lookup(image_name, image_digest, cache_key, task_dir)
+                if cached_files:
+                    mark_task_done(task_id, {
+                        'status': 'SUCCESS',
+                        'processed_files': classify_files(cached_files, image_name, task_id),
+                        'logs': ''
+                    })
+                    pending.discard(task_id)
+                    continue
+                cache_keys[task_id] = cache_key
+            misses.append(entry)
+        if not misses:
+            return {'status': 'SUCCESS', 'batch_id': batch_id, 'tasks': []}
+
+        staged, failed = stage_batch_inputs(misses, batch_input_dir)
+        for task_id, error in failed.items():
+            mark_task_failed(task_id, error)
+            pending.discard(task_id)
+        if not staged:
+            return {'status': 'FAILURE', 'batch_id': batch_id}
+
+        batch_output_dir.mkdir(parents=True, exist_ok=True)
+        container_info = docker_client.run_algorithm_container(
+            image_name=image_name,
+            host_input_dir=batch_input_dir,
+            host_output_dir=batch_output_dir,
+            command=build_container_command(instruction)
+        )
+
+        task_dirs = {}
+        for task_id in staged:
+            task_dir = OUTPUT_FOLDER / image_name / f"task_{task_id}"
+            task_dir.mkdir(parents=True, exist_ok=True)
+            task_dirs[task_id] = task_dir
+        unresolved = split_batch_outputs(batch_output_dir, task_dirs)
+        for task_id in unresolved:
+            # 批次输出无法拆分，按单任务流程重新运行
+            shutil.rmtree(task_dirs.pop(task_id), ignore_errors=True)
+            AdmissionController.submit(image_name, run_algorithm.signature(
+                args=(str(staged[task_id]), task_id, image_name, instruction),
+                task_id=task_id
+            ))
+            pending.discard(task_id)
+        if unresolved:
+            logger.warning("批次 [%s] 输出无法拆分，%s 个任务转为单独运行", batch_id, len(unresolved))
+
+        for task_id, task_dir in task_dirs.items():
+            output_files = list(task_dir.glob('*'))
+            if output_files:
+                if task_id in cache_keys and container_info.get('exit_code') == 0:
+                    result_cache.store(image_name, image_digest, cache_keys[task_id], task_dir)
+                mark_task_done(task_id, {
+                    'status': 'SUCCESS',
+                    'processed_files': classify_files(output_files, image_name, task_id),
+                    'logs': ''  # 批次容器日志无法按任务拆分
+                })
+            else:
+                mark_task_failed(task_id, RuntimeError("算法未生成任何输出文件"))
+            pending.discard(task_id)
+
+        return {'status': 'SUCCESS', 'batch_id': batch_id, 'tasks': list(task_dirs)}
+
+    except Exception as e:
+        logger.error(f"批次失败详情 [{batch_id}]: {str(e)}", exc_info=True)
+        for task_id in pending:
+            mark_task_failed(task_id, e)
+        raise
+
+    finally:
+        shutil.rmtree(batch_input_dir, ignore_errors=True)
+        shutil.rmtree(batch_output_dir, ignore_errors=True)
+        AdmissionController.release(image_name, self.request.id)
+        logger.info(f"批次结束 [{batch_id}]")
@@ -1,18 +1,35 @@
 from typing import Dict, List, Any
 
-from celery import Celery
+from celery import Celery, Task
 from celery.schedules import crontab
+from celery.signals import worker_process_init, worker_process_shutdown
+from flask import has_app_context
 
 from app.config import Config
 
 from celery import current_app
 
 
+class FlaskContextTask(Task):
+    """在 Flask 应用上下文中执行的任务基类（复用 worker 进程级应用实例）"""
+
+    def __call__(self, *args, **kwargs):
+        if has_app_context():
+            return super().__call__(*args, **kwargs)
+        with CeleryManager.get_flask_app().app_context():
+            return super().__call__(*args, **kwargs)
+
+
 class CeleryManager:
     _celery = None
+    _flask_app = None
 
     @classmethod
     def init_celery(cls, app=None):
+        if app is not None and cls._flask_app is None:
+            # 记录进程内的 Flask 应用，供任务复用
+            cls._flask_app = app
+
         if not cls._celery:
             # 允许不依赖 Flask 独立创建实例
             cls._celery = Celery(
@@ -22,6 +39,7 @@ class CeleryManager:
                 # 显式禁用Celery自带的连接池复用
                 broker_connection_max_retries=0,
                 broker_pool_limit=10,
+                task_cls=FlaskContextTask,  # 所有任务默认在应用上下文中执行
 
             )
             # 统一配置加载
@@ -50,6 +68,26 @@ class CeleryManager:
                     'schedule': crontab(minute='*/1'),  # 每分钟触发
                     'args': ()
                 },
+                'sweep_task_directories': {
+                    'task': 'app.utils.cleanup.sweep_task_directories',
+                    'schedule': crontab(minute='*/1'),  # 每分钟清理到期任务目录
+                    'args': ()
+                },
+                'sync_image_inventory': {
+                    'task': 'app.docker.core.image_inventory.sync_image_inventory',
+                    'schedule': crontab(minute='*/10'),  # 每10分钟全量同步镜像清单
+                    'args': ()
+                },
+                'collect_blobs': {
+                    'task': 'app.utils.blob_store.collect_blobs',
+                    'schedule': crontab(minute='*/30'),  # 每30分钟回收无引用的上传对象
+                    'args': ()
+                },
+                'pump_admission': {
+                    'task': 'app.docker.core.admission.pump_admission',
+                    'schedule': Config.ADMISSION_PUMP_INTERVAL,  # 兜底调度排队中的算法任务
+                    'args': ()
+                },
             }
 
         return cls._celery
@@ -61,6 +99,15 @@ class CeleryManager:
             cls.init_celery()
         return cls._celery
 
+    @classmethod
+    def get_flask_app(cls):
+        """获取进程内的 Flask 应用（复用 myapp 模块级创建的实例，不重复创建）"""
+        if cls._flask_app is None:
+            # 导入 myapp 时模块级的 create_app() 会通过 init_celery 登记应用
+            import myapp
+            cls._flask_app = myapp.flask_app
+        return cls._flask_app
+
     @classmethod
     def print_celery_tasks(cls):
         """打印 Celery 任务状态（兼容 Celery 5.3.0+）"""
@@ -114,3 +161,18 @@ class CeleryManager:
     # 在需要的地方调用
     # if __name__ == '__main__':
     #     print_celery_tasks()
+
+
+@worker_process_init.connect
+def reset_flask_app_after_fork(**kwargs):
+    """worker 子进程启动后丢弃从父进程继承的数据库连接，应用实例本身继续复用"""
+    from app.exts import db
+    with CeleryManager.get_flask_app().app_context():
+        db.engine.dispose()
+
+
+@worker_process_shutdown.connect
+def shutdown_input_validator(**kwargs):
+    """worker 子进程退出时关闭输入校验进程池"""
+    from app.utils.input_validator import InputValidator
+    InputValidator.shutdown()
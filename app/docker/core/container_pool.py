@@ -0,0 +1,390 @@
+import atexit
+import os
+import shlex
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import docker
+
+from app.config import Config
+from app.core.exception import logger, ServiceException
+from app.docker.core.admission import container_resource_options
+
+# 池化容器内的挂载点，分别对应宿主机 UPLOAD_FOLDER/<image> 与 OUTPUT_FOLDER/<image>
+POOL_INPUT_ROOT = '/mnt/crop_input'
+POOL_OUTPUT_ROOT = '/mnt/crop_output'
+
+# 容器标签，用于识别池化容器及其所属进程
+POOL_LABEL = 'crop_al_hub.pool'
+POOL_OWNER_LABEL = 'crop_al_hub.pool.owner'
+
+# 池化执行时 /data、/result 为指向任务目录的软链接，镜像自带这两个路径时不能池化
+POOL_LINK_PATHS = ('/data', '/result')
+
+
+class PoolUnsupportedError(ServiceException):
+    """镜像不适合池化执行，调用方改用独立容器"""
+
+
+class PooledContainer:
+    """池中的单个预热容器"""
+
+    def __init__(self, container):
+        self.container = container
+        self.last_used = time.monotonic()
+        self.last_checked = time.monotonic()
+
+    @property
+    def id(self):
+        return self.container.id
+
+
+class ContainerPool:
+    """
+    单个算法镜像的预热容器池
+    容器以 sleep 常驻，任务通过 exec 在容器内执行 main.py，执行完归还
+    """
+
+    def __init__(self, client, image_name, min_size, max_size, idle_ttl, owner):
+        self.client = client
+        self.image_name = image_name
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.idle_ttl = idle_ttl
+        self.owner = owner
+
+        self._idle = []  # 空闲容器（后进先出，优先复用最近使用的容器）
+        self._size = 0  # 已创建的容器总数（空闲 + 借出 + 创建中）
+        self._cond = threading.Condition()
+        self._closed = False
+        self.poolable = True  # 首个容器启动后检查镜像文件系统，镜像自带 /data 或 /result 时置为 False
+
+        # 宿主机挂载根目录（任务目录均位于其下）
+        self.host_input_root = Path(Config.UPLOAD_FOLDER) / image_name
+        self.host_output_root = Path(Config.OUTPUT_FOLDER) / image_name
+
+    def covers(self, host_input_dir, host_output_dir):
+        """判断任务目录是否位于池容器的挂载范围内"""
+        try:
+            Path(host_input_dir).resolve().relative_to(self.host_input_root.resolve())
+            Path(host_output_dir).resolve().relative_to(self.host_output_root.resolve())
+            return True
+        except ValueError:
+            return False
+
+    def _create(self):
+        """创建并启动一个常驻容器"""
+        self.host_input_root.mkdir(parents=True, exist_ok=True)
+        self.host_output_root.mkdir(parents=True, exist_ok=True)
+
+        container = self.client.containers.run(
+            self.image_name,
+            name=f"{self.image_name}_pool_{uuid.uuid4().hex[:12]}",
+            entrypoint=["sleep"],  # 覆盖镜像入口，容器仅作为执行环境常驻
+            command=["infinity"],
+            volumes={
+                str(self.host_input_root): {'bind': POOL_INPUT_ROOT, 'mode': 'rw'},
+                str(self.host_output_root): {'bind': POOL_OUTPUT_ROOT, 'mode': 'rw'}
+            },
+            environment={
+                "TZ": Config.timezone,
+                "LANG": "C.UTF-8",
+                "LC_ALL": "C.UTF-8"
+            },
+            labels={POOL_LABEL: self.image_name, POOL_OWNER_LABEL: self.owner},
+            detach=True,
+            auto_remove=False,
+            user='root',
+            privileged=True,
+            **container_resource_options(self.image_name)
+        )
+        pooled = PooledContainer(container)
+        try:
+            poolable = self._check_link_paths(pooled)
+        except Exception:
+            self._destroy(pooled)
+            raise
+        if not poolable:
+            self.poolable = False
+            self._destroy(pooled)
+            raise PoolUnsupportedError(f"镜像 {self.image_name} 自带 /data 或 /result 目录，不使用容器池")
+        logger.info("预热容器已启动: %s (%s)", container.name, self.image_name)
+        return pooled
+
+    @staticmethod
+    def _check_link_paths(pooled):
+        """确认镜像中不存在 /data、/result（池化执行时会替换为软链接，不能覆盖镜像自带的内容）"""
+        script = ' && '.join(f"test ! -e {path}" for path in POOL_LINK_PATHS)
+        exit_code, _ = pooled.container.exec_run(["sh", "-c", script], user='root')
+        return exit_code == 0
+
+    @staticmethod
+    def _destroy(pooled):
+        try:
+            pooled.container.remove(force=True)
+            logger.info("预热容器已销毁: %s", pooled.container.name)
+        except docker.errors.NotFound:
+            pass
+        except Exception as e:
+            logger.warning("预热容器销毁异常: %s", str(e))
+
+    def _is_alive(self, pooled):
+        """轻量健康检查：容器仍处于运行状态"""
+        try:
+            pooled.container.reload()
+            pooled.last_checked = time.monotonic()
+            return pooled.container.status == 'running'
+        except docker.errors.NotFound:
+            return False
+        except docker.errors.APIError as e:
+            logger.warning("预热容器状态检查失败: %s", str(e))
+            return False
+
+    def _is_healthy(self, pooled):
+        """完整健康检查：容器运行中且可以执行命令"""
+        if not self._is_alive(pooled):
+            return False
+        try:
+            exit_code, _ = pooled.container.exec_run(["true"], user='root')
+            return exit_code == 0
+        except docker.errors.APIError:
+            return False
+
+    def acquire(self, timeout):
+        """借出一个容器，池满时阻塞等待"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise ServiceException("容器池已关闭")
+                if not self.poolable:
+                    raise PoolUnsupportedError(f"镜像 {self.image_name} 不使用容器池")
+                if self._idle:
+                    pooled = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                    pooled = None
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise ServiceException("算法容器繁忙，请稍后再试")
+                    self._cond.wait(remaining)
+                    continue
+
+            if pooled is None:
+                try:
+                    return self._create()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            # 长时间未检查的空闲容器，借出前确认存活
+            if time.monotonic() - pooled.last_checked < Config.CONTAINER_POOL_HEALTH_INTERVAL \
+                    or self._is_alive(pooled):
+                return pooled
+            self._discard(pooled)
+
+    def release(self, pooled, healthy=True):
+        """归还容器，不健康的容器直接销毁"""
+        if not healthy:
+            self._discard(pooled)
+            return
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                destroy = True
+            else:
+                pooled.last_used = time.monotonic()
+                self._idle.append(pooled)
+                destroy = False
+            self._cond.notify()
+        if destroy:
+            self._destroy(pooled)
+
+    def _discard(self, pooled):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+        self._destroy(pooled)
+
+    def maintain(self):
+        """回收超时空闲容器、剔除失效容器并补足最小空闲数"""
+        now = time.monotonic()
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+
+        keep, expired = [], []
+        # 按最近使用时间倒序，保留最热的 min_size 个
+        for pooled in sorted(idle, key=lambda p: p.last_used, reverse=True):
+            if len(keep) >= self.min_size and now - pooled.last_used > self.idle_ttl:
+                expired.append(pooled)
+            else:
+                keep.append(pooled)
+
+        healthy = []
+        for pooled in keep:
+            if self._is_healthy(pooled):
+                healthy.append(pooled)
+            else:
+                logger.warning("预热容器健康检查失败，准备替换: %s", pooled.container.name)
+                expired.append(pooled)
+
+        with self._cond:
+            self._idle.extend(reversed(healthy))
+            self._size -= len(expired)
+            missing = max(0, min(self.min_size - len(self._idle), self.max_size - self._size)) if self.poolable else 0
+            self._size += missing
+            self._cond.notify_all()
+
+        for pooled in expired:
+            self._destroy(pooled)
+
+        for _ in range(missing):
+            try:
+                pooled = self._create()
+            except Exception as e:
+                logger.warning("预热容器创建失败 %s: %s", self.image_name, str(e))
+                with self._cond:
+                    self._size -= 1
+                continue
+            self.release(pooled)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            self._destroy(pooled)
+
+
+class ContainerPoolManager:
+    """按镜像管理预热容器池，并在后台线程中维护池状态"""
+
+    def __init__(self, client):
+        self.client = client
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._maintainer = None
+        self._stop = threading.Event()
+
+    def get_pool(self, image_name):
+        with self._lock:
+            # 进程 fork 后重新标记所有者，父进程的池不会被子进程复用
+            owner = f"{socket.gethostname()}:{os.getpid()}"
+            if owner != self.owner:
+                self.owner = owner
+                self._pools = {}
+                self._maintainer = None
+                self._stop = threading.Event()
+
+            pool = self._pools.get(image_name)
+            if pool is None:
+                pool = ContainerPool(
+                    self.client,
+                    image_name,
+                    min_size=Config.CONTAINER_POOL_MIN_SIZE,
+                    max_size=Config.CONTAINER_POOL_MAX_SIZE,
+                    idle_ttl=Config.CONTAINER_POOL_IDLE_TTL,
+                    owner=self.owner
+                )
+                self._pools[image_name] = pool
+            self._ensure_maintainer()
+            return pool
+
+    def _ensure_maintainer(self):
+        if self._maintainer and self._maintainer.is_alive():
+            return
+        self._remove_orphans()
+        self._maintainer = threading.Thread(target=self._maintain_forever, name='container-pool', daemon=True)
+        self._maintainer.start()
+        atexit.register(self.close)
+
+    def _maintain_forever(self):
+        stop = self._stop
+        while not stop.wait(Config.CONTAINER_POOL_HEALTH_INTERVAL):
+            with self._lock:
+                pools = list(self._pools.values())
+            for pool in pools:
+                try:
+                    pool.maintain()
+                except Exception as e:
+                    logger.error("容器池维护失败 %s: %s", pool.image_name, str(e), exc_info=True)
+
+    def _remove_orphans(self):
+        """清理本机已退出进程遗留的池化容器"""
+        hostname = socket.gethostname()
+        try:
+            containers = self.client.containers.list(all=True, filters={'label': POOL_LABEL})
+        except docker.errors.APIError as e:
+            logger.warning("查询遗留预热容器失败: %s", str(e))
+            return
+
+        for container in containers:
+            owner = container.labels.get(POOL_OWNER_LABEL, '')
+            host, _, pid = owner.rpartition(':')
+            if host != hostname or not pid.isdigit() or _pid_alive(int(pid)):
+                continue
+            try:
+                container.remove(force=True)
+                logger.info("清理遗留预热容器: %s", container.name)
+            except docker.errors.APIError:
+                pass
+
+    @contextmanager
+    def borrow(self, image_name):
+        """借用容器的上下文管理器，异常时销毁容器"""
+        pool = self.get_pool(image_name)
+        pooled = pool.acquire(Config.CONTAINER_POOL_ACQUIRE_TIMEOUT)
+        healthy = True
+        try:
+            yield pooled
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            pool.release(pooled, healthy=healthy)
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools = {}
+        for pool in pools:
+            pool.close()
+
+    @staticmethod
+    def build_exec_command(pool, host_input_dir, host_output_dir, command):
+        """
+        构建容器内执行命令：把任务目录映射为 /data 与 /result 后执行原始命令
+        只删除上一个任务留下的软链接（rm -f 不删除目录），镜像自带的内容在创建容器时已排除
+        """
+        task_input = f"{POOL_INPUT_ROOT}/{Path(host_input_dir).resolve().relative_to(pool.host_input_root.resolve()).as_posix()}"
+        task_output = f"{POOL_OUTPUT_ROOT}/{Path(host_output_dir).resolve().relative_to(pool.host_output_root.resolve()).as_posix()}"
+        script = (
+            f"rm -f /data /result && "
+            f"ln -s {shlex.quote(task_input)} /data && "
+            f"ln -s {shlex.quote(task_output)} /result && "
+            f"exec {shlex.join(command)}"
+        )
+        return ["sh", "-c", script]
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
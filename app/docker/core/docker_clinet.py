@@ -8,6 +8,10 @@ from app.config import Config
 from docker.errors import ImageNotFound
 
 from app.core.exception import logger, ServiceException
+from app.docker.core.admission import container_resource_options
+from app.docker.core.container_pool import ContainerPoolManager, PoolUnsupportedError
+from app.docker.core.image_inventory import ImageInventory
+from app.docker.core.log_stream import TaskLogStream
 
 
 class DockerManager:
@@ -16,65 +20,137 @@ class DockerManager:
         if sys.platform == 'linux':
             # Linux系统使用服务器地址
             self.client = docker.DockerClient(base_url='tcp://127.0.0.1:2375')
+            self.pools = ContainerPoolManager(self.client)
             logger.info("Docker进程已经启动")
         else:
             # Windows/Mac系统自动检测本地Docker
             self.client = None
+            self.pools = None
             logger.info("Docker进程未启动")
+        # 镜像清单缓存，请求路径校验镜像时不访问守护进程
+        self.images = ImageInventory(self.client)
 
     @staticmethod
     def validate_image(image_name):
+        """校验镜像是否存在（读取镜像清单缓存）"""
+        docker_client.images.validate(image_name)
+        docker_client.images.touch(image_name)
+
+    def get_image_digest(self, image_name):
+        """获取镜像摘要（镜像ID），镜像更新后摘要随之变化"""
+        return self.images.get_digest(image_name)
+
+    def run_algorithm_container(self, image_name, host_input_dir, host_output_dir, command, task_id=None):
+        """
+        运行算法容器并实时获取日志（优先复用预热容器池）
+        指定 task_id 时日志写入该任务的日志流，返回结果中只保留日志尾部
+        """
+        with TaskLogStream(task_id) as log_stream:
+            if self.pools and Config.CONTAINER_POOL_ENABLED:
+                pool = self.pools.get_pool(image_name)
+                if not pool.poolable:
+                    logger.info("镜像自带 /data 或 /result 目录，使用独立容器运行")
+                elif pool.covers(host_input_dir, host_output_dir):
+                    try:
+                        return self._run_in_pool(pool, host_input_dir, host_output_dir, command, log_stream)
+                    except PoolUnsupportedError as e:
+                        logger.info("%s，使用独立容器运行", str(e))
+                else:
+                    logger.info("任务目录不在容器池挂载范围内，使用独立容器运行")
+            return self._run_cold_container(image_name, host_input_dir, host_output_dir, command, log_stream)
+
+    def _run_in_pool(self, pool, host_input_dir, host_output_dir, command, log_stream):
+        """借用预热容器，通过 exec 执行算法"""
         try:
-            docker_client.client.images.get(image_name)
-        except docker.errors.ImageNotFound:
-            raise ServiceException('镜像 %s 未找到，请先拉取镜像', image_name)
-        except docker.errors.APIError as e:
-            logger.error("Docker服务异常: %s", str(e))
-            raise ServiceException('Docker服务不可用')
-
-    def run_algorithm_container(self, image_name, host_input_dir, host_output_dir, command):
-        """运行算法容器并实时获取日志"""
-        global container
-        try:
-            # 创建输出目录（如果不存在）
             Path(host_output_dir).mkdir(parents=True, exist_ok=True)
             logger.info("输入目录文件列表: %s", os.listdir(host_input_dir))
 
+            exec_command = self.pools.build_exec_command(pool, host_input_dir, host_output_dir, command)
+            with self.pools.borrow(pool.image_name) as pooled:
+                logger.info("复用预热容器: %s", pooled.container.name)
+                exec_id = self.client.api.exec_create(
+                    pooled.id,
+                    exec_command,
+                    environment={
+                        "TZ": Config.timezone,
+                        "LANG": "C.UTF-8",
+                        "LC_ALL": "C.UTF-8"
+                    },
+                    user='root',
+                    privileged=True,
+                    stdout=True,
+                    stderr=True
+                )['Id']
+
+                for log_entry in _iter_lines(self.client.api.exec_start(exec_id, stream=True)):
+                    log_stream.write(log_entry)
+
+                exit_code = self.client.api.exec_inspect(exec_id).get('ExitCode')
+                if exit_code is None:
+                    exit_code = 1
+
+            return {
+                "exit_code": exit_code,
+                "host_output_dir": host_output_dir,
+                "logs": log_stream.text()
+            }
+
+        except docker.errors.DockerException as e:
+            _raise_docker_error(e)
+        except ServiceException:
+            raise
+        except Exception as e:
+            logger.error("未知错误: %s", str(e), exc_info=True)
+            raise ServiceException("系统内部错误")
+
+    @staticmethod
+    def container_options(image_name, host_input_dir, host_output_dir, command, labels=None):
+        """独立算法容器的创建参数（containers.run / containers.create 通用）"""
+        return {
+            "name": f"{image_name}_{uuid.uuid4()}",  # 保证容器名称唯一
+            "command": command,
             # 配置容器卷映射
-            volumes = {
+            "volumes": {
                 str(host_input_dir): {'bind': '/data', 'mode': 'rw'},
                 str(host_output_dir): {'bind': '/result', 'mode': 'rw'}
-            }
+            },
+            "environment": {
+                "TZ": Config.timezone,
+                "LANG": "C.UTF-8",  # 强制容器使用UTF-8
+                "LC_ALL": "C.UTF-8"
+            },
+            "labels": labels or {},
+            "detach": True,
+            "auto_remove": False,  # 关闭自动删除
+            "user": 'root',
+            "privileged": True,
+            # 按镜像资源配置限制 CPU 与内存
+            **container_resource_options(image_name)
+        }
+
+    def _run_cold_container(self, image_name, host_input_dir, host_output_dir, command, log_stream):
+        """创建独立容器运行算法，结束后删除容器"""
+        container = None
+        try:
+            # 创建输出目录（如果不存在）
+            Path(host_output_dir).mkdir(parents=True, exist_ok=True)
+            logger.info("输入目录文件列表: %s", os.listdir(host_input_dir))
 
             # 启动容器
             container = self.client.containers.run(
                 image_name,
-                name=f"{image_name}_{uuid.uuid4()}",  # 保证容器名称唯一
-                command=command,
-                volumes=volumes,
-                environment={
-                    "TZ": Config.timezone,
-                    "LANG": "C.UTF-8",  # 强制容器使用UTF-8
-                    "LC_ALL": "C.UTF-8"
-                },
-                detach=True,
-                auto_remove=False,  # 关闭自动删除
                 remove=False,  # 防止自动清理
-                user='root',
-                privileged=True,
                 stdout=True,  # 确保捕获标准输出
-                stderr=True  # 确保捕获错误输出
+                stderr=True,  # 确保捕获错误输出
+                **self.container_options(image_name, host_input_dir, host_output_dir, command)
             )
 
             # 同步获取日志
-            logs = []
             exit_code = 1  # 默认错误状态
             try:
                 # 合并日志流处理和等待退出
                 for line in container.logs(stream=True, follow=True):
-                    log_entry = line.decode().strip()
-                    logs.append(log_entry)
-                    logger.info("[容器日志] %s", log_entry)
+                    log_stream.write(line.decode(errors='replace').strip())
 
                 # 获取退出状态（此时容器已停止）
                 exit_status = container.wait()
@@ -88,18 +164,13 @@ class DockerManager:
             return {
                 "exit_code": exit_code,
                 "host_output_dir": host_output_dir,
-                "logs": "\n".join(logs)
+                "logs": log_stream.text()
             }
 
         except docker.errors.DockerException as e:
-            error_type = "容器操作失败"
-            # 细化错误类型判断
-            if "No such image" in str(e):
-                error_type = "镜像不存在"
-            elif "port is already allocated" in str(e):
-                error_type = "端口冲突"
-            logger.error("%s: %s", error_type, str(e))
-            raise ServiceException(f"{error_type}: {str(e)}")
+            _raise_docker_error(e)
+        except ServiceException:
+            raise
         except Exception as e:
             logger.error("未知错误: %s", str(e), exc_info=True)
             raise ServiceException("系统内部错误")
@@ -116,5 +187,29 @@ class DockerManager:
                     logger.warning("容器清理异常: %s", str(e))
 
 
+def _raise_docker_error(e):
+    """将Docker异常转换为服务异常"""
+    error_type = "容器操作失败"
+    # 细化错误类型判断
+    if "No such image" in str(e):
+        error_type = "镜像不存在"
+    elif "port is already allocated" in str(e):
+        error_type = "端口冲突"
+    logger.error("%s: %s", error_type, str(e))
+    raise ServiceException(f"{error_type}: {str(e)}")
+
+
+def _iter_lines(chunks):
+    """把 exec 输出的字节块切分为日志行"""
+    buffer = b''
+    for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            yield line.decode(errors='replace').strip()
+    if buffer:
+        yield buffer.decode(errors='replace').strip()
+
+
 # 单例模式初始化
 docker_client = DockerManager()
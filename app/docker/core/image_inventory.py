@@ -0,0 +1,259 @@
+import json
+import os
+import socket
+import threading
+import time
+
+import docker
+
+from app.config import Config
+from app.core.exception import logger, ServiceException
+from app.core.redis_connection_pool import redis_pool
+from app.docker.core.celery_app import CeleryManager
+
+# 触发清单刷新的镜像事件
+IMAGE_EVENTS = {'pull', 'tag', 'untag', 'delete', 'load', 'import'}
+
+
+def normalize_image_name(image_name):
+    """补全默认标签：name -> name:latest"""
+    if ':' not in image_name.rsplit('/', 1)[-1]:
+        return f"{image_name}:latest"
+    return image_name
+
+
+class ImageInventory:
+    """
+    本地镜像清单缓存（进程内 + Redis 共享）
+    - Redis 哈希 docker:images 保存 标签 -> {id, size, created}，由事件监听和定时全量同步维护
+    - 进程内缓存每 IMAGE_INVENTORY_LOCAL_TTL 秒从 Redis 刷新一次，请求路径不访问 Docker 守护进程
+    - 结果缓存使用的镜像摘要直接读取 Redis，镜像事件到达后立即生效
+    - 事件监听线程通过 Redis 锁选主，同一时间只有一个进程订阅事件流
+    """
+
+    IMAGES_KEY = 'docker:images'
+    LAST_USED_KEY = 'docker:images:last_used'
+    SYNCED_AT_KEY = 'docker:images:synced_at'
+    WATCHER_LOCK_KEY = 'docker:images:watcher'
+
+    def __init__(self, client):
+        self.client = client
+        self._images = {}
+        self._synced = False
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._watcher_id = None
+
+    # ---------- 读取 ----------
+
+    def _load(self, force=False):
+        """从 Redis 刷新进程内缓存"""
+        with self._lock:
+            if not force and time.monotonic() - self._loaded_at < Config.IMAGE_INVENTORY_LOCAL_TTL:
+                return
+            try:
+                with redis_pool.get_redis_connection('cache') as conn:
+                    pipe = conn.pipeline(transaction=False)
+                    pipe.hgetall(self.IMAGES_KEY)
+                    pipe.exists(self.SYNCED_AT_KEY)
+                    raw, synced = pipe.execute()
+            except Exception as e:
+                logger.warning("读取镜像清单失败: %s", str(e))
+                return
+            self._images = {tag: json.loads(value) for tag, value in raw.items()}
+            self._synced = bool(synced)
+            self._loaded_at = time.monotonic()
+
+    def get(self, image_name):
+        """查询镜像信息，不存在返回 None"""
+        self._ensure_watcher()
+        self._load()
+        return self._images.get(normalize_image_name(image_name))
+
+    def validate(self, image_name):
+        """校验镜像存在；清单尚未同步时回退到守护进程查询"""
+        info = self.get(image_name)
+        if info:
+            return info
+        if not self._synced:
+            info = self._inspect(image_name)
+            self._trigger_sync()
+            return info
+        raise ServiceException(f'镜像 {image_name} 未找到，请先拉取镜像')
+
+    def get_digest(self, image_name):
+        """
+        镜像摘要（镜像ID），直接读取 Redis 清单，不使用进程内缓存
+        结果缓存以摘要为键，重新打标签或重建镜像后需立即取到新摘要；清单中没有时回退到守护进程查询
+        """
+        self._ensure_watcher()
+        try:
+            with redis_pool.get_redis_connection('cache') as conn:
+                raw = conn.hget(self.IMAGES_KEY, normalize_image_name(image_name))
+            if raw:
+                return json.loads(raw)['id']
+        except Exception as e:
+            logger.warning("读取镜像摘要失败: %s", str(e))
+        return self._inspect(image_name)['id']
+
+    def touch(self, image_name):
+        """记录镜像最近使用时间"""
+        try:
+            with redis_pool.get_redis_connection('cache') as conn:
+                conn.hset(self.LAST_USED_KEY, normalize_image_name(image_name), int(time.time()))
+        except Exception as e:
+            logger.warning("记录镜像使用时间失败: %s", str(e))
+
+    def list_images(self):
+        """镜像清单（含最近使用时间），供管理接口使用"""
+        self._load(force=True)
+        try:
+            with redis_pool.get_redis_connection('cache') as conn:
+                last_used = conn.hgetall(self.LAST_USED_KEY)
+        except Exception as e:
+            logger.warning("读取镜像使用时间失败: %s", str(e))
+            last_used = {}
+        return [
+            {
+                'tag': tag,
+                'digest': info['id'],
+                'size': info['size'],
+                'created': info['created'],
+                'last_used': int(last_used[tag]) if tag in last_used else None
+            }
+            for tag, info in sorted(self._images.items())
+        ]
+
+    def _inspect(self, image_name):
+        try:
+            image = self.client.images.get(image_name)
+        except docker.errors.ImageNotFound:
+            raise ServiceException(f'镜像 {image_name} 未找到，请先拉取镜像')
+        except docker.errors.APIError as e:
+            logger.error("Docker服务异常: %s", str(e))
+            raise ServiceException('Docker服务不可用')
+        return self._describe(image)
+
+    @staticmethod
+    def _describe(image):
+        return {
+            'id': image.id,
+            'size': image.attrs.get('Size', 0),
+            'created': image.attrs.get('Created')
+        }
+
+    # ---------- 同步 ----------
+
+    def sync(self):
+        """全量同步本机镜像清单到 Redis"""
+        images = {}
+        for image in self.client.images.list():
+            info = json.dumps(self._describe(image))
+            for tag in image.tags:
+                images[tag] = info
+
+        with redis_pool.get_redis_connection('cache') as conn:
+            pipe = conn.pipeline()
+            pipe.delete(self.IMAGES_KEY)
+            if images:
+                pipe.hset(self.IMAGES_KEY, mapping=images)
+            pipe.set(self.SYNCED_AT_KEY, int(time.time()))
+            pipe.execute()
+        self._load(force=True)
+        logger.info("镜像清单已同步，共 %s 个标签", len(images))
+        return len(images)
+
+    def apply_event(self, event):
+        """按单个镜像事件更新清单：刷新该镜像的全部标签，移除已不属于它的标签"""
+        actor = event.get('Actor', {})
+        ref = actor.get('ID') or event.get('id')
+        try:
+            image = self.client.images.get(ref)
+        except docker.errors.ImageNotFound:
+            image = None
+        image_id = image.id if image else ref
+
+        with redis_pool.get_redis_connection('cache') as conn:
+            raw = conn.hgetall(self.IMAGES_KEY)
+            stale = [
+                tag for tag, value in raw.items()
+                if json.loads(value)['id'] == image_id and (image is None or tag not in image.tags)
+            ]
+            pipe = conn.pipeline()
+            if stale:
+                pipe.hdel(self.IMAGES_KEY, *stale)
+            if image and image.tags:
+                info = json.dumps(self._describe(image))
+                pipe.hset(self.IMAGES_KEY, mapping={tag: info for tag in image.tags})
+            pipe.execute()
+        self._load(force=True)
+        logger.info("镜像事件 %s 已更新清单: %s", event.get('Action'), actor.get('Attributes', {}).get('name', ref))
+
+    def _trigger_sync(self):
+        try:
+            sync_image_inventory.delay()
+        except Exception as e:
+            logger.warning("调度镜像清单同步失败: %s", str(e))
+
+    # ---------- 事件监听 ----------
+
+    def _ensure_watcher(self):
+        if self.client is None or (self._watcher and self._watcher.is_alive()):
+            return
+        with self._lock:
+            if self._watcher and self._watcher.is_alive():
+                return
+            self._watcher_id = f"{socket.gethostname()}:{os.getpid()}"
+            self._watcher = threading.Thread(target=self._watch_forever, name='image-inventory', daemon=True)
+            self._watcher.start()
+
+    def _is_leader(self, conn):
+        """抢占或续期事件监听锁"""
+        interval = Config.IMAGE_INVENTORY_WATCH_WINDOW
+        if conn.set(self.WATCHER_LOCK_KEY, self._watcher_id, nx=True, ex=interval * 2):
+            return True
+        if conn.get(self.WATCHER_LOCK_KEY) == self._watcher_id:
+            conn.expire(self.WATCHER_LOCK_KEY, interval * 2)
+            return True
+        return False
+
+    def _watch_forever(self):
+        """按时间窗口订阅镜像事件，事件到达即更新清单，每个窗口结束时续期监听锁"""
+        window = Config.IMAGE_INVENTORY_WATCH_WINDOW
+        since = None
+        while True:
+            try:
+                with redis_pool.get_redis_connection('cache') as conn:
+                    leader = self._is_leader(conn)
+                if not leader:
+                    since = None
+                    time.sleep(window)
+                    continue
+
+                if since is None:
+                    # 刚成为监听者，先全量同步，覆盖未监听期间的变化
+                    self.sync()
+                    since = int(time.time())
+
+                until = int(time.time()) + window
+                for event in self.client.events(decode=True, since=since, until=until, filters={'type': 'image'}):
+                    if event.get('Action') not in IMAGE_EVENTS:
+                        continue
+                    try:
+                        self.apply_event(event)
+                    except Exception as e:
+                        logger.warning("镜像事件处理失败，改为全量同步: %s", str(e))
+                        self.sync()
+                since = until
+            except Exception as e:
+                logger.warning("镜像事件监听异常: %s", str(e))
+                since = None
+                time.sleep(window)
+
+
+@CeleryManager.get_celery().task
+def sync_image_inventory():
+    """定时全量同步镜像清单（兜底事件丢失）"""
+    from app.docker.core.docker_clinet import docker_client
+    return docker_client.images.sync()
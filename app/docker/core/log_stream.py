@@ -0,0 +1,92 @@
+import time
+from collections import deque
+
+from app.config import Config
+from app.core.exception import logger
+from app.core.redis_connection_pool import redis_pool
+
+
+class TaskLogStream:
+    """
+    任务容器日志写入器
+    日志按批写入 Redis Stream（task_logs:<task_id>），流长度按 MAXLEN 截断；
+    本地只保留最近 TASK_LOG_TAIL 行作为任务结果中的日志摘要
+    - 缓冲达到 TASK_LOG_FLUSH_LINES 行或超过刷新间隔时同步写入，写入期间暂停读取容器日志（背压）
+    - Redis 不可用时只保留本地尾部，不影响任务执行
+    """
+
+    KEY_PREFIX = 'task_logs'
+
+    def __init__(self, task_id=None):
+        self.task_id = task_id
+        self.key = self.stream_key(task_id) if task_id else None
+        self.tail = deque(maxlen=Config.TASK_LOG_TAIL)
+        self._buffer = []
+        self._last_flush = time.monotonic()
+
+    @classmethod
+    def stream_key(cls, task_id):
+        return f"{cls.KEY_PREFIX}:{task_id}"
+
+    def write(self, line):
+        self.tail.append(line)
+        logger.debug("[容器日志] %s", line)
+        if not self.key:
+            return
+        self._buffer.append(line)
+        if len(self._buffer) >= Config.TASK_LOG_FLUSH_LINES \
+                or time.monotonic() - self._last_flush >= Config.TASK_LOG_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """把缓冲日志批量写入 Redis Stream"""
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        lines, self._buffer = self._buffer, []
+        try:
+            with redis_pool.get_redis_connection('tasks') as conn:
+                pipe = conn.pipeline(transaction=False)
+                for line in lines:
+                    pipe.xadd(self.key, {'line': line}, maxlen=Config.TASK_LOG_MAX_LINES, approximate=True)
+                pipe.expire(self.key, Config.TASK_LOG_TTL)
+                pipe.execute()
+        except Exception as e:
+            logger.warning("任务日志写入失败 [%s]: %s", self.task_id, str(e))
+
+    def close(self):
+        self.flush()
+
+    def text(self):
+        """任务结果中保留的日志尾部"""
+        return "\n".join(self.tail)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @classmethod
+    def read(cls, task_id, after=None, count=100):
+        """
+        分页读取任务日志
+        :param after: 上一页最后一条日志的ID，为空时从头读取
+        :return: ([{'id', 'line'}], 最后一条日志ID)
+        """
+        start = f"({after}" if after else '-'
+        with redis_pool.get_redis_connection('tasks') as conn:
+            entries = conn.xrange(cls.stream_key(task_id), min=start, max='+', count=count)
+        return cls._format(entries)
+
+    @classmethod
+    def read_tail(cls, task_id, count=100):
+        """读取最近的若干行日志（按时间正序）"""
+        with redis_pool.get_redis_connection('tasks') as conn:
+            entries = conn.xrevrange(cls.stream_key(task_id), max='+', min='-', count=count)
+        return cls._format(list(reversed(entries)))
+
+    @staticmethod
+    def _format(entries):
+        lines = [{'id': entry_id, 'line': fields.get('line', '')} for entry_id, fields in entries]
+        return lines, (lines[-1]['id'] if lines else None)
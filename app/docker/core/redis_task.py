@@ -1,43 +1,141 @@
 import json
-from typing import Optional, Dict
+import os
+import socket
+from typing import Dict, List, Tuple
 
+import redis
+
+from app.config import Config
+from app.core.exception import logger
 from app.core.redis_connection_pool import redis_pool
 
 
 class RedisTaskQueue:
     """
-    基于现有Redis连接池单例的任务队列服务
-    通过上下文管理器自动管理连接
+    基于 Redis Stream 消费组的可靠任务队列
+    - 读取后的任务进入待确认列表（PEL），处理完成后显式 ack 才会删除
+    - 超过可见性超时未确认的任务由 reclaim 通过 XAUTOCLAIM 重新认领
+    - 投递次数超过上限的任务转入死信流 <queue>:dead
+    使用长期持有的客户端，不再每次调用都获取连接并 PING
     """
-    def __init__(self, queue_name: str = 'default_tasks'):
+
+    def __init__(self, queue_name: str = 'default_tasks', group: str = 'executors', consumer: str = None):
         self.queue_name = queue_name
+        self.dead_letter_name = f"{queue_name}:dead"
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}:{os.getpid()}"
+        self.visibility_timeout_ms = Config.TASK_QUEUE_VISIBILITY_TIMEOUT * 1000
+        self.max_deliveries = Config.TASK_QUEUE_MAX_DELIVERIES
+        self._claim_cursor = '0-0'
+        self._group_ready = False
+
+    @property
+    def client(self) -> redis.Redis:
+        return redis_pool.get_client('tasks')
+
+    def _ensure_group(self):
+        if self._group_ready:
+            return
+        try:
+            self.client.xgroup_create(self.queue_name, self.group, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        self._group_ready = True
 
     def push_task(self, task_data: dict) -> bool:
-        """推送任务到队列（使用默认连接池）"""
-        with redis_pool.get_redis_connection('default') as conn:
-            try:
-                return conn.rpush(self.queue_name, json.dumps(task_data)) > 0
-            except Exception as e:
-                raise RuntimeError(f"任务推送失败: {str(e)}")
-
-    def pop_task(self, timeout: int = 30) -> Optional[dict]:
-        """阻塞式获取任务（使用专用任务连接池）"""
-        with redis_pool.get_redis_connection('tasks') as conn:
-            try:
-                _, data = conn.blpop(self.queue_name, timeout=timeout)
-                return json.loads(data) if data else None
-            except Exception as e:
-                raise RuntimeError(f"任务获取失败: {str(e)}")
+        """推送任务到队列"""
+        try:
+            return bool(self.client.xadd(self.queue_name, {'data': json.dumps(task_data)}))
+        except Exception as e:
+            raise RuntimeError(f"任务推送失败: {str(e)}")
+
+    def read_tasks(self, count: int = None, block_ms: int = 2000) -> List[Tuple[str, dict]]:
+        """
+        批量读取新任务（XREADGROUP COUNT n）
+        :param block_ms: 阻塞等待时长，需小于连接池 socket_timeout
+        :return: [(条目ID, 任务数据)]
+        """
+        try:
+            self._ensure_group()
+            response = self.client.xreadgroup(
+                self.group, self.consumer, {self.queue_name: '>'},
+                count=count or Config.TASK_QUEUE_BATCH_SIZE,
+                block=block_ms
+            )
+        except Exception as e:
+            raise RuntimeError(f"任务获取失败: {str(e)}")
+        entries = response[0][1] if response else []
+        return [(entry_id, json.loads(fields['data'])) for entry_id, fields in entries]
+
+    def ack(self, *entry_ids: str) -> None:
+        """确认任务处理完成并从流中删除"""
+        if not entry_ids:
+            return
+        pipe = self.client.pipeline()
+        pipe.xack(self.queue_name, self.group, *entry_ids)
+        pipe.xdel(self.queue_name, *entry_ids)
+        pipe.execute()
+
+    def touch(self, entry_ids: List[str]) -> None:
+        """续期处理中的任务（重置空闲时间），避免长任务被其他消费者认领"""
+        if entry_ids:
+            self.client.xclaim(self.queue_name, self.group, self.consumer, 0, entry_ids, justid=True)
+
+    def reclaim(self, count: int = None) -> Tuple[List[Tuple[str, dict]], List[Tuple[str, dict]]]:
+        """
+        认领超过可见性超时仍未确认的任务
+        :return: (重新投递的任务, 转入死信流的任务)
+        """
+        self._ensure_group()
+        next_cursor, entries, *_ = self.client.xautoclaim(
+            self.queue_name, self.group, self.consumer,
+            min_idle_time=self.visibility_timeout_ms,
+            start_id=self._claim_cursor,
+            count=count or Config.TASK_QUEUE_BATCH_SIZE
+        )
+        self._claim_cursor = next_cursor
+
+        entries = [(entry_id, fields) for entry_id, fields in entries if fields]
+        if not entries:
+            return [], []
+
+        pipe = self.client.pipeline(transaction=False)
+        for entry_id, _ in entries:
+            pipe.xpending_range(self.queue_name, self.group, min=entry_id, max=entry_id, count=1)
+        pending = pipe.execute()
+
+        claimed, dead = [], []
+        for (entry_id, fields), info in zip(entries, pending):
+            deliveries = info[0]['times_delivered'] if info else 0
+            task = (entry_id, json.loads(fields['data']))
+            if deliveries > self.max_deliveries:
+                self._dead_letter(entry_id, fields, deliveries)
+                dead.append(task)
+            else:
+                claimed.append(task)
+        if claimed:
+            logger.warning("重新认领超时任务 %s 个: %s", len(claimed), self.queue_name)
+        return claimed, dead
+
+    def _dead_letter(self, entry_id: str, fields: Dict[str, str], deliveries: int) -> None:
+        pipe = self.client.pipeline()
+        pipe.xadd(self.dead_letter_name, {**fields, 'source_id': entry_id, 'deliveries': deliveries})
+        pipe.xack(self.queue_name, self.group, entry_id)
+        pipe.xdel(self.queue_name, entry_id)
+        pipe.execute()
+        logger.error("任务投递 %s 次仍未完成，转入死信队列: %s", deliveries, entry_id)
 
     def update_status(self, task_id: str, status: str, meta: dict = None) -> None:
         """更新任务状态（使用缓存专用池）"""
-        with redis_pool.get_redis_connection('cache') as conn:
-            try:
-                key = f"task:{task_id}"
-                conn.hset(key, mapping={
-                    "status": status,
-                    "meta": json.dumps(meta or {})
-                })
-                conn.expire(key, 86400)  # 24小时过期
-            except Exception as e:
-                raise RuntimeError(f"状态更新失败: {str(e)}")
+        try:
+            key = f"task:{task_id}"
+            pipe = redis_pool.get_client('cache').pipeline()
+            pipe.hset(key, mapping={
+                "status": status,
+                "meta": json.dumps(meta or {})
+            })
+            pipe.expire(key, 86400)  # 24小时过期
+            pipe.execute()
+        except Exception as e:
+            raise RuntimeError(f"状态更新失败: {str(e)}")
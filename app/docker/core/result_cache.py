@@ -0,0 +1,175 @@
+import hashlib
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+from app.config import Config
+from app.core.exception import logger
+
+
+def _link_or_copy(src, dst):
+    """优先硬链接，跨文件系统时退化为复制"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+
+class ResultCache:
+    """
+    算法结果缓存（内容寻址）
+    目录结构: <root>/<image>/<digest>/<key>/ 输出文件，<key>.size 记录条目大小
+    - 镜像摘要变化时整体删除旧摘要目录
+    - 总大小超过上限时按最近访问时间（目录 mtime）淘汰
+    """
+
+    def __init__(self, root, max_bytes, enabled=True):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+
+    @staticmethod
+    def hash_input_dir(input_dir):
+        """计算输入目录内容哈希（文件名 + 文件内容）"""
+        digest = hashlib.sha256()
+        for file_path in sorted(Path(input_dir).rglob('*')):
+            if not file_path.is_file():
+                continue
+            file_hash = hashlib.sha256()
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    file_hash.update(chunk)
+            digest.update(file_path.relative_to(input_dir).as_posix().encode('utf-8'))
+            digest.update(b'\0')
+            digest.update(file_hash.digest())
+        return digest.hexdigest()
+
+    @staticmethod
+    def build_key(image_digest, instruction, input_hash):
+        raw = f"{image_digest}\n{instruction or ''}\n{input_hash}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _short_digest(image_digest):
+        return image_digest.split(':')[-1][:16]
+
+    def _image_dir(self, image_name):
+        return self.root / image_name.replace('/', '_').replace(':', '_')
+
+    def _entry_dir(self, image_name, image_digest, key):
+        return self._image_dir(image_name) / self._short_digest(image_digest) / key
+
+    def lookup(self, image_name, image_digest, key, host_output_dir):
+        """
+        查询缓存，命中时把缓存结果链接到任务输出目录
+        先链接到同级临时目录，确认条目未被淘汰后再移入输出目录，并发淘汰时不会留下不完整的输出
+        :return: 输出文件列表，未命中返回 None
+        """
+        entry = self._entry_dir(image_name, image_digest, key)
+        host_output_dir = Path(host_output_dir)
+        staging = host_output_dir.parent / f".{host_output_dir.name}.cache_{uuid.uuid4().hex}"
+        try:
+            if not entry.is_dir():
+                return None
+            host_output_dir.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copytree(entry, staging, copy_function=_link_or_copy)
+            # 淘汰先重命名条目再删除：复制完成后条目仍在，说明复制期间未被淘汰
+            if not entry.is_dir() or not any(staging.iterdir()):
+                return None
+
+            try:
+                host_output_dir.rmdir()  # 输出目录为空（或不存在）时整体替换
+            except FileNotFoundError:
+                pass
+            except OSError:
+                for staged in list(staging.iterdir()):
+                    os.replace(staged, host_output_dir / staged.name)
+            else:
+                os.rename(staging, host_output_dir)
+
+            os.utime(entry)  # 刷新最近访问时间
+            return list(host_output_dir.glob('*'))
+        except OSError as e:
+            logger.warning("读取结果缓存失败 %s: %s", key, str(e))
+            return None
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def store(self, image_name, image_digest, key, host_output_dir):
+        """把任务输出写入缓存（先写临时目录再原子重命名）"""
+        try:
+            self._invalidate_stale_digests(image_name, image_digest)
+
+            entry = self._entry_dir(image_name, image_digest, key)
+            if entry.is_dir():
+                os.utime(entry)
+                return
+
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            staging = entry.parent / f".tmp_{uuid.uuid4().hex}"
+            shutil.copytree(host_output_dir, staging, copy_function=_link_or_copy)
+            size = sum(f.stat().st_size for f in staging.rglob('*') if f.is_file())
+            try:
+                os.rename(staging, entry)
+            except OSError:
+                # 并发写入同一条目，保留先写入的版本
+                shutil.rmtree(staging, ignore_errors=True)
+                return
+            entry.with_name(f"{key}.size").write_text(str(size))
+            logger.info("结果已写入缓存: %s (%s bytes)", key, size)
+
+            self.evict()
+        except OSError as e:
+            logger.warning("写入结果缓存失败 %s: %s", key, str(e))
+
+    def _invalidate_stale_digests(self, image_name, image_digest):
+        """镜像更新（摘要变化）后删除旧版本的缓存"""
+        image_dir = self._image_dir(image_name)
+        if not image_dir.is_dir():
+            return
+        current = self._short_digest(image_digest)
+        for digest_dir in image_dir.iterdir():
+            if digest_dir.is_dir() and digest_dir.name != current:
+                shutil.rmtree(digest_dir, ignore_errors=True)
+                logger.info("镜像已更新，清理旧缓存: %s", digest_dir)
+
+    def evict(self):
+        """按 LRU 淘汰，直到总大小不超过上限"""
+        entries = []
+        for size_file in self.root.glob('*/*/*.size'):
+            entry = size_file.with_suffix('')
+            try:
+                entries.append((entry.stat().st_mtime, int(size_file.read_text() or 0), entry, size_file))
+            except (OSError, ValueError):
+                continue
+
+        total = sum(size for _, size, _, _ in entries)
+        if total <= self.max_bytes:
+            return
+
+        for _, size, entry, size_file in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            # 先重命名再删除，读取方要么看到完整条目，要么看不到
+            trash = entry.with_name(f".evict_{uuid.uuid4().hex}")
+            try:
+                os.rename(entry, trash)
+            except FileNotFoundError:
+                trash = None
+            except OSError:
+                trash = entry
+            size_file.unlink(missing_ok=True)
+            if trash is not None:
+                shutil.rmtree(trash, ignore_errors=True)
+            total -= size
+            logger.info("淘汰结果缓存: %s", entry.name)
+
+
+# 单例实例
+result_cache = ResultCache(
+    root=Config.RESULT_CACHE_FOLDER,
+    max_bytes=Config.RESULT_CACHE_MAX_BYTES,
+    enabled=Config.RESULT_CACHE_ENABLED
+)
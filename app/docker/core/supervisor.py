@@ -0,0 +1,259 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import docker
+
+from app.config import Config
+from app.core.exception import logger
+from app.docker.core.admission import AdmissionController
+from app.docker.core.container_pool import _pid_alive
+from app.docker.core.docker_clinet import docker_client
+from app.docker.core.log_stream import TaskLogStream
+from app.docker.core.task import collect_task_result, mark_task_done, mark_task_failed, supervisor_queue
+from app.docker.core.task_events import TaskEvents
+
+# 容器标签，用于识别监管服务启动的容器及其所属任务
+SUPERVISOR_LABEL = 'crop_al_hub.supervisor'
+SUPERVISOR_TASK_LABEL = 'crop_al_hub.supervisor.task'
+
+
+class ContainerSupervisor:
+    """
+    异步容器监管服务
+    单进程通过 Docker HTTP API 同时驱动多个算法容器：
+    - 启动容器后不再阻塞等待日志，而是订阅 Docker 事件流（die 事件）获知容器结束
+    - 容器结束后读取日志尾部、整理输出，并把结果写回 Celery 任务状态
+    并发上限由 SUPERVISOR_MAX_CONTAINERS 控制，不再受 Celery worker 进程数限制
+    """
+
+    def __init__(self, client, max_containers, api_threads):
+        self.client = client
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.max_containers = max_containers
+
+        self._api_executor = ThreadPoolExecutor(max_workers=api_threads, thread_name_prefix='docker-api')
+        self._queue_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='job-queue')
+        self._waiters = {}  # 容器ID -> 等待退出码的 Future
+        self._loop = None
+        self._stop = threading.Event()
+
+    async def _call(self, func, *args, **kwargs):
+        """在线程池中执行阻塞的 Docker API 调用"""
+        return await self._loop.run_in_executor(self._api_executor, partial(func, *args, **kwargs))
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        running = {}  # 队列条目ID -> asyncio.Task
+        heartbeat = Config.TASK_QUEUE_VISIBILITY_TIMEOUT / 3
+        last_heartbeat = 0
+
+        await self._call(self._remove_orphans)
+        threading.Thread(target=self._watch_events, name='docker-events', daemon=True).start()
+        logger.info("容器监管服务已启动（并发上限 %s）", self.max_containers)
+
+        while not self._stop.is_set():
+            free = self.max_containers - len(running)
+            try:
+                entries = []
+                if time.monotonic() - last_heartbeat >= heartbeat:
+                    # 续期运行中的任务（并发已满时也要续期），有空位时认领其他监管进程遗留的超时任务
+                    entries = await self._queue_call(self._heartbeat, list(running), free)
+                    last_heartbeat = time.monotonic()
+                if free <= 0:
+                    # 等待任一容器结束，最迟到下次心跳时间
+                    timeout = max(0, heartbeat - (time.monotonic() - last_heartbeat))
+                    await asyncio.wait(running.values(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                if len(entries) < free:
+                    entries += await self._queue_call(supervisor_queue.read_tasks, free - len(entries))
+            except Exception as e:
+                logger.error("读取容器任务失败: %s", str(e))
+                await asyncio.sleep(1)
+                continue
+
+            for entry_id, job in entries:
+                task = asyncio.create_task(self._handle(job))
+                running[entry_id] = task
+                task.add_done_callback(partial(self._finish, running, entry_id))
+
+        if running:
+            await asyncio.gather(*running.values(), return_exceptions=True)
+
+    async def _queue_call(self, func, *args):
+        """在独立线程中执行队列调用（阻塞读取不占用 Docker API 线程）"""
+        return await self._loop.run_in_executor(self._queue_executor, partial(func, *args))
+
+    @staticmethod
+    def _heartbeat(inflight, free):
+        supervisor_queue.touch(inflight)
+        if free <= 0:
+            return []
+        claimed, dead = supervisor_queue.reclaim(count=free)
+        for _, job in dead:
+            mark_task_failed(job['task_id'], RuntimeError("容器任务多次执行未完成"))
+            AdmissionController.release(job['image_name'], job['task_id'])
+        return claimed
+
+    def _finish(self, running, entry_id, _task):
+        """任务结果已回写，确认队列条目"""
+        running.pop(entry_id, None)
+        self._queue_executor.submit(supervisor_queue.ack, entry_id)
+
+    async def _handle(self, job):
+        """启动单个算法容器，等待其结束并回写任务状态"""
+        task_id = job['task_id']
+        container = None
+        try:
+            options = docker_client.container_options(
+                job['image_name'],
+                job['host_input_dir'],
+                job['host_output_dir'],
+                job['command'],
+                labels={SUPERVISOR_LABEL: self.owner, SUPERVISOR_TASK_LABEL: task_id}
+            )
+            container = await self._call(self.client.containers.create, job['image_name'], **options)
+
+            # 先登记再启动，保证不会错过 die 事件
+            waiter = self._loop.create_future()
+            self._waiters[container.id] = waiter
+            await self._call(container.start)
+            logger.info("容器已启动 [%s]: %s", task_id, container.name)
+            TaskEvents.publish(task_id, 'PROGRESS', {'stage': 'running'})
+
+            exit_code = await self._wait_exit(container.id, waiter)
+            logs = await self._call(container.logs, stdout=True, stderr=True, tail=Config.TASK_LOG_TAIL)
+            log_stream = TaskLogStream(task_id)
+            for line in logs.decode(errors='replace').splitlines():
+                log_stream.write(line.strip())
+            await self._loop.run_in_executor(None, log_stream.close)
+            logger.info("容器已退出 [%s]: exit_code=%s", task_id, exit_code)
+
+            result = await self._loop.run_in_executor(None, partial(
+                collect_task_result,
+                job['image_name'], task_id, job['host_output_dir'],
+                exit_code=exit_code,
+                image_digest=job.get('image_digest'),
+                cache_key=job.get('cache_key'),
+                logs=log_stream.text()
+            ))
+            mark_task_done(task_id, result)
+
+        except Exception as e:
+            logger.error("容器任务失败 [%s]: %s", task_id, str(e), exc_info=True)
+            mark_task_failed(task_id, e)
+
+        finally:
+            AdmissionController.release(job['image_name'], task_id)
+            if container:
+                self._waiters.pop(container.id, None)
+                try:
+                    await self._call(container.remove, force=True)
+                except docker.errors.NotFound:
+                    pass
+                except Exception as e:
+                    logger.warning("容器清理异常: %s", str(e))
+
+    async def _wait_exit(self, container_id, waiter):
+        """
+        等待容器退出码：优先使用 die 事件，超时未收到时主动查询容器状态
+        事件流未断开但漏掉事件时，也不会让任务和准入租约一直挂起
+        """
+        while True:
+            try:
+                return await asyncio.wait_for(asyncio.shield(waiter), timeout=Config.SUPERVISOR_WAIT_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                state = (await self._call(self.client.api.inspect_container, container_id))['State']
+            except docker.errors.NotFound:
+                return 1
+            except docker.errors.APIError as e:
+                logger.warning("容器状态查询失败 %s: %s", container_id, str(e))
+                continue
+            if state.get('Status') in ('exited', 'dead'):
+                logger.warning("未收到容器 die 事件，按查询结果结束 %s", container_id)
+                return state.get('ExitCode', 1)
+
+    def _resolve(self, container_id, exit_code):
+        waiter = self._waiters.get(container_id)
+        if waiter and not waiter.done():
+            waiter.set_result(exit_code)
+
+    def _watch_events(self):
+        """订阅本服务容器的 die 事件；断线重连时从断点重放并核对容器状态"""
+        since = None
+        while not self._stop.is_set():
+            try:
+                events = self.client.events(
+                    decode=True,
+                    since=since,
+                    filters={
+                        'type': 'container',
+                        'event': 'die',
+                        'label': f"{SUPERVISOR_LABEL}={self.owner}"
+                    }
+                )
+                if since is not None:
+                    self._reconcile()
+                for event in events:
+                    since = event.get('time', since)
+                    attributes = event.get('Actor', {}).get('Attributes', {})
+                    exit_code = int(attributes.get('exitCode', 1))
+                    self._loop.call_soon_threadsafe(self._resolve, event.get('id'), exit_code)
+            except Exception as e:
+                logger.warning("Docker 事件流中断，准备重连: %s", str(e))
+                since = since or int(time.time())
+                time.sleep(1)
+
+    def _reconcile(self):
+        """核对等待中的容器，补偿事件流断开期间已退出的容器"""
+        for container_id in list(self._waiters):
+            try:
+                state = self.client.api.inspect_container(container_id)['State']
+            except docker.errors.NotFound:
+                self._loop.call_soon_threadsafe(self._resolve, container_id, 1)
+                continue
+            except docker.errors.APIError as e:
+                logger.warning("容器状态核对失败 %s: %s", container_id, str(e))
+                continue
+            if state.get('Status') in ('exited', 'dead'):
+                self._loop.call_soon_threadsafe(self._resolve, container_id, state.get('ExitCode', 1))
+
+    def _remove_orphans(self):
+        """清理本机已退出的监管进程遗留的容器（对应的队列条目未确认，超时后会被重新认领执行）"""
+        hostname = socket.gethostname()
+        try:
+            containers = self.client.containers.list(all=True, filters={'label': SUPERVISOR_LABEL})
+        except docker.errors.APIError as e:
+            logger.warning("查询遗留容器失败: %s", str(e))
+            return
+
+        for container in containers:
+            host, _, pid = container.labels.get(SUPERVISOR_LABEL, '').rpartition(':')
+            if host != hostname or not pid.isdigit() or _pid_alive(int(pid)):
+                continue
+            try:
+                container.remove(force=True)
+                logger.info("清理遗留容器: %s", container.name)
+            except docker.errors.APIError:
+                pass
+
+    def stop(self):
+        self._stop.set()
+
+
+if __name__ == '__main__':
+    supervisor = ContainerSupervisor(
+        docker_client.client,
+        max_containers=Config.SUPERVISOR_MAX_CONTAINERS,
+        api_threads=Config.SUPERVISOR_API_THREADS
+    )
+    try:
+        asyncio.run(supervisor.run())
+    except KeyboardInterrupt:
+        supervisor.stop()
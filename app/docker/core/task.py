@@ -1,13 +1,22 @@
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from app.config import Config
 from app.core.exception import logger, ImageProcessingError
 
+from celery.exceptions import Ignore
+
+from app.docker.core.admission import AdmissionController
 from app.docker.core.celery_app import CeleryManager
 
 from app.docker.core.docker_clinet import docker_client
-from app.utils.storage import FileStorage
+from app.docker.core.redis_task import RedisTaskQueue
+from app.docker.core.result_cache import result_cache
+from app.docker.core.task_events import TaskEvents, register_task_events
+from app.utils.input_validator import InputValidator
 from app.utils.file_process import classify_files
 
 # 文件存储路径配置
@@ -18,24 +27,51 @@ OUTPUT_FOLDER = Config.OUTPUT_FOLDER
 UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
 OUTPUT_FOLDER.mkdir(parents=True, exist_ok=True)
 
+# 容器监管服务的任务队列
+supervisor_queue = RedisTaskQueue(queue_name=Config.SUPERVISOR_QUEUE, group='supervisors')
+
+
+def build_container_command(instruction=None):
+    """构建容器内的算法启动命令"""
+    docker_command = ["python3", "main.py", "-i", "/data", "-o", "/result"]
+    if instruction:
+        docker_command.extend(instruction.split())
+    return docker_command
+
+
+def collect_task_result(image_name, task_id, host_output_dir, exit_code=None, image_digest=None, cache_key=None,
+                        logs=None):
+    """校验输出目录并构建任务结果（logs 为容器日志尾部）"""
+    output_files = list(Path(host_output_dir).glob('*'))
+    logger.info("输出目录内容: %s", [f.name for f in output_files])
+    if not output_files:
+        raise RuntimeError("算法未生成任何输出文件")
+
+    # 仅缓存正常退出的结果
+    if cache_key and exit_code == 0:
+        result_cache.store(image_name, image_digest, cache_key, host_output_dir)
+
+    processed_files = classify_files(output_files, image_name, task_id)
+    return {
+        'status': 'SUCCESS',
+        'processed_files': processed_files,
+        'logs': logs or ''
+    }
+
 
 @CeleryManager.get_celery().task(bind=True)
 def run_algorithm(self, input_path, task_id, image_name, instruction=None):
+    release_lease = True  # 任务结束时释放准入租约（重试、转交监管服务时保留）
     try:
         logger.info(f"\n=== 任务启动 [{task_id}] ===")
 
         # 宿主机输入目录
         host_input_dir = Path(input_path)
 
-        # 检查该目录下是否有文件
-        files_in_directory = list(host_input_dir.glob('*'))  # 使用 * 匹配所有文件
-        if not files_in_directory:
-            print(files_in_directory)
-            raise RuntimeError("文件不存在")
+        # 检查目录下文件是否存在、是否损坏（并发校验，已校验过的文件跳过）
+        InputValidator.validate_directory(host_input_dir)
 
-        # 检查文件是否损坏
-        for file_path in files_in_directory:
-            FileStorage.is_file_corrupted(file_path)
+        TaskEvents.publish(task_id, 'PROGRESS', {'stage': 'prepared'})
 
         # 检查目录权限
         os.chmod(host_input_dir, 0o777)  # 任务开始前设置权限
@@ -45,30 +81,57 @@ def run_algorithm(self, input_path, task_id, image_name, instruction=None):
         host_output_dir = OUTPUT_FOLDER / image_name / f"task_{task_id}"
         host_output_dir.mkdir(parents=True, exist_ok=True)
 
-        # 构建容器命令
-        docker_command = ["python3", "main.py", "-i", "/data", "-o", "/result"]
-        if instruction:
-            docker_command.extend(instruction.split())
+        # 命中结果缓存时直接返回，不启动容器
+        image_digest, cache_key = None, None
+        if result_cache.enabled:
+            image_digest = docker_client.get_image_digest(image_name)
+            cache_key = result_cache.build_key(image_digest, instruction, result_cache.hash_input_dir(host_input_dir))
+            cached_files = result_cache.lookup(image_name, image_digest, cache_key, host_output_dir)
+            if cached_files:
+                logger.info("命中结果缓存 [%s]: %s", task_id, cache_key)
+                return {
+                    'status': 'SUCCESS',
+                    'processed_files': classify_files(cached_files, image_name, task_id),
+                    'logs': ''  # 未启动容器，没有日志（与 collect_task_result 返回结构一致）
+                }
 
+        # 构建容器命令
+        docker_command = build_container_command(instruction)
+
+        if Config.SUPERVISOR_ENABLED:
+            # 交给容器监管服务运行，完成后由监管服务写回任务状态
+            supervisor_queue.push_task({
+                'task_id': task_id,
+                'image_name': image_name,
+                'host_input_dir': str(host_input_dir),
+                'host_output_dir': str(host_output_dir),
+                'command': docker_command,
+                'image_digest': image_digest,
+                'cache_key': cache_key
+            })
+            logger.info("任务已提交至容器监管服务 [%s]", task_id)
+            raise Ignore()
+
+        TaskEvents.publish(task_id, 'PROGRESS', {'stage': 'running'})
         container_info = docker_client.run_algorithm_container(
             image_name=image_name,
             host_input_dir=host_input_dir,
             host_output_dir=host_output_dir,
-            command=docker_command
+            command=docker_command,
+            task_id=task_id
         )
 
-        # 验证输出结果
-        output_files = list(host_output_dir.glob('*'))
-        logger.info("输出目录内容: %s", [f.name for f in output_files])
-        if not output_files:
-            raise RuntimeError("算法未生成任何输出文件")
-
-        processed_files = classify_files(output_files, image_name, task_id)
-        return {
-            'status': 'SUCCESS',
-            'processed_files': processed_files
-        }
+        return collect_task_result(
+            image_name, task_id, host_output_dir,
+            exit_code=container_info.get('exit_code'),
+            image_digest=image_digest,
+            cache_key=cache_key,
+            logs=container_info.get('logs')
+        )
 
+    except Ignore:
+        release_lease = False
+        raise
     except Exception as e:
         logger.error(f"任务失败详情: {str(e)}", exc_info=True)
         # 如果是文件损坏或特定异常，直接标记任务失败，不进行重试
@@ -86,6 +149,7 @@ def run_algorithm(self, input_path, task_id, image_name, instruction=None):
         retry_count = self.request.retries
         if retry_count < 2:  # 最多重试2次
             logger.warning(f"任务重试中，重试次数: {retry_count + 1}")
+            release_lease = False
             raise self.retry(exc=e, countdown=2 ** retry_count)
         else:
             self.update_state(
@@ -98,24 +162,89 @@ def run_algorithm(self, input_path, task_id, image_name, instruction=None):
             raise
 
     finally:
+        if release_lease:
+            AdmissionController.release(image_name, task_id)
         logger.info(f"任务结束 [{task_id}]")
 
 
-from app.docker.core.redis_task import RedisTaskQueue
+# run_algorithm 开始、重试、成功、失败时推送状态事件
+register_task_events(run_algorithm)
+
+
+def mark_task_started(task_id, **meta):
+    """在 run_algorithm 之外执行的任务（批处理、监管服务）写回开始状态"""
+    run_algorithm.backend.mark_as_started(task_id, **meta)
+    TaskEvents.publish(task_id, 'STARTED', meta)
+
+
+def mark_task_done(task_id, result):
+    run_algorithm.backend.mark_as_done(task_id, result)
+    TaskEvents.publish(task_id, 'SUCCESS', {'result': result})
+
+
+def mark_task_failed(task_id, exc):
+    run_algorithm.backend.mark_as_failure(task_id, exc)
+    TaskEvents.publish(task_id, 'FAILURE', {'error': str(exc)})
 
 
 # 任务执行端 (独立服务)
 class TaskExecutor:
-    def __init__(self):
+    """
+    并发任务执行端
+    按空闲并发数批量读取任务，处理结束（成功或失败）后确认；进程崩溃时未确认的任务由其他执行端认领
+    """
+
+    def __init__(self, concurrency=None):
         self.task_queue = RedisTaskQueue(queue_name='image_tasks')
+        self.concurrency = concurrency or Config.TASK_EXECUTOR_CONCURRENCY
+        self._inflight = {}  # 条目ID -> Future
+        self._lock = threading.Lock()
+
+    def handle(self, task):
+        """执行单个任务"""
+        self.task_queue.update_status(task['task_id'], "running")
+        # 执行容器操作...
+        self.task_queue.update_status(task['task_id'], "completed")
+
+    def _process(self, entry_id, task):
+        try:
+            self.handle(task)
+        except Exception as e:
+            self.task_queue.update_status(task['task_id'], "failed", {"error": str(e)})
+        finally:
+            self.task_queue.ack(entry_id)
+            with self._lock:
+                self._inflight.pop(entry_id, None)
 
     def run_forever(self):
-        while True:
-            task = self.task_queue.pop_task()
-            if task:
+        heartbeat = Config.TASK_QUEUE_VISIBILITY_TIMEOUT / 3
+        last_heartbeat = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='task-executor') as executor:
+            while True:
                 try:
-                    self.task_queue.update_status(task['task_id'], "running")
-                    # 执行容器操作...
-                    self.task_queue.update_status(task['task_id'], "completed")
+                    with self._lock:
+                        inflight = list(self._inflight)
+                    free = self.concurrency - len(inflight)
+
+                    entries = []
+                    if time.monotonic() - last_heartbeat >= heartbeat:
+                        # 续期处理中的任务，并认领其他执行端遗留的超时任务
+                        self.task_queue.touch(inflight)
+                        if free > 0:
+                            entries, dead = self.task_queue.reclaim(count=free)
+                            for _, task in dead:
+                                self.task_queue.update_status(task['task_id'], "failed", {"error": "多次执行未完成"})
+                        last_heartbeat = time.monotonic()
+
+                    if free <= 0:
+                        time.sleep(0.2)
+                        continue
+
+                    if len(entries) < free:
+                        entries += self.task_queue.read_tasks(count=free - len(entries))
+                    for entry_id, task in entries:
+                        with self._lock:
+                            self._inflight[entry_id] = executor.submit(self._process, entry_id, task)
                 except Exception as e:
-                    self.task_queue.update_status(task['task_id'], "failed", {"error": str(e)})
+                    logger.error("任务执行端异常: %s", str(e), exc_info=True)
+                    time.sleep(1)
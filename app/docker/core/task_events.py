@@ -0,0 +1,157 @@
+import json
+import os
+import queue
+import threading
+import time
+
+from celery.signals import task_prerun, task_success, task_failure, task_retry
+
+from app.config import Config
+from app.core.exception import logger
+from app.core.redis_connection_pool import redis_pool
+
+# 任务结束状态，推送后关闭订阅
+TERMINAL_STATES = {'SUCCESS', 'FAILURE'}
+
+
+class TaskEvents:
+    """
+    任务状态事件（Redis 发布/订阅）
+    - 频道 task_events:<task_id> 推送状态变化：PENDING → STARTED → PROGRESS → SUCCESS/FAILURE
+    - task_events:last:<task_id> 保存最近一次事件，订阅方连接时先补发，避免错过连接前的状态
+    """
+
+    CHANNEL_PREFIX = 'task_events'
+
+    @classmethod
+    def channel(cls, task_id):
+        return f"{cls.CHANNEL_PREFIX}:{task_id}"
+
+    @classmethod
+    def last_key(cls, task_id):
+        return f"{cls.CHANNEL_PREFIX}:last:{task_id}"
+
+    @classmethod
+    def publish(cls, task_id, state, meta=None):
+        """发布状态事件（失败只记录日志，不影响任务执行）"""
+        event = json.dumps({'task_id': task_id, 'state': state, 'meta': meta or {}, 'time': time.time()},
+                           ensure_ascii=False, default=str)
+        try:
+            pipe = redis_pool.get_client('tasks').pipeline(transaction=False)
+            pipe.set(cls.last_key(task_id), event, ex=Config.TASK_EVENTS_TTL)
+            pipe.publish(cls.channel(task_id), event)
+            pipe.execute()
+        except Exception as e:
+            logger.warning("任务事件发布失败 [%s]: %s", task_id, str(e))
+
+    @classmethod
+    def last(cls, task_id):
+        """最近一次事件，不存在返回 None"""
+        raw = redis_pool.get_client('tasks').get(cls.last_key(task_id))
+        return json.loads(raw) if raw else None
+
+    @classmethod
+    def subscribe(cls, task_id):
+        """
+        订阅任务事件，返回接收事件的队列（调用方需调用 unsubscribe）
+        订阅连接重建后队列中会收到 None，表示期间可能漏掉事件，需重新读取最近事件
+        """
+        return task_event_hub.subscribe(cls.channel(task_id))
+
+    @classmethod
+    def unsubscribe(cls, task_id, events):
+        task_event_hub.unsubscribe(cls.channel(task_id), events)
+
+
+class TaskEventHub:
+    """
+    进程内共享的任务事件订阅
+    每个进程只用一个 Redis 连接按模式订阅 task_events:*，由后台线程分发给本进程的订阅队列，
+    SSE 连接数不再占用连接池
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # 频道 -> {队列}
+        self._ready = threading.Event()
+        self._pid = None
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # fork 后的子进程需要自己的订阅线程
+                self._pid = os.getpid()
+                self._ready = threading.Event()
+                self._subscribers = {}
+                threading.Thread(target=self._listen, name='task-events', daemon=True).start()
+        if not self._ready.wait(timeout=5):
+            raise ConnectionError("任务事件订阅连接未就绪")
+
+    def subscribe(self, channel):
+        self._ensure_started()
+        events = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(events)
+        return events
+
+    def unsubscribe(self, channel, events):
+        with self._lock:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(events)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    def _dispatch(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for events in subscribers:
+            events.put(event)
+
+    def _listen(self):
+        reconnected = False
+        while True:
+            pubsub = redis_pool.get_client('tasks').pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(f"{TaskEvents.CHANNEL_PREFIX}:*")
+                pubsub.get_message(timeout=1.0)  # 确认订阅生效
+                self._ready.set()
+                if reconnected:
+                    # 断线期间的事件可能丢失，通知订阅方重新读取最近事件
+                    with self._lock:
+                        channels = list(self._subscribers)
+                    for channel in channels:
+                        self._dispatch(channel, None)
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message['type'] == 'pmessage':
+                        self._dispatch(message['channel'], json.loads(message['data']))
+            except Exception as e:
+                logger.warning("任务事件订阅中断，准备重连: %s", str(e))
+                reconnected = True
+                time.sleep(1)
+            finally:
+                pubsub.close()
+
+
+task_event_hub = TaskEventHub()
+
+
+def register_task_events(task):
+    """为 Celery 任务挂载状态事件（开始、重试、成功、失败）"""
+
+    @task_prerun.connect(sender=task, weak=False)
+    def on_prerun(task_id=None, **kwargs):
+        TaskEvents.publish(task_id, 'STARTED')
+
+    @task_retry.connect(sender=task, weak=False)
+    def on_retry(request=None, reason=None, **kwargs):
+        TaskEvents.publish(request.id, 'RETRY', {'reason': str(reason)})
+
+    @task_success.connect(sender=task, weak=False)
+    def on_success(sender=None, result=None, **kwargs):
+        TaskEvents.publish(sender.request.id, 'SUCCESS', {'result': result})
+
+    @task_failure.connect(sender=task, weak=False)
+    def on_failure(task_id=None, exception=None, **kwargs):
+        TaskEvents.publish(task_id, 'FAILURE', {'error': str(exception)})
@@ -3,6 +3,8 @@ from sqlalchemy.ext.hybrid import hybrid_property
 from app import Star
 from app.exts import db
 from app.order.order import OrderStatus
+from app.search import fulltext
+from app.tag.tag_service import register_taggable
 from datetime import datetime
 
 from app.utils.image_url_utils import ImageURLHandlerUtils
@@ -52,6 +54,8 @@ class Model(db.Model):
 
     # 定义反向关系（属性名必须与 User.models 的 back_populates 一致）
     user = db.relationship("User", back_populates="models")
+    # type 字段拆分后的标签（由 type 自动同步，见 TagService）
+    tags = db.relationship("Tag", secondary="model_tag_table", lazy="select")
 
     # stars = db.relationship("Star", back_populates="model", lazy="dynamic")
     # orders = db.relationship("Order", back_populates="model", lazy="dynamic")
@@ -139,3 +143,10 @@ class Model(db.Model):
     # # 监听Star表的插入和删除事件
     # event.listen(Star, 'after_insert', update_star_count)
     # event.listen(Star, 'after_delete', update_star_count)
+
+
+# 名称、描述建立全文索引
+fulltext.register(Model, 'name', 'description')
+
+# type 字段变化时同步标签关联
+register_taggable(Model)
@@ -4,6 +4,8 @@ from app.utils.common.common_service import CommonService
 from app.core.exception import ValidationError, logger, ServiceException
 from app.exts import db
 from app.model.model import Model
+from app.search.fulltext import FullTextSearch
+from app.tag.tag_cache import TagCache
 from sqlalchemy.orm import joinedload
 
 from app.utils.common.pagination import PaginationHelper
@@ -34,13 +36,9 @@ class ModelRepository:
         return Model.query.filter_by(cuda=cuda_support).all()
 
     @staticmethod
-    def get_all_type_strings():
-        """直接查询所有模型的 type 字段（仅返回非空值）"""
-        return [
-            result[0]
-            for result in Model.query.with_entities(Model.type).filter(Model.type is not None).all()
-            if result[0]  # 过滤空字符串
-        ]
+    def get_tag_vocabulary():
+        """已使用的标签名及使用次数（缓存）"""
+        return TagCache.vocabulary(Model)
 
     @staticmethod
     def search_models(params: dict, page: int = 1, per_page: int = 10):
@@ -50,8 +48,11 @@ class ModelRepository:
                 joinedload(Model.user),
             )
 
-            if params.get('name'):
-                query = query.filter(Model.name.ilike(f"%{params.get('name')}%"))
+            # 名称、描述走全文索引
+            query, relevance = FullTextSearch.apply(query, Model, {
+                'name': params.get('name'),
+                'description': params.get('description')
+            })
 
             if params.get('input'):
                 query = query.filter(Model.input.like(f"%{params.get('input')}"))
@@ -59,11 +60,28 @@ class ModelRepository:
             if params.get('cuda'):
                 query = query.filter(Model.cuda == params.get('cuda'))
 
-            if params.get('description'):
-                query = query.filter(Model.description.ilike(f"%{params.get('description')}%"))
-
             if params.get('type'):
-                query = CommonService.process_and_filter_tags(query, Model.type, params.get('type'))
+                query = CommonService.process_and_filter_tags(
+                    query, Model, params.get('type'), params.get('tag_mode', 'and')
+                )
+
+            sort_by = params.get('sort_by')
+            if sort_by == 'relevance':
+                # 按相关度排序；未使用全文索引（检索词过短等）时保持默认顺序
+                if relevance is not None:
+                    query = query.order_by(relevance.desc(), Model.id.asc())
+                sort_by = None
+
+            if PaginationHelper.use_cursor(params):
+                # 游标分页：不统计总数，按索引顺序定位下一页
+                return PaginationHelper.paginate_cursor(
+                    query=query,
+                    cursor=params.get('cursor'),
+                    per_page=per_page,
+                    sort_mapping=ModelRepository.SORT_FIELD_MAPPING,
+                    sort_by=sort_by,
+                    sort_order=params.get('sort_order', 'asc')
+                )
 
             # 调用通用分页方法
             return PaginationHelper.paginate(
@@ -71,8 +89,10 @@ class ModelRepository:
                 page=page,
                 per_page=per_page,
                 sort_mapping=ModelRepository.SORT_FIELD_MAPPING,
-                sort_by=params.get('sort_by'),
-                sort_order=params.get('sort_order', 'asc')
+                sort_by=sort_by,
+                sort_order=params.get('sort_order', 'asc'),
+                count_params=params,
+                count_mode=params.get('count', 'exact')
             )
         except Exception as e:
             logger.error("模型查询失败｜%s", str(e), exc_info=True)
@@ -4,8 +4,11 @@ from app.core.exception import DatabaseError, ValidationError, FileUploadError,
     NotFoundError, logger, ServiceException
 from app.exts import db
 from app.model.model_repo import ModelRepository
+from app.tag.tag_cache import TagCache
+from app.utils.common.count_cache import CountCache
 from app.dataset.dataset_service import DatasetService
 from app.utils.common.json_encoder import ResponseBuilder
+from app.utils.common.pagination import PaginationHelper
 
 
 class ModelService:
@@ -39,6 +42,11 @@ class ModelService:
             page = max(1, int(search_params.get("page", 1)))
             per_page = min(100, max(1, int(search_params.get("per_page", 10))))  # 统一限制每页最大100条
 
+            if PaginationHelper.use_cursor(search_params):
+                models, next_cursor = ModelRepository.search_models(search_params, per_page=per_page)
+                items = [ModelService._convert_to_dict(model) for model in models]
+                return ResponseBuilder.cursor_response(items, per_page, next_cursor)
+
             total_count, models = ModelRepository.search_models(
                 search_params,
                 page=page,
@@ -53,6 +61,8 @@ class ModelService:
                 page=page,
                 per_page=per_page
             )
+        except ValidationError:
+            raise  # 无效的分页游标等参数错误直接返回
         except Exception as e:
             logger.error("搜索模型错误｜参数= %s｜异常= %s", search_params, str(e), exc_info=True)
             raise ServiceException("查询服务暂时不可用")
@@ -63,6 +73,8 @@ class ModelService:
         try:
             ModelRepository.save_model(model_instance)
             db.session.commit()
+            TagCache.invalidate(Model)
+            CountCache.invalidate(Model)
             return model_instance.to_dict(), 201
         except Exception as e:
             db.session.rollback()
@@ -76,6 +88,8 @@ class ModelService:
             # 获取模型对象
             ModelRepository.save_model(model_instance)
             db.session.commit()
+            TagCache.invalidate(Model)
+            CountCache.invalidate(Model)
             return model_instance.to_dict(), 200
         except Exception as e:
             db.session.rollback()
@@ -88,6 +102,8 @@ class ModelService:
         try:
             ModelRepository.delete_model(instance)
             db.session.commit()
+            TagCache.invalidate(Model)
+            CountCache.invalidate(Model)
             return {"message": "数据删除成功"}, 200
         except Exception as e:
             db.session.rollback()
@@ -82,7 +82,7 @@ class AppSearchSchema(AppBaseFieldsMixin, SortBaseSchema):
     # 排序控制
     sort_by = fields.String(
         validate=validate.OneOf(
-            ["likes", "watches", "created_at", "updated_at"],
-            error="排序字段只能是 likes, accuracy, created_at and updated_at must be less than 100 characters"
+            ["likes", "watches", "created_at", "updated_at", "relevance"],
+            error="排序字段只能是 likes, accuracy, created_at, updated_at and relevance must be less than 100 characters"
         )
     )
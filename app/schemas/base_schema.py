@@ -1,6 +1,6 @@
 from flask_limiter import Limiter
 
-from marshmallow import EXCLUDE, pre_load, fields, validate
+from marshmallow import EXCLUDE, pre_load, fields, validate, validates_schema
 from functools import wraps
 
 from marshmallow.fields import String
@@ -68,6 +68,25 @@ class SortBaseSchema(BaseSchema):
         metadata={"default": 5, "description": "每页数量"}
     )
 
+    # 游标分页：pagination=cursor 或携带上一页返回的 cursor 时启用，不返回总数，忽略 page
+    pagination = fields.String(
+        validate=validate.OneOf(["offset", "cursor"], error="pagination 只能是 offset/cursor")
+    )
+    cursor = fields.String(
+        validate=validate.Length(max=512),
+        metadata={"description": "上一页返回的 next_cursor"}
+    )
+
+    # 总数统计方式：approximate 最多统计到上限，超出时返回近似总数
+    count = fields.String(
+        validate=validate.OneOf(["exact", "approximate"], error="count 只能是 exact/approximate")
+    )
+
+    @validates_schema
+    def _validate_cursor(self, data, **kwargs):
+        if (data.get('pagination') == 'cursor' or data.get('cursor')) and data.get('sort_by') == 'relevance':
+            raise MarshmallowValidationError({"sort_by": ["相关度排序不支持游标分页"]})
+
 
 class AutoSchema(SQLAlchemyAutoSchema):
     """自动生成模型Schema的基类"""
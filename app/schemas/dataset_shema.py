@@ -115,6 +115,11 @@ class DatasetSearchSchema(DatasetBaseFieldsMixin, SortBaseSchema):
         model = Dataset
         ordered = True
 
+    # 多标签匹配方式：and 需包含全部标签，or 包含任一标签
+    tag_mode = fields.String(
+        validate=validate.OneOf(["and", "or"], error="tag_mode 只能是 and/or")
+    )
+
     size_min = fields.String(
         validate=validate_size_format,
         metadata={"example": "100MB", "description": "最小大小 (支持单位: B/KB/MB/GB/TB)"}
@@ -127,8 +132,8 @@ class DatasetSearchSchema(DatasetBaseFieldsMixin, SortBaseSchema):
     # 排序控制
     sort_by = fields.String(
         validate=validate.OneOf(
-            ["stars", "size", "downloads", "likes", "created_at", "updated_at"],
-            error="排序字段只能是 stars/size/downloads/likes/created_at/updated_at"
+            ["stars", "size", "downloads", "likes", "created_at", "updated_at", "relevance"],
+            error="排序字段只能是 stars/size/downloads/likes/created_at/updated_at/relevance"
         )
     )
 
@@ -0,0 +1,13 @@
+from marshmallow import fields, validate
+
+from app.schemas.base_schema import BaseSchema
+
+
+class UploadSessionSchema(BaseSchema):
+    """
+    用于验证创建分片上传会话的请求体
+    md5 为整个文件的哈希，提供时在完成上传时校验
+    """
+    filename = fields.Str(required=True, validate=validate.Length(min=1, max=255))
+    size = fields.Int(required=True, validate=validate.Range(min=1, error="文件大小必须大于0"))
+    md5 = fields.Str(required=False, validate=validate.Regexp(r'^[0-9a-fA-F]{32}$', error="md5格式错误"))
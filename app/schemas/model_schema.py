@@ -187,11 +187,16 @@ class ModelSearchSchema(ModelBaseFieldsMixin, SortBaseSchema):
         model = Model
         ordered = True
 
+    # 多标签匹配方式：and 需包含全部标签，or 包含任一标签
+    tag_mode = fields.String(
+        validate=validate.OneOf(["and", "or"], error="tag_mode 只能是 and/or")
+    )
+
     # 排序控制
     sort_by = fields.String(
         validate=validate.OneOf(
-            ["likes", "accuracy", "created_at", "updated_at"],
-            error="排序字段只能是 likes, accuracy, created_at and updated_at must be less than 100 characters"
+            ["likes", "accuracy", "created_at", "updated_at", "relevance"],
+            error="排序字段只能是 likes, accuracy, created_at, updated_at and relevance must be less than 100 characters"
         )
     )
 
@@ -203,6 +208,28 @@ class ModelRunSchema(BaseSchema):
     dataset_id = fields.Int(required=True, error_messages={"required": "Dataset_id is required"})
 
 
+class TaskLogQuerySchema(BaseSchema):
+    """
+    用于验证任务日志查询接口的请求参数
+    after 为上一页最后一条日志ID；tail=true 时返回最近的 count 行
+    """
+    after = fields.Str(required=False, validate=validate.Regexp(r'^\d+-\d+$', error="日志ID格式错误"))
+    count = fields.Int(load_default=100, validate=validate.Range(min=1, max=1000))
+    tail = fields.Bool(load_default=False)
+
+
+class TaskStatusBulkSchema(BaseSchema):
+    """
+    用于验证批量查询任务状态接口的请求体
+    """
+    task_ids = fields.List(
+        fields.Str(validate=validate.Length(min=1, max=64)),
+        required=True,
+        validate=validate.Length(min=1, max=500, error="单次最多查询500个任务"),
+        error_messages={"required": "task_ids is required"}
+    )
+
+
 class ModelTestSchema(BaseSchema):
     """
     用于验证测试模型接口请求中的文件和其他参数
@@ -0,0 +1,210 @@
+from sqlalchemy import event, literal_column, select, table, text
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import Session
+
+from app.config import Config
+from app.core.exception import logger
+from app.exts import db
+
+# 可全文检索的模型：模型类 -> 字段列表
+SEARCHABLE = {}
+
+
+def register(model_cls, *columns):
+    """登记需要全文检索的模型字段"""
+    SEARCHABLE[model_cls] = columns
+
+
+def _phrase(term):
+    """按短语检索（与原 ilike 子串语义一致），去除会被解析为语法的双引号"""
+    return '"' + term.replace('"', ' ').strip() + '"'
+
+
+class MySQLFulltextBackend:
+    """
+    MySQL FULLTEXT 索引（ngram 分词，支持中文）
+    索引建在原表上，由 InnoDB 随写入自动维护，无需额外同步
+    """
+
+    name = 'mysql'
+
+    def __init__(self):
+        # ngram 分词长度（ngram_token_size，默认 2），短于该长度的词无法命中索引
+        self.min_term_length = Config.SEARCH_NGRAM_TOKEN_SIZE
+
+    @staticmethod
+    def index_name(table_name, column):
+        return f"ft_{table_name}_{column}"
+
+    def ensure_indexes(self, conn):
+        existing = {
+            row[0] for row in conn.execute(text(
+                "SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND INDEX_TYPE = 'FULLTEXT'"
+            ))
+        }
+        for model_cls, columns in SEARCHABLE.items():
+            table_name = model_cls.__tablename__
+            for column in columns:
+                index = self.index_name(table_name, column)
+                if index in existing:
+                    continue
+                conn.execute(text(f"ALTER TABLE {table_name} ADD FULLTEXT INDEX {index} ({column}) WITH PARSER ngram"))
+                logger.info("已创建全文索引 %s", index)
+
+    def match_subquery(self, model_cls, column, term):
+        score = mysql.match(getattr(model_cls, column), against=_phrase(term)).in_boolean_mode()
+        return select(model_cls.id.label('id'), score.label('score')).where(score > 0).subquery()
+
+    def sync(self, conn, changes):
+        pass
+
+
+class SQLiteFTS5Backend:
+    """
+    SQLite FTS5 虚拟表（trigram 分词，支持中文子串检索），用于本地开发和测试
+    每个模型对应 <表名>_fts，rowid 与主键一致，提交后由会话钩子同步
+    """
+
+    name = 'sqlite'
+    min_term_length = 3  # trigram 分词至少 3 个字符
+
+    @staticmethod
+    def fts_table(model_cls):
+        return f"{model_cls.__tablename__}_fts"
+
+    def ensure_indexes(self, conn):
+        for model_cls, columns in SEARCHABLE.items():
+            fts = self.fts_table(model_cls)
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': fts}
+            ).first()
+            if exists:
+                continue
+            column_list = ', '.join(columns)
+            conn.execute(text(f"CREATE VIRTUAL TABLE {fts} USING fts5({column_list}, tokenize = 'trigram')"))
+            conn.execute(text(
+                f"INSERT INTO {fts} (rowid, {column_list}) "
+                f"SELECT id, {column_list} FROM {model_cls.__tablename__}"
+            ))
+            logger.info("已创建全文索引表 %s", fts)
+
+    def match_subquery(self, model_cls, column, term):
+        fts = self.fts_table(model_cls)
+        # bm25 越小越相关，取负数作为相关度
+        return select(
+            literal_column('rowid').label('id'), literal_column(f'-bm25({fts})').label('score')
+        ).select_from(table(fts)).where(
+            text(f"{fts} MATCH :query").bindparams(query=f"{column} : {_phrase(term)}")
+        ).subquery()
+
+    def sync(self, conn, changes):
+        for (model_cls, row_id), values in changes.items():
+            fts = self.fts_table(model_cls)
+            conn.execute(text(f"DELETE FROM {fts} WHERE rowid = :id"), {'id': row_id})
+            if values is not None:
+                columns = SEARCHABLE[model_cls]
+                conn.execute(
+                    text(f"INSERT INTO {fts} (rowid, {', '.join(columns)}) "
+                         f"VALUES (:id, {', '.join(':' + c for c in columns)})"),
+                    {'id': row_id, **values}
+                )
+
+
+BACKENDS = {
+    'mysql': MySQLFulltextBackend,
+    'sqlite': SQLiteFTS5Backend,
+}
+
+
+class FullTextSearch:
+    """
+    全文检索
+    - 按数据库方言选择后端：MySQL FULLTEXT（ngram）或 SQLite FTS5（trigram），其他数据库回退到 ilike
+    - 检索条件以子查询 (id, score) 连接到原查询，可与其他过滤条件、分页组合
+    - 短于后端最小分词长度的检索词无法命中索引，回退到 ilike
+    """
+
+    _backend = None
+    _initialized = False
+
+    @classmethod
+    def backend(cls):
+        if not cls._initialized:
+            cls._initialized = True
+            backend_cls = BACKENDS.get(db.engine.dialect.name) if Config.SEARCH_FULLTEXT_ENABLED else None
+            cls._backend = backend_cls() if backend_cls else None
+        return cls._backend
+
+    @classmethod
+    def ensure_indexes(cls):
+        """创建缺失的全文索引（应用启动时调用），失败时回退到 ilike"""
+        backend = cls.backend()
+        if backend is None:
+            return
+        try:
+            with db.engine.begin() as conn:
+                backend.ensure_indexes(conn)
+        except Exception as e:
+            logger.error("全文索引初始化失败，检索回退到 ilike: %s", str(e))
+            cls._backend = None
+
+    @classmethod
+    def apply(cls, query, model_cls, terms):
+        """
+        添加检索条件
+        :param terms: {字段名: 检索词}
+        :return: (查询, 相关度表达式)，未使用全文索引时相关度为 None
+        """
+        backend = cls.backend()
+        score = None
+        for column, term in terms.items():
+            term = (term or '').strip()
+            if not term:
+                continue
+            if backend is None or len(term) < backend.min_term_length \
+                    or column not in SEARCHABLE.get(model_cls, ()):
+                query = query.filter(getattr(model_cls, column).ilike(f"%{term}%"))
+                continue
+            matched = backend.match_subquery(model_cls, column, term)
+            query = query.join(matched, matched.c.id == model_cls.id)
+            score = matched.c.score if score is None else score + matched.c.score
+        return query, score
+
+
+# ---------- 会话钩子：提交后同步外部索引（SQLite FTS5） ----------
+
+PENDING_KEY = 'fulltext_pending'
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    backend = FullTextSearch._backend
+    if backend is None or backend.name != 'sqlite':
+        return
+    pending = session.info.setdefault(PENDING_KEY, {})
+    for instance in list(session.new) + list(session.dirty):
+        columns = SEARCHABLE.get(type(instance))
+        if columns and instance.id is not None:
+            pending[(type(instance), instance.id)] = {c: getattr(instance, c) for c in columns}
+    for instance in session.deleted:
+        if type(instance) in SEARCHABLE and instance.id is not None:
+            pending[(type(instance), instance.id)] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _sync_changes(session):
+    pending = session.info.pop(PENDING_KEY, None)
+    backend = FullTextSearch._backend
+    if not pending or backend is None:
+        return
+    try:
+        with db.engine.begin() as conn:
+            backend.sync(conn, pending)
+    except Exception as e:
+        logger.error("全文索引同步失败: %s", str(e))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop(PENDING_KEY, None)
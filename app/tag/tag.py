@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from app.exts import db
+
+# 模型-标签关联表（反向索引 tag_id, model_id 用于按标签查找模型）
+model_tags = db.Table(
+    'model_tag_table',
+    db.Column('model_id', db.Integer, db.ForeignKey('model_table.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag_table.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('idx_model_tag_tag', 'tag_id', 'model_id'),
+)
+
+# 数据集-标签关联表
+dataset_tags = db.Table(
+    'dataset_tag_table',
+    db.Column('dataset_id', db.Integer, db.ForeignKey('dataset_table.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag_table.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('idx_dataset_tag_tag', 'tag_id', 'dataset_id'),
+)
+
+
+class Tag(db.Model):
+    """标签（模型、数据集 type 字段拆分后的规范化存储）"""
+    __tablename__ = 'tag_table'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    name = db.Column(db.String(50), nullable=False, unique=True, index=True)  # 标签名
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Tag {self.name}>'
@@ -0,0 +1,83 @@
+import json
+import time
+
+from app.config import Config
+from app.core.exception import logger
+from app.core.redis_connection_pool import redis_pool
+from app.tag.tag_repo import TagRepository
+
+
+class TagCache:
+    """
+    标签词表缓存（进程内 + Redis 共享）
+    - 词表包含已使用的标签名及使用次数，Redis 键 tags:vocab:<表名>:<版本号>
+    - 版本号 tags:version:<表名> 在数据写入后递增，旧版本的词表不再被读取，自然过期
+    - 进程内缓存每 TAG_CACHE_LOCAL_TTL 秒检查一次版本号；Redis 不可用时直接查询数据库
+    """
+
+    VERSION_PREFIX = 'tags:version'
+    VOCAB_PREFIX = 'tags:vocab'
+
+    # 表名 -> (版本号, 词表, 检查时间)
+    _local = {}
+
+    @classmethod
+    def _version_key(cls, model_cls):
+        return f"{cls.VERSION_PREFIX}:{model_cls.__tablename__}"
+
+    @classmethod
+    def _vocab_key(cls, model_cls, version):
+        return f"{cls.VOCAB_PREFIX}:{model_cls.__tablename__}:{version}"
+
+    @staticmethod
+    def _load(model_cls):
+        counts = TagRepository.get_counts(model_cls)
+        return {"types": [name for name, _ in counts], "counts": dict(counts)}
+
+    @classmethod
+    def vocabulary(cls, model_cls):
+        """
+        获取标签词表
+        :return: {"types": [标签名], "counts": {标签名: 使用次数}}
+        """
+        name = model_cls.__tablename__
+        now = time.monotonic()
+        entry = cls._local.get(name)
+        if entry and now - entry[2] < Config.TAG_CACHE_LOCAL_TTL:
+            return entry[1]
+
+        version, data = None, None
+        try:
+            client = redis_pool.get_client('cache')
+            version = client.get(cls._version_key(model_cls)) or '0'
+            if entry and entry[0] == version:
+                cls._local[name] = (version, entry[1], now)
+                return entry[1]
+            raw = client.get(cls._vocab_key(model_cls, version))
+            if raw:
+                data = json.loads(raw)
+        except Exception as e:
+            logger.warning("读取标签词表缓存失败: %s", str(e))
+
+        if data is None:
+            data = cls._load(model_cls)
+            if version is not None:
+                try:
+                    redis_pool.get_client('cache').set(
+                        cls._vocab_key(model_cls, version), json.dumps(data, ensure_ascii=False),
+                        ex=Config.TAG_CACHE_TTL
+                    )
+                except Exception as e:
+                    logger.warning("写入标签词表缓存失败: %s", str(e))
+
+        cls._local[name] = (version, data, now)
+        return data
+
+    @classmethod
+    def invalidate(cls, model_cls):
+        """数据提交后调用：递增版本号，所有进程在下次检查时重新加载"""
+        cls._local.pop(model_cls.__tablename__, None)
+        try:
+            redis_pool.get_client('cache').incr(cls._version_key(model_cls))
+        except Exception as e:
+            logger.warning("标签词表缓存失效失败: %s", str(e))
@@ -0,0 +1,42 @@
+from sqlalchemy import func, select
+
+from app.exts import db
+from app.tag.tag import Tag
+
+
+class TagRepository:
+
+    @staticmethod
+    def _association(model_cls):
+        """模型类对应的关联表及其外键列"""
+        secondary = model_cls.tags.property.secondary
+        owner_column = next(c for c in secondary.c if c.name != 'tag_id')
+        return secondary, owner_column
+
+    @staticmethod
+    def get_by_names(names):
+        return Tag.query.filter(Tag.name.in_(names)).all() if names else []
+
+    @staticmethod
+    def filter_by_tags(query, model_cls, tags, mode='and'):
+        """
+        按标签过滤（走关联表索引）
+        :param mode: and 需包含全部标签；or 包含任一标签
+        """
+        if not tags:
+            return query
+        secondary, owner_column = TagRepository._association(model_cls)
+        matched = select(owner_column).join(Tag, Tag.id == secondary.c.tag_id).where(Tag.name.in_(tags))
+        if mode == 'and':
+            matched = matched.group_by(owner_column).having(func.count(Tag.id) == len(set(tags)))
+        return query.filter(model_cls.id.in_(matched))
+
+    @staticmethod
+    def get_counts(model_cls) -> list[tuple[str, int]]:
+        """已被使用的标签名及使用次数（按名称排序）"""
+        secondary, _ = TagRepository._association(model_cls)
+        rows = db.session.execute(
+            select(Tag.name, func.count()).join(secondary, secondary.c.tag_id == Tag.id)
+            .group_by(Tag.name).order_by(Tag.name)
+        )
+        return [(name, count) for name, count in rows]
@@ -0,0 +1,92 @@
+import re
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.core.exception import logger
+from app.exts import db
+from app.tag.tag import Tag
+from app.tag.tag_cache import TagCache
+
+# 带标签的模型类（type 字段为分隔符连接的标签字符串）
+TAGGABLE = set()
+
+# 标签分隔符（存储拆分与检索拆分共用，标签内可包含空格）
+TAG_DELIMITERS = r'[,;，；]'
+
+# 标签名最大长度，超出部分截断
+TAG_MAX_LENGTH = Tag.__table__.c.name.type.length
+
+
+def register_taggable(model_cls):
+    """登记由 type 字段同步标签关联的模型类"""
+    TAGGABLE.add(model_cls)
+
+
+class TagService:
+
+    @staticmethod
+    def split(type_str) -> list[str]:
+        """拆分 type 字符串（中英文逗号、分号），超长标签截断，去重（不区分大小写）并保持顺序"""
+        if not type_str:
+            return []
+        tags = {}
+        for tag in re.split(TAG_DELIMITERS, type_str):
+            tag = tag.strip()[:TAG_MAX_LENGTH].strip()
+            if tag:
+                tags.setdefault(tag.lower(), tag)
+        return list(tags.values())
+
+    @staticmethod
+    def resolve(session, names):
+        """
+        按名称获取标签，不存在时创建（同一次 flush 内复用新建的标签）
+        名称按小写匹配，与 MySQL 默认排序规则的唯一约束一致
+        """
+        cache = session.info.setdefault('tag_cache', {})
+        missing = [name for name in names if name.lower() not in cache]
+        if missing:
+            with session.no_autoflush:
+                for tag in session.query(Tag).filter(Tag.name.in_(missing)):
+                    cache[tag.name.lower()] = tag
+            for name in missing:
+                if name.lower() not in cache:
+                    cache[name.lower()] = Tag(name=name)
+                    session.add(cache[name.lower()])
+        return [cache[name.lower()] for name in names]
+
+    @staticmethod
+    def backfill(batch_size=500):
+        """根据现有 type 字符串补建标签关联（可重复执行）"""
+        updated = 0
+        for model_cls in TAGGABLE:
+            last_id = 0
+            while True:
+                rows = model_cls.query.filter(model_cls.id > last_id).order_by(model_cls.id).limit(batch_size).all()
+                if not rows:
+                    break
+                for row in rows:
+                    row.tags = TagService.resolve(db.session, TagService.split(row.type))
+                db.session.commit()
+                updated += len(rows)
+                last_id = rows[-1].id
+            TagCache.invalidate(model_cls)
+        logger.info("标签关联补建完成，共处理 %s 条记录", updated)
+        return updated
+
+
+@event.listens_for(Session, 'before_flush')
+def _sync_tags(session, flush_context, instances):
+    """type 字段变化时同步标签关联"""
+    for instance in list(session.new) + list(session.dirty):
+        if type(instance) not in TAGGABLE:
+            continue
+        if instance not in session.new and not inspect(instance).attrs.type.history.has_changes():
+            continue
+        instance.tags = TagService.resolve(session, TagService.split(instance.type))
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _clear_tag_cache(session):
+    session.info.pop('tag_cache', None)
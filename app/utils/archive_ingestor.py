@@ -0,0 +1,176 @@
+import shutil
+import tarfile
+import zipfile
+from collections import deque
+from pathlib import Path, PurePosixPath
+
+from app.config import Config
+from app.core.exception import logger, ValidationError, ImageProcessingError
+from app.docker.core.batch import submit_test_task
+from app.docker.core.celery_app import CeleryManager
+from app.docker.core.task import mark_task_failed
+from app.utils.input_validator import InputValidator
+from app.utils.storage import INPUT_EXTENSIONS
+from app.utils.temp_file_service import temp_service
+
+# 支持的压缩包后缀
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.gz')
+
+# 解压时忽略的系统文件
+IGNORED_NAMES = ('__MACOSX/', '.DS_Store', 'Thumbs.db')
+
+# 压缩包内允许的文件后缀（不区分大小写）
+ENTRY_EXTENSIONS = {ext.lower() for ext in INPUT_EXTENSIONS}
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def is_archive(filename):
+    return bool(filename) and filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+class ArchiveIngestor:
+    """
+    压缩包流式解压到任务输入目录
+    - tar / tar.gz 以流模式（r|*）逐个读取成员，不缓存整个压缩包
+    - zip 需要读取中央目录，直接使用上传的临时文件随机访问，不额外复制
+    - 每个文件检查路径、后缀和大小，子目录展平到输入目录（同名文件加序号）
+    - 文件写入后立即提交校验，解压与校验并发进行，发现损坏文件立即失败；
+      全部通过后写入校验缓存，运行任务时不再重复校验
+    """
+
+    def __init__(self, target_dir):
+        self.target_dir = Path(target_dir)
+        self.files = []
+        self.skipped = 0
+        self.total_size = 0
+        self._pending = deque()
+        self._max_pending = Config.INPUT_VALIDATION_WORKERS * 4
+
+    @classmethod
+    def extract(cls, file_stream, filename, target_dir):
+        """
+        解压压缩包
+        :return: 解压得到的文件列表
+        """
+        ingestor = cls(target_dir)
+        ingestor.target_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            if filename.lower().endswith('.zip'):
+                ingestor._extract_zip(file_stream)
+            else:
+                ingestor._extract_tar(file_stream)
+            ingestor._drain(0)
+        except (tarfile.TarError, zipfile.BadZipFile, EOFError) as e:
+            raise ValidationError(f"压缩包格式错误: {str(e)}")
+        finally:
+            # 异常时也要等待已提交的校验结束，避免与目录清理竞争
+            while ingestor._pending:
+                ingestor._pending.popleft().exception()
+
+        if not ingestor.files:
+            raise ValidationError("压缩包中没有可处理的图片文件")
+
+        InputValidator.mark_verified(ingestor.files)
+        logger.info("压缩包解压完成: %s 个文件，跳过 %s 个，共 %s 字节",
+                    len(ingestor.files), ingestor.skipped, ingestor.total_size)
+        return ingestor.files
+
+    def _extract_tar(self, file_stream):
+        with tarfile.open(fileobj=file_stream, mode='r|*') as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue  # 目录、链接、设备文件一律忽略
+                target = self._accept(member.name, member.size)
+                if target is None:
+                    continue
+                self._write(archive.extractfile(member), target)
+
+    def _extract_zip(self, file_stream):
+        if not (hasattr(file_stream, 'seekable') and file_stream.seekable()):
+            raise ValidationError("zip 压缩包需要完整上传后解压")
+        with zipfile.ZipFile(file_stream) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                target = self._accept(info.filename, info.file_size)
+                if target is None:
+                    continue
+                with archive.open(info) as source:
+                    self._write(source, target)
+
+    def _accept(self, name, size):
+        """检查成员路径、后缀和大小，返回写入路径；不处理的文件返回 None"""
+        path = PurePosixPath(name.replace('\\', '/'))
+        if path.is_absolute() or '..' in path.parts:
+            raise ValidationError(f"压缩包包含非法路径: {name}")
+        if any(ignored in name for ignored in IGNORED_NAMES) or path.name.startswith('.'):
+            return None
+        if path.suffix.lower() not in ENTRY_EXTENSIONS:
+            self.skipped += 1
+            return None
+
+        if len(self.files) >= Config.ARCHIVE_MAX_ENTRIES:
+            raise ValidationError(f"压缩包文件数超过限制（{Config.ARCHIVE_MAX_ENTRIES}）")
+        if size > Config.ARCHIVE_MAX_ENTRY_SIZE:
+            raise ValidationError(f"文件 {path.name} 超过单文件大小限制")
+
+        target = self.target_dir / path.name
+        index = 1
+        while target.exists():
+            target = self.target_dir / f"{path.stem}_{index}{path.suffix}"
+            index += 1
+        return target
+
+    def _write(self, source, target):
+        """按实际读取的字节数限制大小（不信任压缩包声明的大小）"""
+        written = 0
+        with open(target, 'wb') as f:
+            while True:
+                chunk = source.read(COPY_BUFFER_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > Config.ARCHIVE_MAX_ENTRY_SIZE:
+                    raise ValidationError(f"文件 {target.name} 超过单文件大小限制")
+                if self.total_size + written > Config.ARCHIVE_MAX_TOTAL_SIZE:
+                    raise ValidationError("压缩包解压后总大小超过限制")
+                f.write(chunk)
+        self.total_size += written
+        self.files.append(target)
+
+        self._drain(self._max_pending - 1)
+        self._pending.append(InputValidator.submit(target))
+
+    def _drain(self, limit):
+        """等待校验结果，直到进行中的校验不超过 limit 个；发现损坏文件立即失败"""
+        while len(self._pending) > limit:
+            path, error = self._pending.popleft().result()
+            if error:
+                raise ImageProcessingError(f"{Path(path).name}: {error}")
+
+
+@CeleryManager.get_celery().task(ignore_result=True)
+def ingest_archive(archive_path, filename, target_dir, task_id, image_name, instruction, temp_url=None, user_id=None):
+    """
+    后台解压任务压缩包，完成后提交算法任务；解压失败时任务直接标记为失败
+    压缩包解压后删除：分片上传的临时文件（temp_url）从临时区删除，直接上传的暂存文件直接删除
+    """
+    try:
+        with open(archive_path, 'rb') as archive_stream:
+            ArchiveIngestor.extract(archive_stream, filename, target_dir)
+    except Exception as e:
+        logger.warning("任务 %s 压缩包解压失败: %s", task_id, str(e))
+        shutil.rmtree(target_dir, ignore_errors=True)
+        mark_task_failed(task_id, e)
+        return
+    finally:
+        try:
+            if temp_url:
+                temp_service.delete_temp(temp_url, user_id)
+            else:
+                Path(archive_path).unlink(missing_ok=True)
+        except Exception as e:
+            logger.warning("删除压缩包失败 %s: %s", archive_path, str(e))
+
+    submit_test_task(image_name, instruction, target_dir, task_id)
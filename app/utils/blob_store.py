@@ -0,0 +1,143 @@
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+
+from app.config import FileConfig
+from app.core.exception import logger
+from app.core.redis_connection_pool import redis_pool
+from app.docker.core.celery_app import CeleryManager
+from app.utils.storage import FileStorage
+
+# 上传文件统一按 <md5><后缀> 命名
+HASH_NAME_PATTERN = re.compile(r'^([0-9a-f]{32})(\.[A-Za-z0-9]+)?$')
+
+
+def parse_file_hash(path):
+    """从内容寻址文件名中提取哈希，不符合命名规则返回 None"""
+    match = HASH_NAME_PATTERN.match(Path(path).name)
+    return match.group(1) if match else None
+
+
+class BlobStore:
+    """
+    内容寻址存储（按 MD5 去重）
+    - 实际内容保存在 blobs/<哈希前两位>/<哈希>，每份内容只保存一次
+    - 用户、模型、数据集目录下的逻辑路径是指向对象的硬链接，读取方式不变
+    - 引用计数保存在 Redis 哈希 blob:refs，计数归零的对象进入 blob:gc 等待回收
+    - 回收时再次检查链接数（st_nlink == 1），计数丢失也不会误删仍被引用的内容
+    """
+
+    REFS_KEY = 'blob:refs'
+    GC_KEY = 'blob:gc'
+
+    @staticmethod
+    def root():
+        return Path(FileConfig.LOCAL_FILE_BASE) / FileConfig.BLOB_DIR
+
+    @classmethod
+    def blob_path(cls, file_hash):
+        return cls.root() / file_hash[:2] / file_hash
+
+    @staticmethod
+    def _client():
+        return redis_pool.get_client('files')
+
+    @classmethod
+    def ingest(cls, src_path, file_hash, verify=True):
+        """
+        把文件收入对象存储：内容已存在时直接丢弃源文件，否则提交为对象
+        :param verify: 上传时已校验过的内容传 False
+        :return: 对象路径
+        """
+        src_path = Path(src_path)
+        blob = cls.blob_path(file_hash)
+        if blob.exists():
+            src_path.unlink(missing_ok=True)
+            return blob
+        if verify:
+            # 对象文件名不带扩展名，按源文件名校验
+            FileStorage.is_file_corrupted(src_path)
+        return FileStorage.commit_file(src_path, blob, verify=False)
+
+    @classmethod
+    def link(cls, file_hash, dest_path):
+        """
+        在逻辑路径创建指向对象的硬链接并增加引用计数
+        目标已是同一对象时不重复计数
+        """
+        dest_path = Path(dest_path)
+        blob = cls.blob_path(file_hash)
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        if dest_path.exists() and os.path.samefile(dest_path, blob):
+            return dest_path
+
+        # 先链接到临时名再原子替换，避免读取方看到缺失的文件
+        tmp = dest_path.with_name(f".{dest_path.name}.{uuid.uuid4().hex}.link")
+        os.link(blob, tmp)
+        os.replace(tmp, dest_path)
+
+        pipe = cls._client().pipeline()
+        pipe.hincrby(cls.REFS_KEY, file_hash, 1)
+        pipe.zrem(cls.GC_KEY, file_hash)
+        pipe.execute()
+        return dest_path
+
+    @classmethod
+    def release(cls, logical_path):
+        """
+        删除逻辑路径并减少引用计数，计数归零时登记待回收
+        未链接到对象的历史文件（可能被其他记录共用）保持不变
+        """
+        logical_path = Path(logical_path)
+        file_hash = parse_file_hash(logical_path)
+        if file_hash is None or not logical_path.is_file():
+            return
+        blob = cls.blob_path(file_hash)
+        if not blob.exists() or not os.path.samefile(logical_path, blob):
+            return
+        logical_path.unlink(missing_ok=True)
+
+        client = cls._client()
+        if client.hincrby(cls.REFS_KEY, file_hash, -1) <= 0:
+            client.zadd(cls.GC_KEY, {file_hash: time.time()})
+
+    @classmethod
+    def collect(cls, grace=None, limit=500):
+        """
+        回收无引用对象
+        :param grace: 计数归零后的保留时长（秒），覆盖归零后立即被重新引用的情况
+        """
+        grace = FileConfig.BLOB_GC_GRACE if grace is None else grace
+        client = cls._client()
+        candidates = client.zrangebyscore(cls.GC_KEY, '-inf', time.time() - grace, start=0, num=limit)
+        removed = 0
+        for file_hash in candidates:
+            # 认领成功的进程才处理，避免并发回收
+            if not client.zrem(cls.GC_KEY, file_hash):
+                continue
+            refs = int(client.hget(cls.REFS_KEY, file_hash) or 0)
+            if refs > 0:
+                continue
+            blob = cls.blob_path(file_hash)
+            try:
+                if blob.exists() and blob.stat().st_nlink > 1:
+                    # 仍有逻辑路径链接到该对象，按链接数修正计数
+                    client.hset(cls.REFS_KEY, file_hash, blob.stat().st_nlink - 1)
+                    continue
+                blob.unlink(missing_ok=True)
+                client.hdel(cls.REFS_KEY, file_hash)
+                removed += 1
+            except OSError as e:
+                logger.warning("回收对象失败 %s: %s", file_hash, str(e))
+                client.zadd(cls.GC_KEY, {file_hash: time.time()})
+        if removed:
+            logger.info("已回收无引用对象 %s 个", removed)
+        return removed
+
+
+@CeleryManager.get_celery().task
+def collect_blobs():
+    """定时回收引用计数归零的对象"""
+    return BlobStore.collect()
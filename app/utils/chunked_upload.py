@@ -0,0 +1,290 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+from app.config import FileConfig
+from app.core.exception import logger, ValidationError, NotFoundError, PermissionDeniedError, ApiError
+from app.core.redis_connection_pool import redis_pool
+from app.docker.core.celery_app import CeleryManager
+from app.utils.temp_file_service import TEMP_INDEX_KEY, temp_service, get_upload_rule
+
+
+class UploadOffsetError(ApiError):
+    """分片偏移量与服务端不一致，客户端应按 offset 继续上传"""
+
+    def __init__(self, offset):
+        super().__init__(f"偏移量不一致，当前偏移量为 {offset}")
+        self.offset = offset
+
+
+class ChunkedUploadService:
+    """
+    分片续传
+    - 会话保存在 Redis 哈希 upload_session:<id>，分片直接追加写入 TEMP_DIR/sessions 下的 .part 文件
+    - 已写入的字节数以磁盘文件大小为准，断线后客户端查询偏移量继续上传
+    - 会话登记到临时文件过期索引（real_path 指向 .part 文件），过期未完成的由 cleanup_temp_files 统一清理
+    - 写入分片时在进程内累计 MD5；完成时哈希完整则直接转入 TempFileService 临时区，
+      分片由其他进程写入（哈希不完整）时转为后台任务计算，客户端查询会话状态获取结果
+    """
+
+    KEY_PREFIX = 'upload_session'
+    MAX_HASHERS = 1024  # 进程内保留的增量哈希数量上限
+
+    def __init__(self):
+        # session_id -> (已计算到的偏移量, md5)
+        self._hashers = OrderedDict()
+        self._hashers_lock = threading.Lock()
+
+    def _take_hasher(self, session_id, offset):
+        """取出计算到 offset 的增量哈希，偏移量为 0 时新建；不连续时返回 None"""
+        with self._hashers_lock:
+            entry = self._hashers.pop(session_id, None)
+        if entry and entry[0] == offset:
+            return entry[1]
+        return hashlib.md5() if offset == 0 else None
+
+    def _keep_hasher(self, session_id, offset, hasher):
+        with self._hashers_lock:
+            self._hashers[session_id] = (offset, hasher)
+            while len(self._hashers) > self.MAX_HASHERS:
+                self._hashers.popitem(last=False)
+
+    @classmethod
+    def _key(cls, session_id):
+        return f"{cls.KEY_PREFIX}:{session_id}"
+
+    @staticmethod
+    def _client():
+        return redis_pool.get_client('files')
+
+    def create(self, user_id, upload_type, data_id, file_type, filename, size, md5=None):
+        """创建上传会话"""
+        extensions, max_size = get_upload_rule(upload_type, file_type)
+        suffix = Path(filename).suffix
+        if suffix.lower().lstrip('.') not in extensions:
+            raise ValidationError(f"仅支持{'/'.join(extensions)}格式文件")
+        if size <= 0 or size > max_size:
+            raise ValidationError(f"文件大小超过限制（{max_size // (1024 * 1024)}MB）")
+
+        session_id = uuid.uuid4().hex
+        part_path = Path(FileConfig.TEMP_DIR) / 'sessions' / str(user_id) / f"{session_id}.part"
+        part_path.parent.mkdir(parents=True, exist_ok=True)
+        part_path.touch()
+
+        key = self._key(session_id)
+        expire_at = time.time() + FileConfig.UPLOAD_SESSION_TTL
+        pipe = self._client().pipeline()
+        pipe.hset(key, mapping={
+            "real_path": str(part_path),
+            "user_id": str(user_id),
+            "upload_type": upload_type,
+            "data_id": str(data_id),
+            "file_type": file_type,
+            "suffix": suffix,
+            "size": str(size),
+            "md5": (md5 or '').lower(),
+            "expire_at": str(expire_at)
+        })
+        pipe.zadd(TEMP_INDEX_KEY, {key: expire_at})
+        pipe.execute()
+        logger.info(f"创建上传会话 {session_id}: {filename} ({size} 字节)")
+        return {"session_id": session_id, "offset": 0, "size": size,
+                "chunk_size": FileConfig.UPLOAD_SESSION_MAX_CHUNK}
+
+    def _get_session(self, session_id, user_id):
+        session = self._client().hgetall(self._key(session_id))
+        if not session:
+            raise NotFoundError("上传会话不存在或已过期")
+        if session['user_id'] != str(user_id):
+            raise PermissionDeniedError()
+        return session
+
+    @staticmethod
+    def _offset(session):
+        part_path = Path(session['real_path'])
+        if not part_path.exists():
+            raise NotFoundError("上传会话不存在或已过期")
+        return part_path.stat().st_size
+
+    def status(self, session_id, user_id):
+        """查询已写入的偏移量；完成后返回校验状态和临时文件URL"""
+        session = self._get_session(session_id, user_id)
+        if session.get('status'):
+            return self._result(session_id, session)
+        return {"session_id": session_id, "offset": self._offset(session), "size": int(session['size'])}
+
+    @staticmethod
+    def _result(session_id, session):
+        result = {"session_id": session_id, "status": session['status'], "size": int(session['size'])}
+        if session.get('temp_url'):
+            result['temp_url'] = session['temp_url']
+        if session.get('error'):
+            result['error'] = session['error']
+        return result
+
+    def append(self, session_id, user_id, offset, stream, length):
+        """
+        在指定偏移量追加一个分片
+        :param length: 分片长度（Content-Length）
+        :return: 写入后的偏移量
+        """
+        session = self._get_session(session_id, user_id)
+        if session.get('status'):
+            raise ApiError("上传已完成，不能继续写入")
+        size = int(session['size'])
+        if length is None or length <= 0:
+            raise ValidationError("分片内容为空")
+        if length > FileConfig.UPLOAD_SESSION_MAX_CHUNK:
+            raise ValidationError("分片大小超过限制")
+
+        # 同一会话同时只允许一个写入方
+        client = self._client()
+        lock_key = f"{self._key(session_id)}:lock"
+        if not client.set(lock_key, 1, nx=True, ex=300):
+            raise ApiError("该上传会话正在写入，请稍后重试")
+        try:
+            current = self._offset(session)
+            if offset != current:
+                raise UploadOffsetError(current)
+            if offset + length > size:
+                raise ValidationError("分片超出文件声明大小")
+
+            hasher = self._take_hasher(session_id, offset)
+            written = 0
+            with open(session['real_path'], 'ab') as f:
+                while written < length:
+                    chunk = stream.read(min(FileConfig.UPLOAD_CHUNK_SIZE, length - written))
+                    if not chunk:
+                        break  # 连接中断：已写入部分保留，客户端按偏移量续传
+                    f.write(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    written += len(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            if hasher is not None:
+                self._keep_hasher(session_id, offset + written, hasher)
+
+            # 有写入即续期会话
+            expire_at = time.time() + FileConfig.UPLOAD_SESSION_TTL
+            pipe = client.pipeline()
+            pipe.hset(self._key(session_id), "expire_at", str(expire_at))
+            pipe.zadd(TEMP_INDEX_KEY, {self._key(session_id): expire_at})
+            pipe.execute()
+            return offset + written
+        finally:
+            client.delete(lock_key)
+
+    def complete(self, session_id, user_id):
+        """
+        完成上传：进程内已累计完整哈希时直接转入临时区，否则交给后台任务校验
+        :return: 会话结果，status 为 completed（含 temp_url）或 verifying
+        """
+        session = self._get_session(session_id, user_id)
+        if session.get('status'):
+            return self._result(session_id, session)
+        # 与分片写入互斥，确认文件完整后标记完成，之后的写入和重复请求直接返回
+        client = self._client()
+        key = self._key(session_id)
+        lock_key = f"{key}:lock"
+        if not client.set(lock_key, 1, nx=True, ex=300):
+            raise ApiError("该上传会话正在写入，请稍后重试")
+        try:
+            offset, size = self._offset(session), int(session['size'])
+            if offset != size:
+                raise UploadOffsetError(offset)
+            if not client.hsetnx(key, 'status', 'verifying'):
+                return self._result(session_id, client.hgetall(key))
+        finally:
+            client.delete(lock_key)
+
+        hasher = self._take_hasher(session_id, size)
+        try:
+            if hasher is None:
+                finalize_upload_session.delay(session_id, user_id)
+                return {"session_id": session_id, "status": "verifying", "size": size}
+            return self._finalize(session_id, session, hasher.hexdigest())
+        except ValidationError:
+            raise
+        except Exception:
+            self._reset_status(session_id)
+            raise
+
+    def finalize(self, session_id, user_id):
+        """后台任务：重新计算完整文件的哈希后转入临时区"""
+        session = self._get_session(session_id, user_id)
+        if session.get('status') != 'verifying':
+            return self._result(session_id, session)
+        try:
+            md5 = hashlib.md5()
+            with open(session['real_path'], 'rb') as f:
+                for chunk in iter(lambda: f.read(FileConfig.UPLOAD_CHUNK_SIZE), b''):
+                    md5.update(chunk)
+            return self._finalize(session_id, session, md5.hexdigest())
+        except ValidationError:
+            raise
+        except Exception:
+            self._reset_status(session_id)
+            raise
+
+    def _reset_status(self, session_id):
+        """转入临时区失败时撤销完成标记，客户端可重新调用完成接口"""
+        self._client().hdel(self._key(session_id), 'status')
+
+    def _finalize(self, session_id, session, file_hash):
+        """校验 MD5 并转入临时区，结果写回会话（保留到会话过期，供客户端查询）"""
+        key = self._key(session_id)
+        part_path = Path(session['real_path'])
+        if session['md5'] and session['md5'] != file_hash:
+            part_path.unlink(missing_ok=True)
+            result = {"status": "failed", "error": "文件校验失败，请重新上传"}
+        else:
+            temp_url = temp_service.save_temp_from_path(
+                part_path, file_hash, session['suffix'],
+                upload_type=session['upload_type'],
+                data_id=int(session['data_id']),
+                file_type=session['file_type'],
+                user_id=int(session['user_id']),
+                ttl=FileConfig.CHUNKED_UPLOAD_RESULT_TTL
+            )
+            result = {"status": "completed", "temp_url": temp_url}
+            logger.info(f"上传会话 {session_id} 完成: {temp_url}")
+
+        pipe = self._client().pipeline()
+        pipe.hset(key, mapping=result)
+        pipe.zrem(TEMP_INDEX_KEY, key)  # .part 文件已转入临时区或删除，不再由临时文件清理处理
+        pipe.expire(key, FileConfig.UPLOAD_SESSION_TTL)
+        pipe.execute()
+        if result['status'] == 'failed':
+            raise ValidationError(result['error'])
+        return self._result(session_id, {**session, **result})
+
+    def abort(self, session_id, user_id):
+        """放弃上传并删除已写入的内容"""
+        session = self._get_session(session_id, user_id)
+        if session.get('status') == 'verifying':
+            raise ApiError("文件正在校验，请稍后重试")
+        with self._hashers_lock:
+            self._hashers.pop(session_id, None)
+        if session.get('status') != 'completed':
+            Path(session['real_path']).unlink(missing_ok=True)
+        pipe = self._client().pipeline()
+        pipe.delete(self._key(session_id))
+        pipe.zrem(TEMP_INDEX_KEY, self._key(session_id))
+        pipe.execute()
+
+
+chunked_upload_service = ChunkedUploadService()
+
+
+@CeleryManager.get_celery().task
+def finalize_upload_session(session_id, user_id):
+    """分片上传完成后在后台计算哈希并转入临时区"""
+    try:
+        chunked_upload_service.finalize(session_id, user_id)
+    except ValidationError as e:
+        logger.warning("上传会话 %s 校验失败: %s", session_id, str(e))
@@ -1,12 +1,84 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-from app.config import FileConfig
+from app.config import FileConfig, Config
 from app.core.exception import logger
+from app.core.redis_connection_pool import redis_pool
 from app.docker.core.celery_app import CeleryManager
 import shutil
 from pathlib import Path
 
 
+class CleanupScheduler:
+    """
+    任务目录清理调度
+    (输入目录, 输出目录) 写入按到期时间排序的 ZSET，由定时清理任务统一删除，
+    不再为每个任务投递一个 24 小时倒计时任务
+    """
+
+    KEY = 'cleanup:dirs'
+
+    @staticmethod
+    def get_retention(model_id=None, user_id=None):
+        """保留时长（秒）：用户配置优先，其次模型配置，最后为默认值"""
+        if user_id is not None and user_id in Config.TASK_RETENTION_BY_USER:
+            return Config.TASK_RETENTION_BY_USER[user_id]
+        if model_id is not None and model_id in Config.TASK_RETENTION_BY_MODEL:
+            return Config.TASK_RETENTION_BY_MODEL[model_id]
+        return Config.TASK_RETENTION_DEFAULT
+
+    @classmethod
+    def schedule(cls, input_dir, output_dir, retention=None):
+        """登记到期后需要删除的任务目录"""
+        expire_at = time.time() + (retention if retention is not None else Config.TASK_RETENTION_DEFAULT)
+        member = json.dumps([str(input_dir), str(output_dir)])
+        redis_pool.get_client('tasks').zadd(cls.KEY, {member: expire_at})
+        return expire_at
+
+    @classmethod
+    def claim_expired(cls, limit):
+        """
+        取出已到期的目录组
+        通过 ZREM 的返回值认领，多个清理任务并发时每组目录只会被一个任务处理
+        """
+        client = redis_pool.get_client('tasks')
+        members = client.zrangebyscore(cls.KEY, '-inf', time.time(), start=0, num=limit)
+        if not members:
+            return []
+        pipe = client.pipeline(transaction=False)
+        for member in members:
+            pipe.zrem(cls.KEY, member)
+        return [json.loads(member) for member, removed in zip(members, pipe.execute()) if removed]
+
+
+def _remove_dir(path):
+    path = Path(path)
+    if path.exists():
+        shutil.rmtree(path, ignore_errors=True)
+        return 1
+    return 0
+
+
+@CeleryManager.get_celery().task
+def sweep_task_directories():
+    """定时清理已到期的任务输入/输出目录（线程池并行删除）"""
+    removed = 0
+    with ThreadPoolExecutor(max_workers=Config.CLEANUP_WORKERS) as executor:
+        while True:
+            batch = CleanupScheduler.claim_expired(Config.CLEANUP_BATCH_SIZE)
+            if not batch:
+                break
+            paths = [path for dirs in batch for path in dirs]
+            removed += sum(executor.map(_remove_dir, paths))
+            if len(batch) < Config.CLEANUP_BATCH_SIZE:
+                break
+    if removed:
+        logger.info("[清理任务] 已删除到期任务目录 %s 个", removed)
+    return removed
+
+
 @CeleryManager.get_celery().task
 def cleanup_directory(input_dir, output_dir):
     try:
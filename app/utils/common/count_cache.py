@@ -0,0 +1,76 @@
+import hashlib
+import json
+
+from app.config import Config
+from app.core.exception import logger
+from app.core.redis_connection_pool import redis_pool
+
+# 不影响总数的参数（分页、排序、统计方式）
+NON_FILTER_PARAMS = {'page', 'per_page', 'sort_by', 'sort_order', 'pagination', 'cursor', 'count'}
+
+
+class CountCache:
+    """
+    分页总数缓存（Redis）
+    - 键 count:<表名>:<版本号>:<过滤条件摘要>，过滤条件去除分页、排序参数后规范化，短时间过期
+    - 版本号 count:version:<表名> 在数据写入后递增，旧版本的总数不再被读取
+    - Redis 不可用时直接统计，不影响查询
+    """
+
+    PREFIX = 'count'
+
+    @staticmethod
+    def _client():
+        return redis_pool.get_client('cache')
+
+    @classmethod
+    def _version_key(cls, table_name):
+        return f"{cls.PREFIX}:version:{table_name}"
+
+    @staticmethod
+    def normalize(params: dict, mode: str) -> str:
+        """过滤条件摘要：忽略分页排序参数和空值，字符串去除两端空格"""
+        filters = {
+            key: value.strip() if isinstance(value, str) else value
+            for key, value in params.items()
+            if key not in NON_FILTER_PARAMS and value not in (None, '')
+        }
+        raw = json.dumps([mode, filters], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    @classmethod
+    def _key(cls, client, table_name, params, mode):
+        version = client.get(cls._version_key(table_name)) or '0'
+        return f"{cls.PREFIX}:{table_name}:{version}:{cls.normalize(params, mode)}"
+
+    @classmethod
+    def get_or_count(cls, table_name, params, mode, count_func):
+        """
+        读取缓存的总数，未命中时调用 count_func 统计并写入
+        :param count_func: 返回 (总数, 是否为近似值)
+        """
+        key = None
+        try:
+            client = cls._client()
+            key = cls._key(client, table_name, params, mode)
+            cached = client.get(key)
+            if cached is not None:
+                return int(cached.rstrip('+')), cached.endswith('+')
+        except Exception as e:
+            logger.warning("读取总数缓存失败: %s", str(e))
+
+        total, approximate = count_func()
+        if key is not None:
+            try:
+                cls._client().set(key, f"{total}+" if approximate else str(total), ex=Config.SEARCH_COUNT_CACHE_TTL)
+            except Exception as e:
+                logger.warning("写入总数缓存失败: %s", str(e))
+        return total, approximate
+
+    @classmethod
+    def invalidate(cls, model_cls):
+        """数据提交后调用：递增版本号，缓存的总数全部失效"""
+        try:
+            cls._client().incr(cls._version_key(model_cls.__tablename__))
+        except Exception as e:
+            logger.warning("总数缓存失效失败: %s", str(e))
@@ -66,15 +66,29 @@ def create_json_response(data=None, status=200, http_status=200):
 class ResponseBuilder:
     @staticmethod
     def paginated_response(items, total_count, page, per_page):
-        """更健壮的分页响应"""
+        """更健壮的分页响应（近似总数表示实际数量不少于 total）"""
+        approximate = getattr(total_count, 'approximate', False)
         return {
             "data": {
                 "items": items or [],  # 保证空列表而非None
-                "total": total_count,
+                "total": int(total_count),
+                "total_approximate": approximate,
                 "page": page,
                 "per_page": per_page,
                 "total_pages": max(1, (total_count + per_page - 1) // per_page),
-                "has_next": (page * per_page) < total_count,
+                "has_next": (page * per_page) < total_count or (approximate and len(items or []) == per_page),
                 "has_prev": page > 1
             }
-        }
\ No newline at end of file
+        }
+
+    @staticmethod
+    def cursor_response(items, per_page, next_cursor):
+        """游标分页响应（不返回总数）"""
+        return {
+            "data": {
+                "items": items or [],
+                "per_page": per_page,
+                "next_cursor": next_cursor,
+                "has_next": next_cursor is not None
+            }
+        }
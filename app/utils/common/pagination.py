@@ -1,6 +1,21 @@
-from sqlalchemy import asc, desc
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import and_, asc, desc, func, or_
 from sqlalchemy.orm import Query
 
+from app.config import Config
+from app.core.exception import ValidationError
+from app.utils.common.count_cache import CountCache
+
+
+class ApproximateCount(int):
+    """近似总数（统计达到上限），实际数量不少于该值"""
+    approximate = True
+
 
 class PaginationHelper:
     @staticmethod
@@ -11,7 +26,9 @@ class PaginationHelper:
             sort_mapping: dict = None,
             sort_by: str = None,
             sort_order: str = 'asc',
-            max_per_page: int = 100
+            max_per_page: int = 100,
+            count_params: dict = None,
+            count_mode: str = 'exact'
     ) -> tuple[int, list]:
         """
         通用分页排序方法
@@ -23,7 +40,9 @@ class PaginationHelper:
         :param sort_by: 排序字段名
         :param sort_order: 排序方向(asc/desc)
         :param max_per_page: 最大每页数量限制
-        :return: (总记录数, 当前页数据列表)
+        :param count_params: 过滤参数，传入时按参数缓存总数
+        :param count_mode: exact 精确统计；approximate 最多统计 SEARCH_APPROXIMATE_COUNT_CAP 行
+        :return: (总记录数, 当前页数据列表)，近似总数为 ApproximateCount
         """
         # 参数校验
         page = max(1, page)
@@ -36,7 +55,130 @@ class PaginationHelper:
             query = query.order_by(order_func(sort_field), asc(query.column_descriptions[0]['entity'].id))
 
         # 分页查询
-        total_count = query.count()
-        items = query.offset((page - 1) * per_page).limit(per_page).all()
+        offset = (page - 1) * per_page
+        items = query.offset(offset).limit(per_page).all()
+        total_count = PaginationHelper._count(query, offset, items, per_page, count_params, count_mode)
 
         return total_count, items
+
+    @staticmethod
+    def _count(query, offset, items, per_page, count_params, count_mode):
+        """统计总数：未取满一页时已知总数，无需再查询"""
+        if len(items) < per_page and (items or offset == 0):
+            return offset + len(items)
+
+        entity = query.column_descriptions[0]['entity']
+        # 统计时不需要急加载和排序
+        count_query = query.enable_eagerloads(False).order_by(None)
+
+        def count_func():
+            if count_mode == 'approximate':
+                cap = Config.SEARCH_APPROXIMATE_COUNT_CAP
+                limited = count_query.with_entities(entity.id).limit(cap + 1).subquery()
+                total = query.session.query(func.count()).select_from(limited).scalar()
+                return (cap, True) if total > cap else (total, False)
+            return count_query.count(), False
+
+        if count_params is None:
+            total, approximate = count_func()
+        else:
+            total, approximate = CountCache.get_or_count(
+                entity.__tablename__, count_params, count_mode, count_func
+            )
+        if approximate:
+            return ApproximateCount(max(total, offset + len(items)))
+        return total
+
+    @staticmethod
+    def use_cursor(params: dict) -> bool:
+        """请求是否使用游标分页（pagination=cursor 或携带 cursor）"""
+        return params.get('pagination') == 'cursor' or bool(params.get('cursor'))
+
+    @staticmethod
+    def paginate_cursor(
+            query: Query,
+            cursor: str = None,
+            per_page: int = 10,
+            sort_mapping: dict = None,
+            sort_by: str = None,
+            sort_order: str = 'asc',
+            max_per_page: int = 100
+    ) -> tuple[list, str | None]:
+        """
+        游标分页（keyset）：按 (排序字段, id) 定位上一页末尾，不统计总数、不扫描偏移行
+
+        排序字段与 id 同向排序，可直接沿 idx_created_at / idx_likes / idx_accuracy 等索引
+        （InnoDB 二级索引隐含主键）顺序读取，取到 per_page + 1 行即停止
+
+        :param cursor: 上一页返回的 next_cursor，首页不传
+        :return: (当前页数据列表, 下一页游标)，没有下一页时游标为 None
+        """
+        per_page = min(max_per_page, max(1, per_page))
+        entity = query.column_descriptions[0]['entity']
+        if not (sort_mapping and sort_by in sort_mapping):
+            sort_by = None
+        sort_field = sort_mapping[sort_by] if sort_by else None
+        descending = sort_order == 'desc'
+        order_func = desc if descending else asc
+
+        if sort_field is not None:
+            query = query.order_by(order_func(sort_field), order_func(entity.id))
+        else:
+            query = query.order_by(order_func(entity.id))
+
+        if cursor:
+            value, last_id = PaginationHelper._decode_cursor(cursor, sort_by, sort_order, sort_field)
+            query = query.filter(PaginationHelper._after(sort_field, entity.id, value, last_id, descending))
+
+        rows = query.limit(per_page + 1).all()
+        items = rows[:per_page]
+        next_cursor = None
+        if len(rows) > per_page:
+            last = items[-1]
+            value = getattr(last, sort_field.key) if sort_field is not None else None
+            next_cursor = PaginationHelper._encode_cursor(sort_by, sort_order, value, last.id)
+        return items, next_cursor
+
+    @staticmethod
+    def _after(sort_field, id_field, value, last_id, descending):
+        """位于游标之后的记录（MySQL / SQLite 中 NULL 最小：升序排在最前，降序排在最后）"""
+        id_after = id_field < last_id if descending else id_field > last_id
+        if sort_field is None:
+            return id_after
+        if value is None:
+            if descending:
+                return and_(sort_field.is_(None), id_after)
+            return or_(sort_field.isnot(None), and_(sort_field.is_(None), id_after))
+
+        beyond = sort_field < value if descending else sort_field > value
+        condition = or_(beyond, and_(sort_field == value, id_after))
+        if descending:
+            condition = or_(condition, sort_field.is_(None))
+        return condition
+
+    @staticmethod
+    def _encode_cursor(sort_by, sort_order, value, last_id):
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        raw = json.dumps([sort_by, sort_order, value, last_id], separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def _decode_cursor(cursor, sort_by, sort_order, sort_field):
+        """解析游标，排序方式与游标生成时不一致视为无效"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            cursor_sort_by, cursor_sort_order, value, last_id = json.loads(raw)
+            if (cursor_sort_by, cursor_sort_order) != (sort_by, sort_order) or not isinstance(last_id, int):
+                raise ValueError
+            if value is not None and sort_field is not None:
+                python_type = sort_field.type.python_type
+                if python_type is datetime:
+                    value = datetime.fromisoformat(value)
+                elif python_type is Decimal:
+                    value = Decimal(value)
+            return value, last_id
+        except (binascii.Error, ValueError, TypeError, InvalidOperation, NotImplementedError):
+            raise ValidationError("无效的分页游标")
@@ -66,6 +66,20 @@ class ImageURLHandlerUtils:
 
         return relative_path  # 返回标准化相对路径(无前缀)
 
+    @classmethod
+    def validate_file(cls, url: str, allowed_extensions) -> str:
+        """按扩展名白名单验证文件（不限于图片，如数据集压缩包）"""
+        cls.validate_url_format(url)
+        relative_path = cls.extract_relative_path(url)
+        local_path = cls.build_local_path(relative_path)
+
+        if Path(local_path).suffix.lower().lstrip('.') not in allowed_extensions:
+            raise ValidationError(f"仅支持{'/'.join(allowed_extensions)}格式文件")
+
+        if not os.path.isfile(local_path):
+            raise NotFoundError("文件无法找到或不存在")
+
+        return relative_path
 
     @staticmethod
     def parse_temp_url_components(url: str) -> dict:
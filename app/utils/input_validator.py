@@ -0,0 +1,265 @@
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+
+import billiard
+from billiard.pool import Pool as BilliardPool
+from PIL import Image, UnidentifiedImageError
+
+from app.config import Config
+from app.core.exception import logger, ImageProcessingError, ValidationError
+from app.core.redis_connection_pool import redis_pool
+
+# 需要做损坏检测的图片类型及其文件头
+IMAGE_SIGNATURES = {
+    '.jpg': (b'\xff\xd8\xff',),
+    '.jpeg': (b'\xff\xd8\xff',),
+    '.png': (b'\x89PNG\r\n\x1a\n',),
+    '.bmp': (b'BM',),
+    '.gif': (b'GIF87a', b'GIF89a'),
+}
+
+# 校验级别：header 仅检查文件头；verify 为 PIL 完整性校验；decode 为完整解码
+VALIDATION_LEVELS = {'header': 0, 'verify': 1, 'decode': 2}
+
+# 少于该数量的文件直接在当前进程校验，避免进程池开销
+PARALLEL_THRESHOLD = 4
+
+
+def check_header(path):
+    """
+    快速预检：文件存在且文件头与扩展名一致，PIL 能解析图片头
+    :return: 错误信息，正常返回 None
+    """
+    path = Path(path)
+    if not path.is_file():
+        return "非文件"
+
+    signatures = IMAGE_SIGNATURES.get(path.suffix.lower())
+    if not signatures:
+        return None
+
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(16)
+        if not head.startswith(signatures):
+            return "文件已经损坏"
+        with Image.open(path) as img:
+            if not img.size[0] or not img.size[1]:
+                return "文件已经损坏"
+    except (UnidentifiedImageError, IOError):
+        return "文件已经损坏"
+    return None
+
+
+def check_content(path, level):
+    """
+    完整校验（在进程池中执行）
+    :return: (路径, 错误信息)，正常时错误信息为 None
+    """
+    try:
+        with Image.open(path) as img:
+            if level >= VALIDATION_LEVELS['decode']:
+                img.load()  # 完整解码像素数据
+            else:
+                img.verify()  # 验证文件是否完整
+    except (UnidentifiedImageError, IOError):
+        return path, "文件已经损坏"
+    except Exception:
+        return path, "文件检测失败"
+    return path, None
+
+
+def check_file(path, level):
+    """
+    单文件校验：文件头预检，需要时再做完整校验（可在进程池中执行）
+    :return: (路径, 错误信息)，正常时错误信息为 None
+    """
+    error = check_header(path)
+    if error or level == VALIDATION_LEVELS['header'] or Path(path).suffix.lower() not in IMAGE_SIGNATURES:
+        return path, error
+    return check_content(path, level)
+
+
+class BilliardExecutor:
+    """
+    billiard 进程池的 Executor 适配（map / submit 与 ProcessPoolExecutor 一致）
+    Celery prefork 子进程是守护进程，标准库 multiprocessing 不允许其再创建子进程，billiard 没有该限制
+    """
+
+    def __init__(self, max_workers):
+        self._pool = BilliardPool(processes=max_workers)
+
+    def map(self, fn, *iterables, chunksize=1):
+        return self._pool.starmap(fn, zip(*iterables), chunksize=chunksize)
+
+    def submit(self, fn, *args):
+        future = Future()
+        self._pool.apply_async(fn, args, callback=future.set_result, error_callback=future.set_exception)
+        return future
+
+    def shutdown(self, wait=True):
+        self._pool.close()
+        if wait:
+            self._pool.join()
+
+
+def _in_daemon_process():
+    """是否运行在守护进程中（如 Celery prefork 子进程，进程对象来自 billiard）"""
+    return multiprocessing.current_process().daemon or billiard.current_process().daemon
+
+
+class InputValidator:
+    """
+    算法输入文件校验
+    1. 所有文件先做文件头预检（快速失败）
+    2. 需要完整校验的图片分发到进程池并发执行
+    3. 校验通过的结果按 (路径, 大小, 修改时间) 缓存，重试和重跑时跳过
+    """
+
+    _executor = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def _get_executor(cls):
+        with cls._lock:
+            if cls._executor is None:
+                workers = Config.INPUT_VALIDATION_WORKERS
+                if _in_daemon_process():
+                    # Celery prefork 子进程（run_algorithm 校验输入）使用 billiard 进程池
+                    cls._executor = BilliardExecutor(max_workers=workers)
+                else:
+                    cls._executor = ProcessPoolExecutor(max_workers=workers)
+            return cls._executor
+
+    @classmethod
+    def shutdown(cls):
+        """关闭进程池（Celery 子进程退出时调用，避免遗留空闲校验进程）"""
+        with cls._lock:
+            executor, cls._executor = cls._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    @staticmethod
+    def _cache_key(path):
+        return f"input_verified:{path}"
+
+    @staticmethod
+    def _fingerprint(path, level):
+        stat = path.stat()
+        return f"{stat.st_size}:{stat.st_mtime_ns}:{level}"
+
+    @classmethod
+    def _load_verified(cls, paths, level):
+        """查询已校验过且未变化的文件"""
+        fingerprints = {}
+        for path in paths:
+            try:
+                fingerprints[path] = cls._fingerprint(path, level)
+            except OSError:
+                continue
+        try:
+            with redis_pool.get_redis_connection('files') as conn:
+                cached = conn.mget([cls._cache_key(path) for path in fingerprints])
+        except Exception as e:
+            logger.warning("读取文件校验缓存失败: %s", str(e))
+            return set(), fingerprints
+        verified = {path for path, value in zip(fingerprints, cached) if value == fingerprints[path]}
+        return verified, fingerprints
+
+    @classmethod
+    def _save_verified(cls, fingerprints):
+        if not fingerprints:
+            return
+        try:
+            with redis_pool.get_redis_connection('files') as conn:
+                pipe = conn.pipeline(transaction=False)
+                for path, fingerprint in fingerprints.items():
+                    pipe.set(cls._cache_key(path), fingerprint, ex=Config.INPUT_VALIDATION_CACHE_TTL)
+                pipe.execute()
+        except Exception as e:
+            logger.warning("写入文件校验缓存失败: %s", str(e))
+
+    @classmethod
+    def validate_files(cls, paths, level=None):
+        """
+        并发校验一组文件
+        :return: {路径: 错误信息}，全部通过时为空字典
+        """
+        level = VALIDATION_LEVELS[level or Config.INPUT_VALIDATION_LEVEL]
+        paths = [Path(p) for p in paths]
+        errors = {}
+
+        # 文件头预检
+        for path in paths:
+            error = check_header(path)
+            if error:
+                errors[path] = error
+        candidates = [p for p in paths if p not in errors and p.suffix.lower() in IMAGE_SIGNATURES]
+        if level == VALIDATION_LEVELS['header'] or not candidates:
+            return errors
+
+        verified, fingerprints = cls._load_verified(candidates, level)
+        pending = [str(p) for p in candidates if p not in verified]
+        if verified:
+            logger.info("跳过已校验文件 %s 个", len(verified))
+
+        if len(pending) < PARALLEL_THRESHOLD:
+            results = [check_content(p, level) for p in pending]
+        else:
+            chunksize = max(1, len(pending) // (Config.INPUT_VALIDATION_WORKERS * 4))
+            results = cls._get_executor().map(check_content, pending, [level] * len(pending), chunksize=chunksize)
+
+        passed = {}
+        for path, error in results:
+            path = Path(path)
+            if error:
+                errors[path] = error
+            elif path in fingerprints:
+                passed[path] = fingerprints[path]
+        cls._save_verified(passed)
+        return errors
+
+    @classmethod
+    def submit(cls, path, level=None):
+        """
+        提交单个文件异步校验（边写入边校验，如压缩包解压）
+        :return: Future，结果为 (路径, 错误信息)
+        """
+        level = VALIDATION_LEVELS[level or Config.INPUT_VALIDATION_LEVEL]
+        return cls._get_executor().submit(check_file, str(path), level)
+
+    @classmethod
+    def mark_verified(cls, paths, level=None):
+        """记录已通过校验的文件，运行任务时跳过重复校验"""
+        level = VALIDATION_LEVELS[level or Config.INPUT_VALIDATION_LEVEL]
+        fingerprints = {}
+        for path in paths:
+            path = Path(path)
+            if path.suffix.lower() not in IMAGE_SIGNATURES:
+                continue
+            try:
+                fingerprints[path] = cls._fingerprint(path, level)
+            except OSError:
+                continue
+        cls._save_verified(fingerprints)
+
+    @classmethod
+    def validate_directory(cls, directory, level=None):
+        """
+        校验目录下所有文件，任一文件异常即抛出
+        :return: 目录下的文件列表
+        """
+        files = list(Path(directory).glob('*'))
+        if not files:
+            raise RuntimeError("文件不存在")
+
+        errors = cls.validate_files(files, level)
+        if errors:
+            path, message = next(iter(errors.items()))
+            logger.warning("输入文件校验失败 %s: %s", path, message)
+            if message == "非文件":
+                raise ValidationError(message)
+            raise ImageProcessingError(message)
+        return files
@@ -1,5 +1,11 @@
+import csv
+import io
+import json
+import shlex
 import subprocess
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
 
 # 配置日志记录
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -13,13 +19,23 @@ CONNE = {
     'workspace': '/home/chenwanyue/workspace/'
 }
 
+# 分片运行配置
+SHARD_CONFIG = {
+    'cpus_per_container': 2,  # 单个容器预留的CPU核数
+    'memory_per_container': 4 * 1024 ** 3,  # 单个容器预留的内存（字节）
+    'max_shards': 8,  # 分片数上限
+    'min_files_per_shard': 20  # 每个分片最少文件数，文件太少时不分片
+}
+
 
 # 远程运行程序
 def run_command_remote(command):
     try:
-        ssh_command = f"ssh -i {CONNE['rsa']} {CONNE['info']} {command}"
+        # 整条命令交给远程 shell 解析
+        ssh_command = f"ssh -i {CONNE['rsa']} {CONNE['info']} {shlex.quote(command)}"
         result = subprocess.run(ssh_command, shell=True, capture_output=True, text=True, check=True)
         logging.info(result.stdout)
+        return result.stdout
     except FileNotFoundError as e:
         logging.error(f"错误: SSH 密钥文件未找到 - {e}")
     except subprocess.CalledProcessError as e:
@@ -33,6 +49,7 @@ def run_command_local(command):
     try:
         result = subprocess.run(command, shell=True, capture_output=True, text=True, check=True)
         logging.info(result)
+        return result.stdout
     except subprocess.CalledProcessError as e:
         print(f"命令执行失败，错误信息：{e.stderr}")
         logging.error(f"命令执行失败，错误信息：{e.stderr}")
@@ -76,6 +93,145 @@ def run_dataset_on_models_in_container(run_func, dataset_path, model_image, cont
     run_func(clean_cmd)
     return output
 
+def choose_shard_count(run_func, file_count):
+    """根据宿主机CPU核数、可用内存和文件数量确定分片数"""
+    by_files = file_count // SHARD_CONFIG['min_files_per_shard']
+    try:
+        cpus = int((run_func("nproc") or '1').strip())
+        meminfo = run_func("grep MemAvailable /proc/meminfo") or ''
+        mem_available = int(meminfo.split()[1]) * 1024 if meminfo.strip() else 0  # kB -> 字节
+    except (ValueError, IndexError) as e:
+        logging.warning(f"获取宿主机资源失败，不分片运行: {e}")
+        return 1
+
+    by_cpu = cpus // SHARD_CONFIG['cpus_per_container']
+    by_memory = mem_available // SHARD_CONFIG['memory_per_container']
+    shards = max(1, min(SHARD_CONFIG['max_shards'], by_files, by_cpu, by_memory))
+    logging.info(f"分片数: {shards}（文件 {file_count}，CPU {cpus}，可用内存 {mem_available} 字节）")
+    return shards
+
+
+def split_shards(files, shards):
+    """按排序后的文件列表切分为连续分片，保证合并后顺序与单容器运行一致"""
+    files = sorted(files)
+    size, remainder = divmod(len(files), shards)
+    result, start = [], 0
+    for i in range(shards):
+        end = start + size + (1 if i < remainder else 0)
+        result.append(files[start:end])
+        start = end
+    return [shard for shard in result if shard]
+
+
+def merge_text(outputs):
+    """逐行结果直接按分片顺序拼接"""
+    lines = []
+    for output in outputs:
+        lines.extend(output.splitlines())
+    return "\n".join(lines) + ("\n" if lines else "")
+
+
+def merge_csv(outputs):
+    """CSV 结果只保留第一个分片的表头"""
+    rows, header = [], None
+    for output in outputs:
+        reader = list(csv.reader(io.StringIO(output)))
+        if not reader:
+            continue
+        if header is None:
+            header = reader[0]
+            rows.append(header)
+        rows.extend(reader[1:] if reader[0] == header else reader)
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(rows)
+    return buffer.getvalue()
+
+
+def merge_json(outputs):
+    """JSON 结果：列表顺序拼接，字典按键合并（同名列表拼接）"""
+    merged = None
+    for output in outputs:
+        if not output.strip():
+            continue
+        data = json.loads(output)
+        if merged is None:
+            merged = data
+        elif isinstance(merged, list) and isinstance(data, list):
+            merged.extend(data)
+        elif isinstance(merged, dict) and isinstance(data, dict):
+            for key, value in data.items():
+                if isinstance(merged.get(key), list) and isinstance(value, list):
+                    merged[key].extend(value)
+                else:
+                    merged[key] = value
+        else:
+            raise ValueError("分片输出的JSON结构不一致，无法合并")
+    return json.dumps(merged, ensure_ascii=False, indent=2) if merged is not None else ""
+
+
+# 按输出文件类型选择合并方式
+OUTPUT_MERGERS = {
+    '.txt': merge_text,
+    '.csv': merge_csv,
+    '.json': merge_json
+}
+
+
+# 在数据集上分片并行运行模型
+def run_dataset_on_models_sharded(run_func, dataset_path, model_image, container_name, instruction, output_file,
+                                  shards=None):
+    """
+    把数据集文件切分为多个分片，每个分片挂载到独立容器并发运行，最后按输出格式合并结果
+    shards 为空时根据宿主机资源自动确定，分片数为 1 时退化为单容器运行
+    """
+    dataset_dir = CONNE['workspace'] + dataset_path
+    work_dir = f"{dataset_dir}/{container_name}"
+
+    listing = run_func(f"find {dataset_dir} -maxdepth 1 -type f -printf '%f\\n'") or ''
+    files = [name for name in listing.splitlines() if name]
+    shards = shards or choose_shard_count(run_func, len(files))
+    merger = OUTPUT_MERGERS.get(PurePosixPath(output_file).suffix.lower())
+    if shards <= 1 or len(files) < 2 or merger is None:
+        return run_dataset_on_models_in_container(run_func, dataset_path, model_image, container_name,
+                                                  instruction, output_file)
+
+    shard_files = split_shards(files, shards)
+
+    def run_shard(index, names):
+        shard_name = f"{container_name}_shard{index}"
+        data_dir = f"{work_dir}/shard_{index}/data"
+        result_dir = f"{work_dir}/shard_{index}/result"
+        run_func(f"mkdir -p {data_dir} {result_dir}")
+
+        # 硬链接输入文件到分片目录（分批避免命令行过长）
+        for start in range(0, len(names), 200):
+            sources = " ".join(shlex.quote(f"{dataset_dir}/{name}") for name in names[start:start + 200])
+            run_func(f"cp -l -t {data_dir} {sources}")
+
+        docker_cmd = f"sudo docker run --name {shard_name}\
+            --mount type=bind,source={result_dir},target=/result\
+            --mount type=bind,source={data_dir},target=/data\
+            {model_image} python3 main.py -i /data -o /result {instruction}"
+        logging.debug(docker_cmd)
+        try:
+            run_func(docker_cmd)
+            output = run_func(f"cat {result_dir}/{output_file}")
+        finally:
+            run_func(f"sudo docker rm -f {shard_name}")
+        if output is None:
+            raise RuntimeError(f"分片 {index} 未生成输出文件 {output_file}")
+        return output
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(shard_files)) as executor:
+            outputs = list(executor.map(run_shard, range(len(shard_files)), shard_files))
+        return merger(outputs)
+    finally:
+        clean_cmd = f"sudo rm -r {work_dir}"
+        logging.debug(clean_cmd)
+        run_func(clean_cmd)
+
+
 # def control_running_func_nums(func, *args, **kwargs):
 #     CONCURRENT_MODELS_KEY = 'concurrent_running_models' #定义存储并发模型运行数量
 #     MAX_CONCURRENT_RUNNING_MODELS = 3 #最大同时运行的模型数量
@@ -1,11 +1,18 @@
-from app.config import Config
+from app.config import Config, FileConfig
+import errno
+import hashlib
 import os
+import shutil
+import uuid
 
 from app.core.exception import logger, ImageProcessingError, NotFoundError, ValidationError, FileSaveError, \
-    FileValidationError
+    FileValidationError, FileUploadError
 from pathlib import Path
 from PIL import Image, UnidentifiedImageError
 
+# 算法输入允许的文件后缀
+INPUT_EXTENSIONS = {'.bmp', '.dib', '.png', '.jpg', '.jpeg', '.pbm', '.pgm', '.ppm', '.tif', '.tiff', '.JPG'}
+
 
 class FileStorage:
     @staticmethod
@@ -90,6 +97,116 @@ class FileStorage:
 
         return str(save_dir)
 
+    @staticmethod
+    def save_upload_hashed(file_stream, save_dir, suffix='', max_size=None, chunk_size=None):
+        """
+        流式保存并计算哈希（单次读取）
+        1. 分块读取写入同目录下的临时文件，同时更新 MD5，内存占用与文件大小无关
+        2. 超过 max_size 立即中止并删除临时文件
+        3. 落盘后原子重命名为 <哈希><后缀>，同内容文件直接覆盖
+        :return: (文件路径, 文件哈希)
+        """
+        if hasattr(file_stream, "seekable") and file_stream.seekable():
+            file_stream.seek(0)
+        save_dir = Path(save_dir)
+        save_dir.mkdir(parents=True, exist_ok=True)
+
+        chunk_size = chunk_size or FileConfig.UPLOAD_CHUNK_SIZE
+        tmp_path = save_dir / f".upload_{uuid.uuid4().hex}.part"
+        md5 = hashlib.md5()
+        size = 0
+        try:
+            with open(tmp_path, 'wb', buffering=0) as f:
+                while True:
+                    chunk = file_stream.read(chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if max_size and size > max_size:
+                        raise FileUploadError(f"文件大小超过限制（{max_size // (1024 * 1024)}MB）")
+                    md5.update(chunk)
+                    f.write(chunk)
+                os.fsync(f.fileno())
+
+            if size == 0:
+                raise FileSaveError("保存文件为空")
+
+            file_hash = md5.hexdigest()
+            save_path = save_dir / f"{file_hash}{suffix}"
+            os.replace(tmp_path, save_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        # 重命名后只校验一次（fsync 已保证数据落盘，无需延迟等待）
+        try:
+            FileStorage.is_file_corrupted(save_path)
+        except Exception:
+            save_path.unlink(missing_ok=True)
+            raise
+        return save_path, file_hash
+
+    @staticmethod
+    def _copy_file_data(src_fd, dst_fd, size):
+        """内核态复制：优先 copy_file_range，不支持时退化为 sendfile，最后为用户态复制"""
+        offset = 0
+        if hasattr(os, 'copy_file_range'):
+            try:
+                while offset < size:
+                    copied = os.copy_file_range(src_fd, dst_fd, size - offset)
+                    if copied == 0:
+                        break
+                    offset += copied
+                return
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP) or offset:
+                    raise
+        try:
+            while offset < size:
+                sent = os.sendfile(dst_fd, src_fd, offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+            return
+        except OSError as e:
+            if e.errno not in (errno.ENOSYS, errno.EINVAL) or offset:
+                raise
+        with os.fdopen(os.dup(src_fd), 'rb') as src, os.fdopen(os.dup(dst_fd), 'wb') as dst:
+            shutil.copyfileobj(src, dst, FileConfig.UPLOAD_CHUNK_SIZE)
+
+    @staticmethod
+    def commit_file(src_path, dst_path, verify=True):
+        """
+        把文件提交到目标路径（源文件随后不再存在）
+        - 同一文件系统：os.replace 原子重命名，耗时与文件大小无关
+        - 跨文件系统：内核态复制到目标目录的临时文件，fsync 后原子替换，再删除源文件
+        :param verify: 上传时已校验过的内容传 False，跳过再次检测
+        """
+        src_path, dst_path = Path(src_path), Path(dst_path)
+        dst_path.parent.mkdir(parents=True, exist_ok=True)
+
+        if src_path.stat().st_dev == dst_path.parent.stat().st_dev:
+            os.replace(src_path, dst_path)
+        else:
+            tmp_path = dst_path.with_name(f".{dst_path.name}.{uuid.uuid4().hex}.part")
+            try:
+                with open(src_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+                    FileStorage._copy_file_data(src.fileno(), dst.fileno(), os.fstat(src.fileno()).st_size)
+                    os.fsync(dst.fileno())
+                os.replace(tmp_path, dst_path)
+            except BaseException:
+                tmp_path.unlink(missing_ok=True)
+                raise
+            src_path.unlink(missing_ok=True)
+
+        if verify:
+            try:
+                FileStorage.is_file_corrupted(dst_path)
+            except Exception:
+                dst_path.unlink(missing_ok=True)
+                raise
+        return dst_path
+
     @staticmethod
     def get_result_path(task_id):
         """获取输出文件路径"""
@@ -116,11 +233,8 @@ class FileStorage:
         original_filename = file.filename
         file_ext = Path(original_filename).suffix  # 提取后缀并标准化
 
-        # 允许的后缀列表（根据需求调整）
-        allowed_extensions = {'.bmp', '.dib', '.png', '.jpg', '.jpeg', '.pbm', '.pgm', '.ppm', '.tif', '.tiff', '.JPG'}
-
         # 验证文件格式
-        if file_ext not in allowed_extensions:
+        if file_ext not in INPUT_EXTENSIONS:
             raise FileValidationError("文件类型不被支持")
 
         # 构建新文件名（固定为001 + 原后缀）
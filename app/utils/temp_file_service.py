@@ -1,5 +1,5 @@
-import hashlib
 import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from pathlib import Path
 from typing import Dict
@@ -11,9 +11,23 @@ from app.docker.core.celery_app import CeleryManager
 from app.exts import db
 from app.model.model_service import ModelService
 from app.user.user_service import UserService
+from app.utils.blob_store import BlobStore, parse_file_hash
 from app.utils.image_url_utils import ImageURLHandlerUtils
 from app.utils.storage import storage, FileStorage
 
+# 临时文件过期索引：ZSET，成员为 temp:* 键名，分值为过期时间
+TEMP_INDEX_KEY = 'temp_index:expiry'
+# 历史临时文件已补录到索引的标记
+TEMP_INDEX_BACKFILLED_KEY = 'temp_index:backfilled'
+
+
+def get_upload_rule(upload_type: str, file_type: str):
+    """上传规则：(允许的扩展名, 大小上限)，压缩包类型使用单独的规则"""
+    config = FileConfig.UPLOAD_CONFIG[upload_type]
+    if file_type == 'archive' and 'archive_extensions' in config:
+        return config['archive_extensions'], config['archive_max_size']
+    return config['allowed_extensions'], config['max_size']
+
 
 def remove_empty_parents_safely(file_path: Path, stop_at: Path, max_retries: int = 3):
     """
@@ -80,42 +94,62 @@ class TempFileService:
         # 生成文件哈希（使用文件内容）
         logger.info(f"upload_type: {upload_type}, file_type: {file_type}, data_id: {data_id}, file: {file}")
 
-        file_content = file.read()
-        file_hash = hashlib.md5(file_content).hexdigest()
-        file.seek(0)
-
-        logger.info(f"✅ 计算的文件哈希: {file_hash}")
-        logger.info(f"✅ 保存的文件名: {file_hash}{Path(file.filename).suffix}")
-
-        # 构建临时目录路径（复用正式目录模板）
-        temp_dir = Path(FileConfig.TEMP_DIR) / FileConfig.UPLOAD_CONFIG[upload_type]['subdirectory'].format(
-            file_type=file_type,
-            data_id=data_id,
-            user_id=user_id
-        )
+        suffix = Path(file.filename).suffix
+        temp_dir = self._temp_dir(upload_type, data_id, file_type, user_id)
         logger.info(f"temp_dir: {temp_dir}")
 
-        # 保存到临时目录（复用你的FileStorage）
-        saved_path = self.storage.save_upload(
+        # 流式写入临时目录，边写边计算哈希，完成后重命名为 <哈希><后缀>
+        saved_file_path, file_hash = self.storage.save_upload_hashed(
             file_stream=file,
             save_dir=temp_dir,
-            file_name=f"{file_hash}{Path(file.filename).suffix}"
+            suffix=suffix,
+            max_size=get_upload_rule(upload_type, file_type)[1]
         )
-        logger.info(f"saved_path: {saved_path}")
+        logger.info(f"✅ 完整文件路径: {saved_file_path}")
 
-        saved_file_path = Path(saved_path) / f"{file_hash}{Path(file.filename).suffix}"
+        return self._register_temp(saved_file_path, file_hash, upload_type, data_id, file_type, user_id)
+
+    def save_temp_from_path(self, src_path, file_hash: str, suffix: str, upload_type: str, data_id: int,
+                            file_type: str, user_id: int, ttl: int = None) -> str:
+        """
+        把已在磁盘上的完整文件（如分片上传合并结果）转入临时区并生成URL
+        :param ttl: 临时文件保留时长（秒），默认与普通上传一致
+        """
+        temp_dir = self._temp_dir(upload_type, data_id, file_type, user_id)
+        saved_file_path = self.storage.commit_file(src_path, temp_dir / f"{file_hash}{suffix}")
         logger.info(f"✅ 完整文件路径: {saved_file_path}")
 
+        return self._register_temp(saved_file_path, file_hash, upload_type, data_id, file_type, user_id, ttl)
+
+    @staticmethod
+    def _temp_dir(upload_type: str, data_id: int, file_type: str, user_id: int) -> Path:
+        """构建临时目录路径（复用正式目录模板）"""
+        return Path(FileConfig.TEMP_DIR) / FileConfig.UPLOAD_CONFIG[upload_type]['subdirectory'].format(
+            file_type=file_type,
+            data_id=data_id,
+            user_id=user_id
+        )
+
+    def _register_temp(self, saved_file_path: Path, file_hash: str, upload_type: str, data_id: int,
+                       file_type: str, user_id: int, ttl: int = None) -> str:
+        """记录临时文件到Redis并生成URL"""
+        saved_path = str(saved_file_path.parent)
+
         # 记录Redis
         with self.redis.get_redis_connection('files') as conn:
             key = f"temp:{user_id}:{upload_type}:{data_id}:{file_type}:{file_hash}"
-            conn.hmset(key, {
+            expire_at = time.time() + (45 if ttl is None else ttl)  # 7天
+            pipe = conn.pipeline()
+            pipe.hmset(key, {
                 "real_path": str(saved_file_path),
                 "user_id": str(user_id),
                 "status": "pending",
-                "expire_at": str(time.time() + 45)  # 7天
+                "expire_at": str(expire_at),
+                "verified": "1"  # 保存时已完成损坏检测，提交时无需重复校验
             })
-            logger.info(f"当前时间:{time.time()}, 过期时间：:{time.time() + 45}")
+            pipe.zadd(TEMP_INDEX_KEY, {key: expire_at})  # 写入过期索引，清理任务按分值查找
+            pipe.execute()
+            logger.info(f"当前时间:{time.time()}, 过期时间：:{expire_at}")
             #conn.expire(key, 120)  # 原为7天（604800秒）
 
             logger.info(f"✅ 保存到Redis的键: {key}")
@@ -126,18 +160,50 @@ class TempFileService:
         relative_path = Path(saved_path).relative_to(FileConfig.TEMP_DIR)
 
         # 生成URL路径（使用实际存储路径结构）
-        url_path = f"{FileConfig.TEMP_BASE_URL}/{relative_path}/{file_hash}{Path(file.filename).suffix}"
+        url_path = f"{FileConfig.TEMP_BASE_URL}/{relative_path}/{saved_file_path.name}"
         logger.info(f"✅ 生成的URL路径: {url_path}")
 
         return url_path
 
+    def get_temp_file(self, temp_url: str, user_id: int) -> Path:
+        """按临时URL获取当前用户的临时文件路径（如分片上传的数据集压缩包）"""
+        url_components = ImageURLHandlerUtils.parse_temp_url_components(temp_url)
+        redis_key = ImageURLHandlerUtils.build_temp_redis_key(url_components)
+        with self.redis.get_redis_connection('files') as conn:
+            file_info = conn.hgetall(redis_key)
+        if not file_info:
+            raise ValidationError("文件不存在或已过期")
+        if file_info.get('user_id') != str(user_id):
+            raise ValidationError("无操作权限")
+        real_path = Path(file_info['real_path'])
+        if not real_path.is_file():
+            raise ValidationError("文件不存在或已过期")
+        return real_path
+
+    def delete_temp(self, temp_url: str, user_id: int) -> None:
+        """删除当前用户的临时文件及其记录（如压缩包解压完成后）"""
+        url_components = ImageURLHandlerUtils.parse_temp_url_components(temp_url)
+        redis_key = ImageURLHandlerUtils.build_temp_redis_key(url_components)
+        with self.redis.get_redis_connection('files') as conn:
+            file_info = conn.hgetall(redis_key)
+            if not file_info or file_info.get('user_id') != str(user_id):
+                return
+            _remove_temp_file(file_info['real_path'])
+            pipe = conn.pipeline()
+            pipe.delete(redis_key)
+            pipe.zrem(TEMP_INDEX_KEY, redis_key)
+            pipe.execute()
+
     def commit_from_temp(self, temp_url: str, user_id: int) -> bool:
         """从临时URL提交文件（其他接口调用）"""
         # 解析URL参数
         try:
             # 使用工具类验证和解析URL
-            ImageURLHandlerUtils.validate_photo_file(temp_url)
             url_components = ImageURLHandlerUtils.parse_temp_url_components(temp_url)
+            ImageURLHandlerUtils.validate_file(
+                temp_url,
+                get_upload_rule(url_components['upload_type'], url_components['file_type'])[0]
+            )
             redis_key = ImageURLHandlerUtils.build_temp_redis_key(url_components)
 
             # 记录调试日志
@@ -200,8 +266,7 @@ class TempFileService:
         """原子化文件转移操作（增强健壮性）"""
         try:
             # ========== 1. 初始化检查 ==========
-            from myapp import create_app
-            app = create_app()  # 创建Flask上下文
+            # 任务基类已在 worker 进程级应用上下文中执行，无需重新创建应用
 
             # ========== 2. 前置状态验证 ==========
             with redis_pool.get_redis_connection('files') as conn:
@@ -221,14 +286,17 @@ class TempFileService:
 
             # ========== 3. 文件操作 ==========
             src_file = Path(src_path)
-            if not src_file.exists():
+            file_hash = parse_file_hash(src_file)
+            # 重试时源文件可能已收入对象存储，此时只需补做链接
+            ingested = file_hash is not None and BlobStore.blob_path(file_hash).exists()
+            if not src_file.exists() and not ingested:
                 logger.error(f"⛔ 源文件不存在: {src_path}")
                 with redis_pool.get_redis_connection('files') as conn:
                     conn.delete(redis_key)  # 清理无效键
+                    conn.zrem(TEMP_INDEX_KEY, redis_key)
                 return
 
-            # 3.1 移动文件到正式目录
-            # 构建正式目录
+            # 3.1 构建正式目录
             final_subdir = FileConfig.UPLOAD_CONFIG[upload_type]['subdirectory'].format(
                 file_type=file_type,
                 data_id=data_id,
@@ -239,24 +307,26 @@ class TempFileService:
             final_dir.mkdir(parents=True, exist_ok=True)
             final_file_path = final_dir / src_file.name
 
-            # 使用文件流避免占用文件锁
-            with open(src_path, 'rb') as src_stream:
-                FileStorage.save_upload(
-                    file_stream=src_stream,
-                    save_dir=final_dir,
-                    file_name=src_file.name
-                )
-
-            # 3.2 删除临时文件及目录
+            # 同文件系统时为重命名，跨文件系统时为内核态复制；上传时已校验的内容不再重复检测
+            verify = file_info.get('verified') != '1'
+            if file_hash is not None:
+                # 3.2 收入对象存储（同内容只保留一份），正式路径为指向对象的硬链接
+                if src_file.exists():
+                    BlobStore.ingest(src_file, file_hash, verify=verify)
+                BlobStore.link(file_hash, final_file_path)
+            else:
+                # 非内容寻址命名的历史文件，直接提交到正式路径
+                FileStorage.commit_file(src_file, final_file_path, verify=verify)
+
+            # 3.3 清理临时目录
             try:
-                src_file.unlink(missing_ok=True)  # 兼容Python 3.8+
                 remove_empty_parents_safely(
                     file_path=src_file,
                     stop_at=Path(FileConfig.TEMP_DIR).resolve(),
                     max_retries=3
                 )
             except Exception as e:
-                logger.error(f"⛔ 文件删除失败: {str(e)}")
+                logger.error(f"⛔ 临时目录清理失败: {str(e)}")
                 raise  # 抛出异常触发重试
 
             #========== 4. 数据库更新 ==========
@@ -271,23 +341,31 @@ class TempFileService:
                 }
             }
 
-            # 在应用上下文中更新数据库
-            with app.app_context():
+            # 更新数据库（应用上下文由任务基类提供）
+            previous_path = None
+            try:
+                if upload_type in database_mapping and file_type in database_mapping[upload_type]:
+                    get_func, field = database_mapping[upload_type][file_type]
+                    instance = get_func(data_id)
+                    previous_path = getattr(instance, field)
+                    setattr(instance, field, relative_path)
+                    db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"⛔ 数据库更新失败: {str(e)}")
+                raise  # 抛出异常触发重试
+
+            # 4.1 释放被替换的旧文件引用（失败不影响本次提交，由回收任务兜底）
+            if previous_path and previous_path.strip() != relative_path:
                 try:
-                    # 更新数据库
-                    if upload_type in database_mapping and file_type in database_mapping[upload_type]:
-                        get_func, field = database_mapping[upload_type][file_type]
-                        instance = get_func(data_id)
-                        setattr(instance, field, relative_path)
-                        db.session.commit()
+                    BlobStore.release(ImageURLHandlerUtils.build_local_path(previous_path.strip()))
                 except Exception as e:
-                    db.session.rollback()
-                    logger.error(f"⛔ 数据库更新失败: {str(e)}")
-                    raise  # 抛出异常触发重试
+                    logger.warning(f"⚠️ 释放旧文件失败: {previous_path} - {str(e)}")
 
             # ========== 5. 最终清理 ==========
             with redis_pool.get_redis_connection('files') as conn:
                 conn.delete(redis_key)  # 关键：成功后才删除键
+                conn.zrem(TEMP_INDEX_KEY, redis_key)
                 logger.info(f"✅ 完成迁移: {redis_key}")
 
         except FileNotFoundError as e:
@@ -295,6 +373,7 @@ class TempFileService:
             logger.error(f"🛑 文件已删除，终止任务: {src_path}")
             with redis_pool.get_redis_connection('files') as conn:
                 conn.delete(redis_key)  # 确保清理残留
+                conn.zrem(TEMP_INDEX_KEY, redis_key)
             return  # 直接返回，不重试
         except Exception as e:
             # 7. 其他错误处理
@@ -385,61 +464,87 @@ class TempFileService:
 temp_service = TempFileService()
 
 
+def _backfill_temp_index(conn):
+    """一次性把索引上线前的临时文件键补录到过期索引"""
+    if conn.exists(TEMP_INDEX_BACKFILLED_KEY):
+        return
+    cursor, backfilled = 0, 0
+    while True:
+        cursor, keys = conn.scan(cursor, match='temp:*', count=500)
+        if keys:
+            pipe = conn.pipeline(transaction=False)
+            for key in keys:
+                pipe.hget(key, 'expire_at')
+            scores = {key: float(expire_at) for key, expire_at in zip(keys, pipe.execute()) if expire_at}
+            if scores:
+                conn.zadd(TEMP_INDEX_KEY, scores)
+                backfilled += len(scores)
+        if cursor == 0:
+            break
+    conn.set(TEMP_INDEX_BACKFILLED_KEY, int(time.time()))
+    logger.info(f"📇 过期索引补录完成，共 {backfilled} 个键")
+
+
+def _remove_temp_file(file_path_str):
+    """删除临时文件并清理空目录"""
+    file_path_obj = Path(file_path_str)
+    if file_path_obj.exists() and file_path_obj.is_file():
+        file_path_obj.unlink()
+        logger.info(f"🗑️ 删除文件: {file_path_obj}")
+
+        # 清理空目录（每次删除文件后立即执行）
+        remove_empty_parents_safely(
+            file_path=file_path_obj,
+            stop_at=Path(FileConfig.TEMP_DIR).resolve(),
+            max_retries=2
+        )
+    else:
+        logger.warning(f"文件不存在或非文件: {file_path_obj}")
+
+
 @CeleryManager.get_celery().task(bind=True)
 def cleanup_temp_files(self):
     logger.info("🚀 开始执行临时文件清理任务")
     try:
         with redis_pool.get_redis_connection('files') as conn:
-            cursor = '0'
-            deleted_count = 0
-            total_scanned = 0  # 统计扫描的键数量
-            while True:
-                cursor, keys = conn.scan(cursor, match='temp:*', count=100)
-                logger.info(f"🔍 扫描到 {len(keys)} 个键，cursor={cursor}")  # 新增日志
-                total_scanned += len(keys)
-                if not keys and cursor == 0:  # 退出条件：无键且游标归零
-                    break
-
-                for key in keys:
-                    try:
-                        # 确保每次循环都初始化变量
-                        file_path_str = None
-                        file_path_obj = None
-
-                        expire_at = conn.hget(key, 'expire_at')
-                        file_path_str = conn.hget(key, 'real_path')
-                        logger.debug(f"检查键: {key}, expire_at={expire_at}")
-                        # 条件判断和路径转换
-                        if expire_at and float(expire_at) < time.time():
-                            if file_path_str:
-                                file_path_obj = Path(file_path_str)
-                                logger.debug(f"处理过期键: {key}, 文件路径={file_path_obj}")
-
-                                # 删除文件
-                                if file_path_obj.exists() and file_path_obj.is_file():
-                                    file_path_obj.unlink()
-                                    logger.info(f"🗑️ 删除文件: {file_path_obj}")
-
-                                    # 清理空目录（每次删除文件后立即执行）
-                                    remove_empty_parents_safely(
-                                        file_path=file_path_obj,
-                                        stop_at=Path(FileConfig.TEMP_DIR).resolve(),
-                                        max_retries=2
-                                    )
-                                else:
-                                    logger.warning(f"文件不存在或非文件: {file_path_obj}")
-
-                            # 删除 Redis 键
-                            conn.delete(key)
-                            deleted_count += 1
-                            logger.info(f"✅ 清理完成: {key}")
-                    except Exception as e:
-                        logger.error(f"清理失败: {key} - {str(e)}", exc_info=True)
-
-                if cursor == 0:  # 游标归零时退出
-                    break
+            _backfill_temp_index(conn)
 
-            logger.info(f"🎉 清理完成，共扫描 {total_scanned} 个键，删除 {deleted_count} 个过期文件")
+            deleted_count = 0
+            with ThreadPoolExecutor(max_workers=FileConfig.TEMP_CLEANUP_WORKERS) as executor:
+                while True:
+                    # 只取已过期的键
+                    keys = conn.zrangebyscore(TEMP_INDEX_KEY, '-inf', time.time(),
+                                              start=0, num=FileConfig.TEMP_CLEANUP_BATCH_SIZE)
+                    if not keys:
+                        break
+
+                    pipe = conn.pipeline(transaction=False)
+                    for key in keys:
+                        pipe.hget(key, 'real_path')
+                    paths = pipe.execute()
+
+                    # 并行删除文件，单个文件失败不影响其他文件
+                    futures = {key: executor.submit(_remove_temp_file, path) for key, path in zip(keys, paths) if path}
+                    done = [key for key, path in zip(keys, paths) if not path]  # 键已不存在，只需移出索引
+                    for key, future in futures.items():
+                        try:
+                            future.result()
+                            done.append(key)
+                        except Exception as e:
+                            logger.error(f"清理失败: {key} - {str(e)}", exc_info=True)
+
+                    # 删除失败的键保留在索引中，下次清理重试
+                    if done:
+                        pipe = conn.pipeline(transaction=False)
+                        pipe.delete(*done)
+                        pipe.zrem(TEMP_INDEX_KEY, *done)
+                        pipe.execute()
+                        deleted_count += len(futures) - (len(keys) - len(done))
+
+                    if len(done) < len(keys) or len(keys) < FileConfig.TEMP_CLEANUP_BATCH_SIZE:
+                        break
+
+            logger.info(f"🎉 清理完成，共删除 {deleted_count} 个过期文件")
 
     except Exception as e:
         logger.error("清理任务发生全局错误: %s", str(e), exc_info=True)
@@ -11,6 +11,8 @@ from app.core.redis_connection_pool import redis_pool
 from app.docker.core.celery_app import CeleryManager
 
 from app.exts import db
+from app.search.fulltext import FullTextSearch
+from app.tag.tag_service import TagService
 from flask_migrate import Migrate
 from flask_cors import CORS
 
@@ -50,6 +52,9 @@ def create_app(env=None):
     # 注册蓝图（需在celery后注册）
     register_blueprints(app)
 
+    # 注册命令行工具
+    register_commands(app)
+
     return app
 
 
@@ -104,6 +109,8 @@ def init_extensions(app):
     # 在应用上下文中创建数据库表
     with app.app_context():
         db.create_all()
+        # 创建缺失的全文索引
+        FullTextSearch.ensure_indexes()
 
 
 def register_blueprints(app: FlaskApp):
@@ -137,6 +144,16 @@ def register_blueprints(app: FlaskApp):
     app.register_blueprint(files_bp, url_prefix='/api/v1/files')
 
 
+def register_commands(app: FlaskApp):
+    """注册 flask 命令行工具"""
+
+    @app.cli.command('backfill-tags')
+    def backfill_tags():
+        """根据模型、数据集的 type 字段重建标签关联（首次部署或升级后执行一次）：flask backfill-tags"""
+        count = TagService.backfill()
+        print(f"标签关联补建完成，共处理 {count} 条记录")
+
+
 def configure_global_checks(app):
     @app.before_request
     def check_json():